@@ -0,0 +1,221 @@
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime
+
+import regex_based_graph_night as poker
+
+# Times importing the script and every phase of turning poker night csvs into stats and graphs, on the real logs/
+# corpus and on synthetic nights made by repeating the biggest night back to back. Save a run as a baseline before
+# changing the parser, then run compare afterwards to flag phases that got slower or hungrier by more than the threshold.
+
+BENCHMARK_BASELINE_FILE = ".cache/benchmark_baseline.json"
+
+def csv_files_in(logs_dir):
+    return sorted(os.path.join(logs_dir, f) for f in os.listdir(logs_dir) if f.endswith(".csv"))
+
+def read_csv_lines(csv_file):
+    with open(csv_file) as file:
+        return file.readlines()
+
+def _without_header(csv_lines):
+    return csv_lines[1:] if csv_lines and csv_lines[0] == "entry,at,order\n" else csv_lines
+
+# Repeats a night's rows `copies` times, shifting each copy's order timestamps past the end of the previous one
+def synthetic_night(csv_lines, copies):
+    rows = _without_header(csv_lines)[::-1] # oldest first
+    orders = [order for order in map(poker._row_order, rows) if order is not None]
+    span = max(orders) - min(orders) + 100000
+    synthetic_rows = []
+    for copy in range(copies):
+        for row in rows:
+            order = poker._row_order(row)
+            if order is None:
+                synthetic_rows.append(row)
+            else:
+                synthetic_rows.append(f"{row.rsplit(',', 1)[0]},{order + copy * span}\n")
+    synthetic_rows.reverse()
+    return ["entry,at,order\n"] + synthetic_rows
+
+def benchmark_inputs(logs_dir, scales):
+    nights = [read_csv_lines(csv_file) for csv_file in csv_files_in(logs_dir)]
+    inputs = {"corpus": nights}
+    biggest_night = max(nights, key=len)
+    for scale in scales:
+        inputs[f"synthetic_x{scale}"] = [synthetic_night(biggest_night, scale)]
+    return inputs
+
+def _chronological_rows(csv_lines):
+    return _without_header(csv_lines)[::-1]
+
+def _per_night(fn):
+    return lambda nights: [fn(night) for night in nights]
+
+def _stack_history(rounds):
+    stack_history = poker.StackHistory()
+    for poker_round in rounds:
+        stack_history.on_round(poker_round)
+    return stack_history.finish()
+
+def _print_core_stats(rounds):
+    with redirect_stdout(io.StringIO()):
+        poker.print_core_stats(rounds)
+
+# One chart per input like the script draws: the night's profits, or the all-time chart for a whole corpus
+def _graph_stack_history(nightly_histories, graph_dir):
+    csv_file = os.path.join(graph_dir, "benchmark.csv")
+    if len(nightly_histories) == 1:
+        poker.graph_stack_history(nightly_histories[0], "Benchmark", csv_file)
+        return
+    all_time_history = poker.merge_all_time_history(history.final_profits() for history in nightly_histories)
+    poker.graph_stack_history(all_time_history, "Benchmark", csv_file, show_event_points=True)
+
+# (phase, phase whose output it takes, what it does to the input's list of nights)
+def benchmark_phases(graph_dir):
+    return [
+        ("fix_up_player_names", "csv", _per_night(poker.fix_up_player_names)),
+        ("parse_events", "fix_up_player_names", _per_night(lambda lines: list(poker.parse_events(_chronological_rows(lines))))),
+        ("split_rounds", "parse_events", _per_night(lambda events: list(poker.split_rounds(events)))),
+        (
+            "build_rounds",
+            "split_rounds",
+            _per_night(lambda groups: [poker.PokerRound(events) for events in groups if type(events[0]) is poker.HandStart]),
+        ),
+        ("player_stack_history", "build_rounds", _per_night(_stack_history)),
+        ("print_core_stats", "build_rounds", _per_night(_print_core_stats)),
+        ("graph_stack_history", "player_stack_history", lambda histories: _graph_stack_history(histories, graph_dir)),
+    ]
+
+def _timed(fn, nights, repeat):
+    best, output = None, None
+    for _ in range(repeat):
+        output = None # don't keep the previous run's output alive
+        gc.collect()
+        start = time.perf_counter()
+        output = fn(nights)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return output, best
+
+def _peak_memory(fn, nights):
+    gc.collect()
+    tracemalloc.start()
+    fn(nights)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+# What every run of the script pays before doing anything: importing it in a fresh interpreter
+def startup_result(repeat=3):
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    timed_import = "import time; start = time.perf_counter(); import regex_based_graph_night; print(time.perf_counter() - start)"
+    traced_import = "import tracemalloc; tracemalloc.start(); import regex_based_graph_night; print(tracemalloc.get_traced_memory()[1])"
+    seconds = min(
+        float(subprocess.run([sys.executable, "-c", timed_import], cwd=repo_dir, capture_output=True, text=True, check=True).stdout)
+        for _ in range(repeat)
+    )
+    peak = int(subprocess.run([sys.executable, "-c", traced_import], cwd=repo_dir, capture_output=True, text=True, check=True).stdout)
+    return {"rows": 0, "seconds": seconds, "rows_per_second": 0.0, "peak_mib": peak / 1024 / 1024}
+
+def run_benchmarks(logs_dir="logs", scales=(10, 50), repeat=3, phases=None):
+    results = {}
+    if not phases or "import" in phases:
+        results["startup/import"] = startup_result(repeat)
+        print_result("startup/import", results["startup/import"])
+    with tempfile.TemporaryDirectory() as graph_dir:
+        for input_name, nights in benchmark_inputs(logs_dir, scales).items():
+            rows = sum(len(night) for night in nights)
+            outputs = {"csv": nights}
+            for phase, input_phase, fn in benchmark_phases(graph_dir):
+                if phases and phase not in phases:
+                    outputs[phase], _ = _timed(fn, outputs[input_phase], 1) # later phases may still need its output
+                    continue
+                outputs[phase], seconds = _timed(fn, outputs[input_phase], repeat)
+                results[f"{input_name}/{phase}"] = {
+                    "rows": rows,
+                    "seconds": seconds,
+                    "rows_per_second": rows / seconds if seconds else float("inf"),
+                    "peak_mib": _peak_memory(fn, outputs[input_phase]) / 1024 / 1024,
+                }
+                print_result(f"{input_name}/{phase}", results[f"{input_name}/{phase}"])
+    return results
+
+def print_result(name, result):
+    print(f"{name: <42} {result['seconds']:8.3f} s {result['rows_per_second']:12,.0f} rows/s {result['peak_mib']:8.1f} MiB peak")
+
+def save_baseline(results, path=BENCHMARK_BASELINE_FILE):
+    baseline = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "parser_version": poker.parser_fingerprint(),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(baseline, file, indent=1)
+
+# Prints each phase's change against the baseline and returns the phases that regressed by more than threshold
+def compare_results(baseline_results, results, threshold=0.15):
+    regressions = []
+    for name, result in results.items():
+        baseline = baseline_results.get(name)
+        if baseline is None:
+            print(f"{name: <42} (not in baseline)")
+            continue
+        time_change = result["seconds"] / baseline["seconds"] - 1 if baseline["seconds"] else 0.0
+        memory_change = result["peak_mib"] / baseline["peak_mib"] - 1 if baseline["peak_mib"] else 0.0
+        regressed = time_change > threshold or memory_change > threshold
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name: <42} {baseline['seconds']:8.3f} -> {result['seconds']:8.3f} s ({time_change:+7.1%}) "
+            f"{baseline['peak_mib']:8.1f} -> {result['peak_mib']:8.1f} MiB ({memory_change:+7.1%})"
+            + ("  REGRESSION" if regressed else "")
+        )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parsing the poker night logs phase by phase")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="time every phase and optionally save the results as the baseline")
+    compare_parser = subparsers.add_parser("compare", help="time every phase and compare against the baseline")
+    for subparser in (run_parser, compare_parser):
+        subparser.add_argument("--logs", default="logs", help="directory of poker_night_YYYYMMDD.csv files")
+        subparser.add_argument("--scale", type=int, nargs="*", default=[10, 50], help="copies of the biggest night in each synthetic input")
+        subparser.add_argument("--repeat", type=int, default=3, help="runs per phase, the fastest one counts")
+        subparser.add_argument("--phase", action="append", help="only report this phase (can be repeated)")
+    run_parser.add_argument("--save", nargs="?", const=BENCHMARK_BASELINE_FILE, help=f"save the results as the baseline (default {BENCHMARK_BASELINE_FILE})")
+    compare_parser.add_argument("--baseline", default=BENCHMARK_BASELINE_FILE, help="baseline saved by run --save")
+    compare_parser.add_argument("--threshold", type=float, default=0.15, help="flag phases more than this fraction slower or bigger")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        print(f"Baseline from {baseline['created_at']} (python {baseline['python']}, parser {baseline['parser_version']})")
+
+    results = run_benchmarks(args.logs, args.scale, args.repeat, args.phase)
+
+    if args.command == "run" and args.save:
+        save_baseline(results, args.save)
+        print(f"Saved baseline to {args.save}")
+    elif args.command == "compare":
+        print()
+        regressions = compare_results(baseline["results"], results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} phases regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+        print(f"\nNo phase regressed by more than {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.utils import formatdate
+
+import regex_based_graph_night as poker
+
+# Serves each night's and the all-time stats as JSON plus their profit graphs as PNGs, from parsed nights kept in
+# memory. Every response is cached under the hash of the csvs it was built from (one csv for a night, all of them for
+# the all-time ones) and sent with that as its ETag. A background scan of logs/ only re-hashes and re-parses csvs whose
+# size or mtime changed, which drops just that night's responses and the all-time ones; requests never parse anything.
+# The scan runs in a worker thread and its results are swapped in on the event loop, so requests don't wait on it. A
+# csv that can't be loaded (half exported, or a name the parser doesn't know) is logged and tried again once it changes.
+
+DASHBOARD_SCAN_SECONDS = 5.0
+STATUS_TEXT = {
+    200: "OK",
+    304: "Not Modified",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    400: "Bad Request",
+    500: "Internal Server Error",
+}
+
+class NightData():
+    __slots__ = ("csv_file", "csv_sha256", "file_stat", "stack_matrix", "core_stats")
+
+    def __init__(self, night, file_stat):
+        self.csv_file = night.csv_file
+        self.csv_sha256 = night.csv_sha256
+        self.file_stat = file_stat
+        self.stack_matrix = night.stack_matrix
+        self.core_stats = night.core_stats
+
+def _file_stat(csv_file):
+    stat = os.stat(csv_file)
+    return (stat.st_mtime_ns, stat.st_size)
+
+# 20230413 for poker_night_20230413.csv, 20220106_tourney for a second game the same day
+def _night_key(csv_file):
+    return poker._night_name(csv_file).removeprefix("poker_night_")
+
+def _json_body(document):
+    return (json.dumps(document, default=poker._json_default, ensure_ascii=False, indent=1) + "\n").encode()
+
+def _profits(stack_matrix):
+    return {player: profit for player, (profit, _) in stack_matrix.final_profits().items()}
+
+def all_time_history(nights):
+    return poker.merge_all_time_history(night.stack_matrix.final_profits() for night in nights.values())
+
+def night_document(key, night):
+    return {
+        "night": key,
+        "csv_sha256": night.csv_sha256,
+        "profits": _profits(night.stack_matrix),
+        "stats": night.core_stats.results(),
+    }
+
+def all_time_document(nights):
+    all_core_stats = poker.CoreStats()
+    for night in nights.values():
+        all_core_stats.merge(night.core_stats)
+    return {
+        "nights": len(nights),
+        "profits": _profits(all_time_history(nights)),
+        "stats": all_core_stats.results(),
+    }
+
+def index_document(nights):
+    return {
+        "nights": [{"night": key, "stats": f"/nights/{key}.json", "graph": f"/nights/{key}.png"} for key in nights],
+        "all_time": {"stats": "/all-time.json", "graph": "/all-time.png"},
+    }
+
+class Dashboard():
+    def __init__(self, logs_dir="logs", use_cache=True):
+        self.logs_dir = logs_dir
+        self.use_cache = use_cache
+        self.nights = {} # night key to NightData, in date order
+        self.responses = {} # path to (dependency hash, content type, body)
+        self.rendering = {} # (path, dependency hash) to the task building it, so concurrent requests share one build
+        self.render_executor = ThreadPoolExecutor(max_workers=1) # pyplot isn't thread safe, one chart at a time
+        self.all_time_sha256 = hashlib.sha256().hexdigest()
+        self.parses = 0
+        self.failed_stats = {} # csv file to its (mtime, size) when it couldn't be loaded
+
+    # Picks up new, changed and removed csvs. Returns the keys of the nights that changed
+    def refresh(self):
+        return self.apply_scan(*self.scan())
+
+    # refresh() for the event loop, with the hashing and parsing done in a worker thread
+    async def refresh_in_background(self):
+        scan = await asyncio.get_running_loop().run_in_executor(None, self.scan)
+        return self.apply_scan(*scan)
+
+    # The nights as they are in logs_dir now, the keys that changed, how many csvs were parsed and the csvs that failed
+    # to load. Only reads self, so it can run off the event loop
+    def scan(self):
+        csv_files = sorted(
+            os.path.join(self.logs_dir, f) for f in os.listdir(self.logs_dir)
+            if f.endswith(".csv") and os.path.isfile(os.path.join(self.logs_dir, f))
+        )
+        current_nights = self.nights
+        changed = {key for key in current_nights if current_nights[key].csv_file not in csv_files}
+        nights = {}
+        parses = 0
+        failed_stats = {}
+        for csv_file in csv_files:
+            key = _night_key(csv_file)
+            current = current_nights.get(key)
+            file_stat = _file_stat(csv_file)
+            if current is not None and current.csv_file == csv_file and current.file_stat == file_stat:
+                nights[key] = current
+                continue
+            if self.failed_stats.get(csv_file) == file_stat:
+                failed_stats[csv_file] = file_stat # the same broken csv, the night it had before stays
+                if current is not None:
+                    nights[key] = current
+                continue
+            csv_sha256 = poker.csv_content_hash(csv_file) if current is not None else None
+            if current is not None and current.csv_sha256 == csv_sha256:
+                current.file_stat = file_stat # touched but not changed
+                nights[key] = current
+                continue
+            try:
+                night = poker.load_night(csv_file, self.use_cache, csv_sha256=csv_sha256)
+            except (Exception, SystemExit) as error: # the parser exits on a name it doesn't know
+                print(f"{datetime.now():%H:%M:%S} couldn't load {csv_file}: {error!r}", file=sys.stderr)
+                failed_stats[csv_file] = file_stat
+                if current is not None:
+                    nights[key] = current
+                continue
+            nights[key] = NightData(night, file_stat)
+            parses += 1
+            changed.add(key)
+        return nights, changed, parses, failed_stats
+
+    def apply_scan(self, nights, changed, parses, failed_stats):
+        self.parses += parses
+        self.failed_stats = failed_stats
+        if changed:
+            # only the changed nights' own responses and the ones built from every night are stale
+            stale_paths = {f"/nights/{key}.json" for key in changed} | {f"/nights/{key}.png" for key in changed}
+            stale_paths |= {"/", "/all-time.json", "/all-time.png"}
+            self.responses = {path: response for path, response in self.responses.items() if path not in stale_paths}
+            self.all_time_sha256 = hashlib.sha256("".join(night.csv_sha256 for night in nights.values()).encode()).hexdigest()
+        self.nights = nights
+        return changed
+
+    # (dependency hash, content type, function building the body) for a path, or None when there's no such page. The
+    # builders only see the nights as they were when routed, since they run in another thread while scans go on.
+    def route(self, path):
+        nights = self.nights
+        if path == "/":
+            return self.all_time_sha256, "application/json", lambda: _json_body(index_document(nights))
+        if path == "/all-time.json" and nights:
+            return self.all_time_sha256, "application/json", lambda: _json_body(all_time_document(nights))
+        if path == "/all-time.png" and nights:
+            title = "All-time profit history as of " + poker.date_of_csv(list(nights.values())[-1].csv_file).strftime("%Y/%m/%d")
+            return (
+                self.all_time_sha256,
+                "image/png",
+                lambda: poker.render_stack_history_png(all_time_history(nights), title, show_event_points=True),
+            )
+        if path.startswith("/nights/"):
+            key, _, extension = path[len("/nights/"):].partition(".")
+            night = nights.get(key)
+            if night is None:
+                return None
+            if extension == "json":
+                return night.csv_sha256, "application/json", lambda: _json_body(night_document(key, night))
+            if extension == "png":
+                title = "Profit for " + poker.date_of_csv(night.csv_file).strftime("%Y/%m/%d")
+                return night.csv_sha256, "image/png", lambda: poker.render_stack_history_png(night.stack_matrix, title)
+        return None
+
+    # Returns (status, content type, body, etag)
+    async def respond(self, method, path, headers):
+        if method not in ("GET", "HEAD"):
+            return 405, "text/plain", b"Only GET and HEAD\n", None
+        path = path.split("?", 1)[0]
+        route = self.route(path)
+        if route is None:
+            return 404, "text/plain", b"Not found\n", None
+        dependency_hash, content_type, build = route
+        etag = f'"{dependency_hash[:32]}"'
+        if headers.get("if-none-match") == etag:
+            return 304, content_type, b"", etag
+
+        cached = self.responses.get(path)
+        if cached is None or cached[0] != dependency_hash:
+            render_key = (path, dependency_hash)
+            if render_key not in self.rendering:
+                if content_type == "image/png":
+                    build_future = asyncio.get_running_loop().run_in_executor(self.render_executor, build)
+                else:
+                    build_future = asyncio.get_running_loop().run_in_executor(None, build)
+                self.rendering[render_key] = asyncio.ensure_future(build_future)
+            try:
+                body = await self.rendering[render_key]
+            except Exception as error:
+                print(f"{datetime.now():%H:%M:%S} failed to build {path}: {error!r}", file=sys.stderr)
+                return 500, "text/plain", b"Internal error\n", None
+            finally:
+                self.rendering.pop(render_key, None)
+            cached = (dependency_hash, content_type, body)
+            current_route = self.route(path)
+            if current_route and current_route[0] == dependency_hash: # the csvs didn't change while it was built
+                self.responses[path] = cached
+        return 200, content_type, cached[2], etag
+
+    async def scan_forever(self, scan_seconds=DASHBOARD_SCAN_SECONDS):
+        while True:
+            await asyncio.sleep(scan_seconds)
+            try:
+                changed = await self.refresh_in_background()
+            except (Exception, SystemExit) as error: # keeps the nights it had, and tries again next time
+                print(f"{datetime.now():%H:%M:%S} scan of {self.logs_dir} failed: {error!r}", file=sys.stderr)
+                continue
+            if changed:
+                print(f"{datetime.now():%H:%M:%S} reloaded {', '.join(sorted(changed))}")
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, path, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    status, content_type, body, etag = 400, "text/plain", b"Bad request\n", None
+                    method, version = "GET", "HTTP/1.0"
+                else:
+                    status, content_type, body, etag = await self.respond(method, path, headers)
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                response_headers = [
+                    f"HTTP/1.1 {status} {STATUS_TEXT[status]}",
+                    f"Date: {formatdate(usegmt=True)}",
+                    f"Content-Type: {content_type}",
+                    f"Content-Length: {len(body)}",
+                    "Cache-Control: no-cache", # always revalidate, the ETag keeps that cheap
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}",
+                ]
+                if etag:
+                    response_headers.append(f"ETag: {etag}")
+                writer.write(("\r\n".join(response_headers) + "\r\n\r\n").encode("latin-1"))
+                if method != "HEAD":
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+async def serve(dashboard, host="127.0.0.1", port=8000, scan_seconds=DASHBOARD_SCAN_SECONDS):
+    try:
+        dashboard.refresh()
+    except (Exception, SystemExit) as error: # serve what there is, the scans pick the rest up
+        print(f"{datetime.now():%H:%M:%S} scan of {dashboard.logs_dir} failed: {error!r}", file=sys.stderr)
+    server = await asyncio.start_server(dashboard.handle_connection, host, port)
+    scanner = asyncio.ensure_future(dashboard.scan_forever(scan_seconds))
+    address = server.sockets[0].getsockname()
+    print(f"Serving {len(dashboard.nights)} nights on http://{address[0]}:{address[1]}/")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        scanner.cancel()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve poker night stats and graphs over HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on")
+    parser.add_argument("--logs", default="logs", help="directory of poker_night_YYYYMMDD.csv files")
+    parser.add_argument("--scan-seconds", type=float, default=DASHBOARD_SCAN_SECONDS, help="how often to look for new or changed csvs")
+    parser.add_argument("--no-cache", action="store_true", help=f"parse every csv from scratch instead of using {poker.PARSED_NIGHT_CACHE_DIR}")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(Dashboard(args.logs, use_cache=not args.no_cache), args.host, args.port, args.scan_seconds))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
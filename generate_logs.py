@@ -0,0 +1,494 @@
+import argparse
+import os
+import random
+import string
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from itertools import combinations
+
+from regex_based_graph_night import KNOWN_NAME_FIX_UPS
+
+# Writes synthetic poker night csvs in the same `entry,at,order` export format as the real logs (newest row first),
+# for stress and benchmark runs at sizes our real history won't reach for years. Hands follow no limit hold'em rules:
+# blinds, min raises, all-ins, uncalled bets, side pots and showdowns. Players join, rebuy, stand up, sit back, quit
+# and get admin stack updates, and chips are never created or lost, so every night's profits still sum to zero.
+# StackHistory doesn't take admin updates off what a player quits with, so players the admin topped up stay until the end.
+# Every night gets its own random stream from the seed, so a night's log only depends on the seed and its index.
+
+SMALL_BLIND = 10
+BIG_BLIND = 20
+BUY_IN = 1000
+MAX_SEATS = 10
+SUITS = "♠♥♦♣"
+RANK_NAMES = {10: "10", 11: "J", 12: "Q", 13: "K", 14: "A"}
+ID_CHARACTERS = string.ascii_letters + string.digits + "-_"
+
+# One raw alias per player the parser knows, so every generated name normalizes to a distinct player
+PLAYER_ALIASES = {}
+for alias, player in KNOWN_NAME_FIX_UPS.items():
+    if " " not in alias:
+        PLAYER_ALIASES.setdefault(player, alias)
+PLAYER_ALIASES.setdefault("George", "georgeorg")
+
+def rank_name(rank):
+    return RANK_NAMES.get(rank, str(rank))
+
+def card_name(card):
+    return rank_name(card[0]) + card[1]
+
+def cards_text(cards):
+    return ", ".join(card_name(card) for card in cards)
+
+### Showdown hand evaluation
+
+def score_five(cards):
+    ranks = sorted((rank for rank, _ in cards), reverse=True)
+    counts = {}
+    for rank in ranks:
+        counts[rank] = counts.get(rank, 0) + 1
+    groups = sorted(((count, rank) for rank, count in counts.items()), reverse=True)
+    flush = len({suit for _, suit in cards}) == 1
+    straight_high = None
+    if len(counts) == 5:
+        if ranks[0] - ranks[4] == 4:
+            straight_high = ranks[0]
+        elif ranks == [14, 5, 4, 3, 2]:
+            straight_high = 5 # the wheel
+
+    if straight_high and flush:
+        return (8, straight_high)
+    if groups[0][0] == 4:
+        return (7, groups[0][1], groups[1][1])
+    if groups[0][0] == 3 and groups[1][0] == 2:
+        return (6, groups[0][1], groups[1][1])
+    if flush:
+        return (5, *ranks)
+    if straight_high:
+        return (4, straight_high)
+    if groups[0][0] == 3:
+        return (3, groups[0][1], *[rank for _, rank in groups[1:]])
+    if groups[0][0] == 2 and groups[1][0] == 2:
+        return (2, groups[0][1], groups[1][1], groups[2][1])
+    if groups[0][0] == 2:
+        return (1, groups[0][1], *[rank for _, rank in groups[1:]])
+    return (0, *ranks)
+
+# Returns (score, best five cards) of a player's hole cards plus the board
+def best_hand(cards):
+    return max(((score_five(five), five) for five in combinations(cards, 5)), key=lambda scored: scored[0])
+
+# The "Two Pair, Q's & 6's" style description the site writes for a winning hand
+def describe_hand(score):
+    category, ranks = score[0], score[1:]
+    if category == 8:
+        return "Royal Flush" if ranks[0] == 14 else f"Straight Flush, {rank_name(ranks[0])} High"
+    if category == 7:
+        return f"Four of a Kind, {rank_name(ranks[0])}'s"
+    if category == 6:
+        return f"Full House, {rank_name(ranks[0])}'s over {rank_name(ranks[1])}'s"
+    if category == 5:
+        return f"Flush, {rank_name(ranks[0])} High"
+    if category == 4:
+        return f"Straight, {rank_name(ranks[0])} High"
+    if category == 3:
+        return f"Three of a Kind, {rank_name(ranks[0])}'s"
+    if category == 2:
+        return f"Two Pair, {rank_name(ranks[0])}'s & {rank_name(ranks[1])}'s"
+    if category == 1:
+        return f"Pair, {rank_name(ranks[0])}'s"
+    return f"{rank_name(ranks[0])} High"
+
+### Log rows
+
+class NightLog():
+    def __init__(self, start):
+        self.ms = int(start.timestamp() * 1000)
+        self.sequence = 0
+        self.rows = [] # oldest first
+
+    # moves the clock on, rows logged at the same millisecond get increasing order suffixes like the real exports
+    def wait(self, rng, low, high):
+        self.ms += int(rng.uniform(low, high) * 1000)
+        self.sequence = 0
+
+    def log(self, entry):
+        if self.sequence == 100:
+            self.ms += 1
+            self.sequence = 0
+        at = datetime.fromtimestamp(self.ms / 1000, tz=timezone.utc)
+        at_text = at.strftime("%Y-%m-%dT%H:%M:%S.") + f"{self.ms % 1000:03d}Z"
+        entry_text = entry.replace('"', '""')
+        self.rows.append(f'"{entry_text}",{at_text},{self.ms * 100 + self.sequence}\n')
+        self.sequence += 1
+
+    def csv_lines(self):
+        return ["entry,at,order\n"] + self.rows[::-1]
+
+class Player():
+    def __init__(self, alias, player_id):
+        self.alias = alias
+        self.player_id = player_id
+        self.seat = None
+        self.stack = 0
+        self.standing = False
+        self.joining = False # approved, gets dealt in from the next hand
+        self.topped_up = False
+
+    @property
+    def tag(self):
+        return f'"{self.alias} @ {self.player_id}"'
+
+### Hands
+
+class Hand():
+    def __init__(self, rng, log, players, dealer_index, hand_number, owner):
+        self.rng = rng
+        self.log = log
+        self.players = players # dealt in, in seat order starting left of the dealer
+        self.dealer = players[dealer_index]
+        self.hand_number = hand_number
+        self.owner = owner
+        self.deck = [(rank, suit) for rank in range(2, 15) for suit in SUITS]
+        rng.shuffle(self.deck)
+        self.hole_cards = {player: [self.deck.pop(), self.deck.pop()] for player in players}
+        self.board = []
+        self.contributed = {player: 0 for player in players} # whole hand
+        self.committed = {} # this street
+        self.folded = set()
+        self.all_in = set()
+        self.shown = False
+
+    def live_players(self):
+        return [player for player in self.players if player not in self.folded]
+
+    def can_act(self, player):
+        return player not in self.folded and player not in self.all_in
+
+    def put_in(self, player, amount):
+        amount = min(amount, player.stack)
+        player.stack -= amount
+        self.committed[player] = self.committed.get(player, 0) + amount
+        self.contributed[player] += amount
+        if player.stack == 0:
+            self.all_in.add(player)
+        return amount
+
+    def act(self, player, text):
+        self.log.wait(self.rng, 0.4, 8)
+        all_in = " and go all in" if player in self.all_in else ""
+        self.log.log(f"{player.tag} {text}{all_in}")
+
+    def post(self, player, blind, amount):
+        self.put_in(player, amount)
+        if player in self.all_in: # the site writes these with a trailing space
+            self.log.log(f"{player.tag} posts a {blind} of {self.committed[player]} and go all in ")
+        else:
+            self.log.log(f"{player.tag} posts a {blind} of {self.committed[player]}")
+
+    def play(self, straddle):
+        log = self.log
+        heads_up = len(self.players) == 2
+        # heads up the dealer posts the small blind, players are listed starting left of the dealer
+        order = self.players[-1:] + self.players[:-1] if heads_up else self.players
+        if self.owner in self.players:
+            log.log(f"Your hand is {cards_text(self.hole_cards[self.owner])}")
+        self.post(order[0], "small blind", SMALL_BLIND)
+        self.post(order[1], "big blind", BIG_BLIND)
+        blinds = 2
+        if straddle and len(order) > 3 and order[2].stack > 2 * BIG_BLIND:
+            self.post(order[2], "straddle", 2 * BIG_BLIND)
+            blinds = 3
+        preflop_order = order[blinds:] + order[:blinds]
+        self.betting_round(preflop_order, max(self.committed.values()), BIG_BLIND)
+
+        postflop_order = self.players if not heads_up else order[1:] + order[:1]
+        for street, cards in (("Flop", 3), ("Turn", 1), ("River", 1)):
+            if len(self.live_players()) < 2:
+                break
+            if sum(1 for player in self.live_players() if self.can_act(player)) < 2:
+                self.show_down() # everyone left is all in, show the hands and run out the board
+            self.deal(street, cards)
+            if sum(1 for player in self.live_players() if self.can_act(player)) >= 2:
+                self.committed = {}
+                self.betting_round(postflop_order, 0, 0)
+        self.finish()
+
+    def deal(self, street, cards):
+        self.log.wait(self.rng, 0.5, 4)
+        new_cards = [self.deck.pop() for _ in range(cards)]
+        if street == "Flop":
+            self.log.log(f"Flop:  [{cards_text(new_cards)}]")
+        else:
+            self.log.log(f"{street}: {cards_text(self.board)} [{cards_text(new_cards)}]")
+        self.board += new_cards
+
+    def betting_round(self, action_order, current_bet, last_raise):
+        rng = self.rng
+        last_raise = max(last_raise, BIG_BLIND)
+        pending = [player for player in action_order if self.can_act(player)]
+        may_raise = set(pending)
+        while pending and len(self.live_players()) > 1:
+            player = pending.pop(0)
+            if not self.can_act(player):
+                continue
+            committed = self.committed.get(player, 0)
+            to_call = current_bet - committed
+            pot = sum(self.contributed.values())
+            raise_to = None
+            if to_call == 0:
+                if rng.random() < 0.3 and player in may_raise:
+                    raise_to = current_bet + max(last_raise, 10 * round(pot * rng.choice([0.5, 0.75, 1.0]) / 10))
+                else:
+                    self.act(player, "checks")
+                    continue
+            else:
+                choice = rng.random()
+                if choice < 0.4:
+                    self.folded.add(player)
+                    self.act(player, "folds")
+                    continue
+                if choice < 0.85 or player not in may_raise or player.stack <= to_call:
+                    self.put_in(player, to_call)
+                    self.act(player, f"calls {self.committed[player]}")
+                    continue
+                raise_to = current_bet + max(last_raise, 10 * round(pot * rng.choice([0.5, 1.0, 2.0]) / 10))
+            if rng.random() < 0.05:
+                raise_to = committed + player.stack # shove
+
+            self.put_in(player, raise_to - committed)
+            new_bet = self.committed[player]
+            if new_bet <= current_bet: # all in for less than a call
+                self.act(player, f"calls {new_bet}")
+                continue
+            verb = "bets" if current_bet == 0 else "raises to"
+            self.act(player, f"{verb} {new_bet}")
+            others = [p for p in action_order[action_order.index(player) + 1:] + action_order[:action_order.index(player)] if self.can_act(p)]
+            if new_bet - current_bet >= last_raise:
+                last_raise = new_bet - current_bet
+                may_raise = set(others) # a full raise reopens the betting
+            else:
+                may_raise -= set(pending) ^ set(others) # a short all in raise only lets the players yet to act raise
+            current_bet = new_bet
+            pending = others
+
+    def show_down(self):
+        if self.shown:
+            return
+        self.shown = True
+        self.log.wait(self.rng, 0.5, 2)
+        for player in self.live_players():
+            self.log.log(f"{player.tag} shows a {cards_text(self.hole_cards[player])}.")
+
+    def finish(self):
+        log = self.log
+        live_players = self.live_players()
+        # the biggest bet nobody matched goes back first
+        contributions = sorted(self.contributed.values(), reverse=True)
+        top_player = max(self.contributed, key=lambda player: self.contributed[player])
+        uncalled = contributions[0] - (contributions[1] if len(contributions) > 1 else 0)
+        if uncalled and (top_player in live_players):
+            log.wait(self.rng, 0.3, 1)
+            log.log(f"Uncalled bet of {uncalled} returned to {top_player.tag}")
+            self.contributed[top_player] -= uncalled
+            top_player.stack += uncalled
+
+        showdown = len(live_players) > 1
+        if showdown:
+            self.show_down()
+            scores = {player: best_hand(self.hole_cards[player] + self.board) for player in live_players}
+        for amount, eligible in self.pots(live_players):
+            if showdown:
+                best_score = max(scores[player][0] for player in eligible)
+                winners = [player for player in eligible if scores[player][0] == best_score]
+            else:
+                winners = eligible
+            share, odd_chips = divmod(amount, len(winners))
+            for i, winner in enumerate(winners):
+                won = share + (1 if i < odd_chips else 0)
+                winner.stack += won
+                if showdown:
+                    score, five = scores[winner]
+                    log.log(f"{winner.tag} collected {won} from pot with {describe_hand(score)} (combination: {cards_text(five)})")
+                else:
+                    log.log(f"{winner.tag} collected {won} from pot")
+        log.log(f"-- ending hand #{self.hand_number} --")
+
+        if len(self.board) < 5 and self.rng.random() < 0.3: # rabbit hunt
+            log.wait(self.rng, 0.5, 2)
+            rest = [self.deck.pop() for _ in range(5 - len(self.board))]
+            log.log(f"Undealt cards: {cards_text(self.board)} [{cards_text(rest)}]")
+        if not showdown and self.rng.random() < 0.1:
+            log.wait(self.rng, 0.5, 2)
+            log.log(f"{live_players[0].tag} shows a {cards_text(self.hole_cards[live_players[0]])}.")
+
+    # Main pot first, then a side pot per all-in level, each with the players still in that can win it
+    def pots(self, live_players):
+        levels = sorted({self.contributed[player] for player in live_players})
+        pots, previous_level = [], 0
+        for level in levels:
+            amount = sum(min(c, level) - min(c, previous_level) for c in self.contributed.values())
+            eligible = [player for player in live_players if self.contributed[player] >= level]
+            if pots and pots[-1][1] == eligible:
+                pots[-1][0] += amount
+            else:
+                pots.append([amount, eligible])
+            previous_level = level
+        # folded players can have put in more than anyone left, that still goes to the last pot
+        pots[-1][0] += sum(max(0, c - previous_level) for c in self.contributed.values())
+        return [(amount, eligible) for amount, eligible in pots if amount]
+
+### Nights
+
+def _new_id(rng, length, characters=ID_CHARACTERS):
+    return "".join(rng.choice(characters) for _ in range(length))
+
+def generate_night(seed, night_date, players=6, hands=120, max_players=MAX_SEATS):
+    rng = random.Random(f"{seed}-{night_date.isoformat()}")
+    log = NightLog(datetime.combine(night_date + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc) + timedelta(minutes=30))
+    pool = [Player(alias, _new_id(rng, 10)) for alias in rng.sample(sorted(PLAYER_ALIASES.values()), len(PLAYER_ALIASES))]
+    owner = pool[0]
+    at_table = [] # seated or standing, in seat order
+    straddles = rng.random() < 0.3
+
+    def request_seat(player):
+        free_seats = sorted(set(range(1, MAX_SEATS + 1)) - {p.seat for p in at_table})
+        player.seat = rng.choice(free_seats)
+        player.stack = BUY_IN
+        player.standing = False
+        player.joining = True
+        at_table.append(player)
+        at_table.sort(key=lambda p: p.seat)
+        pool.remove(player)
+        log.wait(rng, 1, 20)
+        log.log(f"The player {player.tag} requested a seat.")
+        log.wait(rng, 1, 20)
+        log.log(f"The admin approved the player {player.tag} participation with a stack of {BUY_IN}.")
+
+    def quit_game(player):
+        log.wait(rng, 0.5, 5)
+        log.log(f"The player {player.tag} quits the game with a stack of {player.stack}.")
+        at_table.remove(player)
+        player.seat = None
+        pool.append(player)
+
+    for player in pool[:min(players, max_players, len(pool))]:
+        request_seat(player)
+
+    dealer_seat = 0
+    for hand_number in range(1, hands + 2):
+        log.wait(rng, 2, 10)
+        log.log(f"-- starting hand #{hand_number} (id: {_new_id(rng, 12, string.ascii_lowercase + string.digits)})  No Limit Texas Hold'em (dealer: {{dealer}}) --")
+        header_index = len(log.rows) - 1
+        for player in at_table:
+            if player.joining:
+                player.joining = False
+                log.log(f"The player {player.tag} joined the game with a stack of {player.stack}.")
+        dealt_in = [player for player in at_table if not player.standing and player.stack > 0]
+        # move the button to the next player dealt in after the last dealer's seat
+        later = [player for player in dealt_in if player.seat > dealer_seat]
+        dealer = later[0] if later else dealt_in[0]
+        dealer_seat = dealer.seat
+        log.rows[header_index] = log.rows[header_index].replace("{dealer}", dealer.tag.replace('"', '""'))
+        stacks = " | ".join(f"#{player.seat} {player.tag} ({player.stack})" for player in dealt_in)
+        log.log(f"Player stacks: {stacks}")
+        dealer_index = dealt_in.index(dealer)
+        hand_players = dealt_in[dealer_index + 1:] + dealt_in[:dealer_index + 1] # left of the dealer first
+        hand = Hand(rng, log, hand_players, len(hand_players) - 1, hand_number, owner)
+        if hand_number > hands:
+            # the export stops in the middle of the last hand, like the real ones do
+            hand.post(hand_players[0 if len(hand_players) > 2 else 1], "small blind", SMALL_BLIND)
+            break
+        standing = [player for player in at_table if player.standing]
+        if standing and rng.random() < 0.3: # back from the fridge in the middle of a hand
+            player = rng.choice(standing)
+            log.wait(rng, 1, 10)
+            log.log(f"The player {player.tag} sit back with the stack of {player.stack}.")
+            player.standing = False
+        hand.play(straddles)
+
+        # between hands: busted players rebuy or leave, people stand up, quit, top up or show up
+        busted = [player for player in at_table if player.stack == 0]
+        if busted:
+            log.wait(rng, 1, 3)
+            log.log("Asking to busted players the rebuy decision.")
+        for player in busted:
+            if player.topped_up or rng.random() < 0.7:
+                log.wait(rng, 1, 10)
+                log.log(f"The player {player.tag} requested a rebuy of {BUY_IN}.")
+                log.log("Waiting for the game owner to approve or reject pending rebuy requests.")
+                log.wait(rng, 1, 5)
+                player.stack = BUY_IN
+                log.log(f"The player {player.tag} rebought. New stack {BUY_IN}.")
+            else:
+                quit_game(player)
+        for player in list(at_table):
+            seated = sum(1 for p in at_table if not p.standing)
+            if player.joining or player.standing:
+                if player.standing and rng.random() < 0.02:
+                    quit_game(player)
+                continue
+            if player.topped_up:
+                continue
+            if seated > 3 and rng.random() < 0.01:
+                quit_game(player)
+            elif seated > 3 and rng.random() < 0.01:
+                log.wait(rng, 0.5, 5)
+                log.log(f"The player {player.tag} stand up with the stack of {player.stack}.")
+                player.standing = True
+            elif player.stack < 5 * BIG_BLIND and rng.random() < 0.1:
+                log.wait(rng, 0.5, 5)
+                log.log(f"The admin updated the player {player.tag} stack from {player.stack} to {player.stack + BUY_IN}.")
+                player.stack += BUY_IN
+                player.topped_up = True
+        if hand_number == hands:
+            # the profits only count players dealt into the last hand, so nobody is left standing
+            for player in [player for player in at_table if player.standing]:
+                quit_game(player)
+        elif pool and len(at_table) < max_players and rng.random() < (0.2 if len(at_table) < players else 0.02):
+            request_seat(rng.choice(pool))
+
+    return log.csv_lines()
+
+def write_night(out_dir, seed, night_date, players, hands, max_players):
+    csv_file = os.path.join(out_dir, f"poker_night_{night_date.strftime('%Y%m%d')}.csv")
+    with open(csv_file, "w") as file:
+        file.writelines(generate_night(seed, night_date, players, hands, max_players))
+    return csv_file
+
+# One night a week from start_date. Nights don't depend on each other, so jobs > 1 writes the same files in a process pool
+def write_nights(out_dir, nights, seed=0, start_date=date(2030, 1, 3), players=6, hands=120, max_players=MAX_SEATS, jobs=1):
+    os.makedirs(out_dir, exist_ok=True)
+    night_dates = [start_date + timedelta(weeks=night) for night in range(nights)]
+    if jobs <= 1 or nights <= 1:
+        return [write_night(out_dir, seed, night_date, players, hands, max_players) for night_date in night_dates]
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(write_night, out_dir, seed, night_date, players, hands, max_players) for night_date in night_dates]
+        return [future.result() for future in futures]
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write synthetic poker night csvs for stress and benchmark runs",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("-o", "--out-dir", default="generated_logs", help="directory to write the poker_night_YYYYMMDD.csv files to")
+    parser.add_argument("-n", "--nights", type=int, default=1, help="number of weekly game nights to write")
+    parser.add_argument("--seed", type=int, default=0, help="random seed, the same seed writes the same csvs")
+    parser.add_argument("--start-date", type=date.fromisoformat, default=date(2030, 1, 3), help="date of the first night")
+    parser.add_argument("--players", type=int, default=6, help="players at the table when the night starts")
+    parser.add_argument("--max-players", type=int, default=MAX_SEATS, help="most players at the table at once (10 handed at most)")
+    parser.add_argument("--hands", type=int, default=120, help="hands played per night")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="write nights in this many processes (0 uses every core)")
+    args = parser.parse_args()
+
+    if not 2 <= args.players <= args.max_players <= MAX_SEATS:
+        parser.error(f"need 2 <= --players <= --max-players <= {MAX_SEATS}")
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 (every core) or a positive number of processes")
+    jobs = args.jobs or os.cpu_count() or 1
+    csv_files = write_nights(args.out_dir, args.nights, args.seed, args.start_date, args.players, args.hands, args.max_players, jobs)
+    print(f"Wrote {len(csv_files)} nights to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
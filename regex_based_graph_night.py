@@ -1,16 +1,17 @@
-import csv, json, os
-import matplotlib.pyplot as plt
-import pandas as pd
-from datetime import datetime
-from matplotlib.dates import DateFormatter
+import csv, hashlib, io, json, mmap, os, pickle, struct, sys, threading, time
+import numpy as np
+from datetime import datetime, timedelta, timezone
 import argparse
 import re
 import warnings
 from pprint import pprint
-from collections import defaultdict
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, redirect_stdout
 from enum import Enum
-from functools import reduce
-from urllib.parse import urlencode
+from itertools import combinations, repeat
+from http.client import HTTPConnection, HTTPSConnection, RemoteDisconnected
+from urllib.parse import urlencode, urlsplit
 from urllib.error import HTTPError
 from urllib.request import Request, urlopen
 
@@ -99,12 +100,50 @@ class RoundAction(Enum):
     checks = "checks"
     calls = "calls"
 
+# Streets an action can happen on, in order. Each new table card moves the round on to the next one.
+PRE_FLOP, PRE_TURN, PRE_RIVER, POST_RIVER = range(4)
+STREETS = ["Pre-flop", "Pre-turn", "Pre-river", "Post-river"]
+
+# Round records keep the raw integer order timestamp (1e-5 second resolution) and only build a datetime
+# when something wants to display or graph it. There are hundreds of thousands of these across all nights.
+def time_of_order(order):
+    return datetime.fromtimestamp(order / 100000)
+
+# time_of_order for a list of orders, as datetime64[us]. Orders are in units of 10us since the epoch, so that's one
+# multiply and the local utc offset. The offset is checked at the first and last order and every hour in between
+# (daylight saving changes are months apart, so two can't hide between checks); when it changes anywhere in there, or
+# the orders span more than a day (more than one night), every order is converted on its own instead.
+ORDERS_PER_HOUR = 3600 * 100000
+
+def _utc_offset_of_order(order):
+    return time_of_order(order) - datetime.fromtimestamp(order / 100000, timezone.utc).replace(tzinfo=None)
+
+def times_of_orders(orders):
+    orders = np.array(orders, dtype=np.int64)
+    if not len(orders):
+        return orders.astype("datetime64[us]")
+    first, last = int(orders.min()), int(orders.max())
+    if last - first <= 24 * ORDERS_PER_HOUR:
+        offsets = {_utc_offset_of_order(order) for order in [*range(first, last, ORDERS_PER_HOUR), last]}
+        if len(offsets) == 1:
+            return (orders * 10 + offsets.pop() // timedelta(microseconds=1)).astype("datetime64[us]")
+    return np.array([time_of_order(order) for order in orders.tolist()], dtype="datetime64[us]")
+
 class PlayerRoundAction():
-    def __init__(self, player, round_action, unix_time, amount=0):
+    __slots__ = ("player", "amount", "action_type", "order", "all_in", "street", "poker_round")
+
+    def __init__(self, player, round_action, unix_time, amount=0, all_in=False, street=PRE_FLOP, poker_round=None):
         self.player = player
         self.amount = int(amount)
         self.action_type = round_action
-        self.time = datetime.fromtimestamp(int(unix_time) / 100000)
+        self.order = int(unix_time)
+        self.all_in = all_in
+        self.street = street
+        self.poker_round = poker_round # the PokerRound this action was taken in
+
+    @property
+    def time(self):
+        return time_of_order(self.order)
 
     def to_string(self):
         if self.amount > 0:
@@ -118,284 +157,681 @@ TYPE_EXIT = 4
 TYPE_REBUY = 5
 
 class PlayerMovement():
+    __slots__ = ("amount", "movement_type", "order")
+
     def __init__(self, amount, unix_time, movement_type):
         self.amount = int(amount)
         self.movement_type = movement_type
-        self.time = datetime.fromtimestamp(int(unix_time) / 100000)
+        self.order = int(unix_time)
 
-class PokerNightEvent():
-    def __init__(self, date, event_logs):
-        self.date = date
+    @property
+    def time(self):
+        return time_of_order(self.order)
 
-        round_logs = []
-        log_idx = 0
-        while (log_idx < len(event_logs)):
-            row = event_logs[log_idx]
-            if re.match(START_HAND_REGEX, row):
-                start_idx = log_idx
-                end_idx = start_idx + 1
-                # loop until we get to the next hand
-                while (end_idx < len(event_logs) and not re.match(START_HAND_REGEX, event_logs[end_idx])):
-                    end_idx += 1
-                round_logs.append(event_logs[start_idx:end_idx])
-                log_idx = end_idx - 1
-            log_idx += 1
+### Log events
+# Every chronologically ordered log row becomes exactly one typed, slotted event record. `order` is the raw
+# integer from the csv's order column (1e-5 second resolution), or None for continuation rows of multi-line entries.
 
-        self.rounds = []
-        for round_log in round_logs:
-            poker_round = PokerRound(round_log)
-            self.rounds.append(poker_round)
+class LogEvent():
+    __slots__ = ("order",)
 
-    def player_stack_history(self):
-        player_to_stack_history = {} # player_name to array of tuples of (amount, hand_time)
-        player_buyin_amount = {}
-        player_sitting_at_table = {}
-        player_adjustments = {}
-        player_exit = {}
-        for poker_round in self.rounds:
-            balances, stand_ups, sit_downs, joins, exits, adjustments = poker_round.player_balances, poker_round.players_stood_up, poker_round.players_sat_down, poker_round.player_game_joins, poker_round.players_exited, poker_round.admin_adjustments
-
-            # some buyins occur before the Player Stacks line in a round, some come after the end. Can have multiple joins per
-            for player, joins_array in joins.items():
-                for join in joins_array:
-                    if join.time < poker_round.start_time:
-                        player_buyin_amount[player] = join.amount + player_buyin_amount.get(player, 0)
-                        if previous_exit := player_exit.get(player):
-                            player_buyin_amount[player] -= previous_exit.amount # if they had exited before, keep track of what they left with in new buyin
-                        player_sitting_at_table[player] = True
-                        player_exit.pop(player, None)
-
-            # check for exits from last round, make sure we record their final balance
-            for player, exit in player_exit.items():
-                # check they haven't come back at the start of the round
-                if not player_sitting_at_table.get(player, False):
-                    exited_profit = exit.amount - player_buyin_amount[player]
-                    existing_player_stack_history = player_to_stack_history.get(player, [])
-                    existing_player_stack_history.append(
-                        (exited_profit, poker_round.start_time)
-                    )
-                    player_to_stack_history[player] = existing_player_stack_history
+    def __init__(self, order):
+        self.order = order
 
-            # CORE PROFIT CALCULATION
-            for player, balance in balances.items():
-                adjusted_balance = balance - player_adjustments.get(player, 0)
+    def __repr__(self):
+        fields = [name for cls in reversed(type(self).__mro__) for name in getattr(cls, "__slots__", ())]
+        return "{}({})".format(type(self).__name__, ", ".join(f"{name}={getattr(self, name)!r}" for name in fields))
 
-                profit = adjusted_balance - player_buyin_amount[player]
-                existing_player_stack_history = player_to_stack_history.get(player, [])
-                existing_player_stack_history.append(
-                    (profit, poker_round.start_time)
-                )
-                player_to_stack_history[player] = existing_player_stack_history
+class HandStart(LogEvent):
+    __slots__ = ("round_number",)
+
+    def __init__(self, order, round_number):
+        self.order = order
+        self.round_number = round_number
+
+class HandEnd(LogEvent):
+    __slots__ = ()
+
+class Stacks(LogEvent):
+    __slots__ = ("balances",)
+
+    def __init__(self, order, balances):
+        self.order = order
+        self.balances = balances # player name to stack at the start of the hand
+
+class PlayerAction(LogEvent):
+    __slots__ = ("player", "amount", "all_in")
+
+    def __init__(self, order, player, amount=0, all_in=False):
+        self.order = order
+        self.player = player
+        self.amount = amount
+        self.all_in = all_in
+
+class Post(PlayerAction):
+    __slots__ = ("blind",) # "small blind", "big blind" or "straddle"
+
+    def __init__(self, order, player, blind, amount, all_in=False):
+        super().__init__(order, player, amount, all_in)
+        self.blind = blind
+
+    @property
+    def action_type(self):
+        return RoundAction(self.blind)
+
+class Fold(PlayerAction):
+    __slots__ = ()
+    action_type = RoundAction.folds
+
+class Check(PlayerAction):
+    __slots__ = ()
+    action_type = RoundAction.checks
+
+class Call(PlayerAction):
+    __slots__ = ()
+    action_type = RoundAction.calls
+
+class Bet(PlayerAction):
+    __slots__ = ()
+    action_type = RoundAction.bets
+
+class Raise(PlayerAction):
+    __slots__ = ()
+    action_type = RoundAction.raises
+
+class Show(LogEvent):
+    __slots__ = ("player", "hand")
+
+    def __init__(self, order, player, hand):
+        self.order = order
+        self.player = player
+        self.hand = hand
+
+class Collect(LogEvent):
+    __slots__ = ("player", "amount", "hand")
+
+    def __init__(self, order, player, amount, hand=None):
+        self.order = order
+        self.player = player
+        self.amount = amount
+        self.hand = hand # None when the pot was won without a showdown
+
+class Flop(LogEvent):
+    __slots__ = ("cards",)
+
+    def __init__(self, order, cards):
+        self.order = order
+        self.cards = cards
+
+class Turn(LogEvent):
+    __slots__ = ("card",)
+
+    def __init__(self, order, card):
+        self.order = order
+        self.card = card
+
+class River(Turn):
+    __slots__ = ()
+
+class Undealt(Flop):
+    __slots__ = ()
+
+class PlayerMovementEvent(LogEvent):
+    __slots__ = ("player", "amount")
 
-            # sit downs occur during the round
-            for player, sit_down in sit_downs.items():
-                player_sitting_at_table[player] = True
-                player_exit.pop(player, None)
+    def __init__(self, order, player, amount):
+        self.order = order
+        self.player = player
+        self.amount = amount
+
+class Join(PlayerMovementEvent):
+    __slots__ = ()
+    movement_type = TYPE_JOIN
+
+class Rebuy(PlayerMovementEvent):
+    __slots__ = ()
+    movement_type = TYPE_REBUY
+
+class Sit(PlayerMovementEvent):
+    __slots__ = ()
+    movement_type = TYPE_SIT
+
+class Stand(PlayerMovementEvent):
+    __slots__ = ()
+    movement_type = TYPE_STAND
 
-            # add in buyins that occurred after the end of the round
-            for player, joins_array in joins.items():
-                for join in joins_array:
-                    # Check that the player didn't just sit down as we don't want to double count thier money in play
-                    if join.time >= poker_round.start_time and (
-                        not player_sitting_at_table.get(player, False)
-                        or join.movement_type == TYPE_REBUY
-                    ):
-                        player_sitting_at_table[player] = True
-                        player_buyin_amount[player] = join.amount + player_buyin_amount.get(player, 0)
-                        if previous_exit := player_exit.get(player):
-                            player_buyin_amount[player] -= previous_exit.amount # if they had exited before, keep track of what they left with in new buyin
-                        player_exit.pop(player, None)
+class Quit(PlayerMovementEvent):
+    __slots__ = ()
+    movement_type = TYPE_EXIT
 
+class AdminAdjust(LogEvent):
+    __slots__ = ("player", "from_stack", "to_stack")
 
+    def __init__(self, order, player, from_stack, to_stack):
+        self.order = order
+        self.player = player
+        self.from_stack = from_stack
+        self.to_stack = to_stack
+
+class Unrecognized(LogEvent):
+    __slots__ = ("row",)
+
+    def __init__(self, order, row):
+        self.order = order
+        self.row = row
+
+# Event records only hold builtins, so they can be stored as plain tuples of (type code, *slot values)
+EVENT_TYPES = (
+    HandStart, HandEnd, Stacks, Post, Fold, Check, Call, Bet, Raise, Show, Collect, Flop, Turn, River, Undealt,
+    Join, Rebuy, Sit, Stand, Quit, AdminAdjust, Unrecognized,
+)
+EVENT_FIELDS = [
+    tuple(name for cls in reversed(event_type.__mro__) for name in getattr(cls, "__slots__", ()))
+    for event_type in EVENT_TYPES
+]
+EVENT_CODES = {event_type: code for code, event_type in enumerate(EVENT_TYPES)}
+
+def event_to_tuple(event):
+    code = EVENT_CODES[type(event)]
+    return (code, *[getattr(event, name) for name in EVENT_FIELDS[code]])
+
+def event_from_tuple(values):
+    event_type = EVENT_TYPES[values[0]]
+    event = event_type.__new__(event_type)
+    for name, value in zip(EVENT_FIELDS[values[0]], values[1:]):
+        setattr(event, name, value)
+    return event
+
+def _row_order(row):
+    order = row.rsplit(",", 1)[-1].strip()
+    return int(order) if order.isdigit() else None
+
+def _player_action(row, regex, event_type):
+    action_match = regex.match(row)
+    if not action_match:
+        return None
+    all_in = "go all in" in row
+    if event_type is Post:
+        player, blind, amount, unix_time = action_match.groups()
+        return Post(int(unix_time), sys.intern(player), blind, int(amount), all_in)
+    if event_type is Fold or event_type is Check:
+        player, unix_time = action_match.groups()
+        return event_type(int(unix_time), sys.intern(player), all_in=all_in)
+    player, amount, unix_time = action_match.groups()
+    return event_type(int(unix_time), sys.intern(player), int(amount), all_in)
+
+def _player_movement(row, regex, event_type):
+    if movement_match := regex.match(row):
+        player, amount, unix_time = movement_match.groups()
+        return event_type(int(unix_time), sys.intern(player), int(amount))
+    return None
+
+# Dispatch the row on a cheap literal prefix (or the verb right after the quoted player name) and then run
+# exactly one capturing match. Returns None when the row looked like a known event but didn't match its pattern.
+# Player names are interned so every record of a player shares one string.
+def _classify_known_row(row):
+    if row.startswith('"""'):
+        verb = row[row.find('"" ', 3) + 3:]
+        if verb.startswith("folds"):
+            return _player_action(row, PLAYER_FOLDS_REGEX, Fold)
+        elif verb.startswith("checks"):
+            return _player_action(row, PLAYER_CHECKS_REGEX, Check)
+        elif verb.startswith("calls"):
+            return _player_action(row, PLAYER_CALLS_REGEX, Call)
+        elif verb.startswith("bets"):
+            return _player_action(row, PLAYER_BETS_REGEX, Bet)
+        elif verb.startswith("raises"):
+            return _player_action(row, PLAYER_RAISES_REGEX, Raise)
+        elif verb.startswith("posts"):
+            return _player_action(row, PLAYER_INITIAL_POST_REGEX, Post)
+        elif verb.startswith("collected"):
+            if winning_info := PLAYER_WINNER_WITH_HAND_REGEX.match(row):
+                player, amount, hand = winning_info.groups()
+                return Collect(_row_order(row), sys.intern(player), int(amount), hand)
+            # The winning hand is optional, as folks can win if everyone folds without showing their hand
+            if winning_info := PLAYER_WINNER_WITHOUT_HAND_REGEX.match(row):
+                player, amount = winning_info.groups()
+                return Collect(_row_order(row), sys.intern(player), int(amount))
+        elif " shows a " in row:
+            if hand_match := PLAYER_HAND_REGEX.match(row):
+                player, hand = hand_match.groups()
+                return Show(_row_order(row), sys.intern(player), hand)
+    elif row.startswith('"Player stacks'):
+        balances = {sys.intern(player): int(stack) for player, stack in PLAYER_STACK_REGEX.findall(row)}
+        return Stacks(_row_order(row), balances)
+    elif row.startswith('"-- starting hand #'):
+        if start_match := START_HAND_REGEX.match(row):
+            round_number, unix_time = start_match.groups()
+            return HandStart(int(unix_time), int(round_number))
+    elif row.startswith('"-- ending hand #'):
+        return HandEnd(_row_order(row))
+    elif row.startswith('"Flop:'):
+        if flop_match := FLOP_CARDS_REGEX.match(row):
+            table_cards, unix_time = flop_match.groups()
+            return Flop(int(unix_time), table_cards.split(", "))
+    elif row.startswith('"Turn:'):
+        if turn_match := TURN_CARD_REGEX.match(row):
+            new_card, unix_time = turn_match.groups()
+            return Turn(int(unix_time), new_card)
+    elif row.startswith('"River:'):
+        if river_match := RIVER_CARD_REGEX.match(row):
+            new_card, unix_time = river_match.groups()
+            return River(int(unix_time), new_card)
+    elif row.startswith('"Undealt cards:'):
+        if undealt_match := UNDEALT_CARDS_REGEX.match(row):
+            return Undealt(_row_order(row), undealt_match.group(1).split(", "))
+    elif row.startswith('"The player ""'):
+        if " quits the game " in row:
+            return _player_movement(row, EXIT_REGEX, Quit)
+        elif " stand up " in row:
+            return _player_movement(row, STANDUP_REGEX, Stand)
+        elif " joined the game " in row:
+            return _player_movement(row, BUY_IN_REGEX, Join)
+        elif " rebought. " in row:
+            return _player_movement(row, REBUY_REGEX, Rebuy)
+        elif " sit back " in row:
+            return _player_movement(row, SIT_DOWN_REGEX, Sit)
+    elif row.startswith('"The admin updated the player ""'):
+        if adjustment_match := ADMIN_ADJUSTMENT_REGEX.match(row):
+            player, from_balance, to_balance = adjustment_match.groups()
+            return AdminAdjust(_row_order(row), sys.intern(player), int(from_balance), int(to_balance))
+    return None
 
-            # stand ups occurr after the end of the round
-            for player, stand_up in stand_ups.items():
-                player_sitting_at_table[player] = False
+def classify_row(row):
+    event = _classify_known_row(row)
+    if event is None:
+        return Unrecognized(_row_order(row), row)
+    return event
+
+# Yields one event per chronologically ordered (oldest first) log line
+def parse_events(log_lines):
+    for row in log_lines:
+        yield classify_row(row)
+
+# Yields the events of a logs/poker_night_YYYYMMDD.csv export, oldest first, with normalized player names
+def read_events(csv_file):
+    with open(csv_file) as file:
+        logs = fix_up_player_names(file.readlines())
+    if logs and logs[0] == "entry,at,order\n":
+        logs.pop(0) # drop csv header
+    logs.reverse()
+    yield from parse_events(logs)
+
+### Event consumers
+# Consumers subscribe to one pass over an event stream through fan_out. They can look at every raw event, at
+# every assembled PokerRound (rounds are only built once no matter how many consumers want them), or both.
+
+class EventConsumer():
+    def on_event(self, event):
+        pass
+
+    def on_round(self, poker_round):
+        pass
+
+    def finish(self):
+        return None
 
+# Splits a chronological event stream into lists of events, one per round from a "starting hand" up to the next one.
+# Events before the first hand of the night come out first as a list that isn't a round.
+def split_rounds(events):
+    round_events = []
+    for event in events:
+        if type(event) is HandStart and round_events:
+            yield round_events
+            round_events = []
+        round_events.append(event)
+    if round_events:
+        yield round_events
+
+# Feeds every event to every consumer, assembling each round's PokerRound along the way,
+# and returns each consumer's finish() result in order.
+def fan_out(events, consumers):
+    for round_events in split_rounds(events):
+        for event in round_events:
+            for consumer in consumers:
+                consumer.on_event(event)
+        if type(round_events[0]) is HandStart:
+            poker_round = PokerRound(round_events)
+            for consumer in consumers:
+                consumer.on_round(poker_round)
+
+    return [consumer.finish() for consumer in consumers]
+
+class RoundCollector(EventConsumer):
+    def __init__(self):
+        self.rounds = []
 
-            # exits always occur after the end of the round
-            for player, exit in exits.items():
-                player_sitting_at_table[player] = False
-                player_exit[player] = exit
+    def on_round(self, poker_round):
+        self.rounds.append(poker_round)
+
+    def finish(self):
+        return self.rounds
+
+# Every player's profit over a night as one dense matrix: a row per round start (per night for the all-time history),
+# a column per player in the order they first show up. A player's cells are only meaningful where present is set,
+# before they sit down or for rounds they stood up from there's no entry. Graphs plot each column's present rows
+# straight from the arrays, and player_history() gives the per-player (profit, time) lists for Splitwise and the like.
+class StackMatrix():
+    __slots__ = ("players", "times", "profits", "present")
+
+    def __init__(self, players, times, profits, present):
+        self.players = players # column to player name
+        self.times = times # datetime64[us] per row, shared by every player
+        self.profits = profits # int32 (rows, players) profit in cents, 0 where the player has no entry
+        self.present = present # bool (rows, players)
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(*state)
+
+    def state(self):
+        return (self.players, self.times, self.profits, self.present)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, StackMatrix)
+            and self.players == other.players
+            and np.array_equal(self.times, other.times)
+            and np.array_equal(self.profits, other.profits)
+            and np.array_equal(self.present, other.present)
+        )
 
-            # adjustments are only recorded "for the next hand"
-            for player, amount in adjustments.items():
-                player_adjustments[player] = player_adjustments.get(player, 0) + amount
+    # (times, profits) of the rows a player has an entry in
+    def column(self, column):
+        rows = self.present[:, column]
+        return self.times[rows], self.profits[rows, column]
+
+    # player to (last profit, time of it)
+    def final_profits(self):
+        if not self.players:
+            return {}
+        last_rows = len(self.times) - 1 - np.argmax(self.present[::-1], axis=0)
+        times = self.times[last_rows].tolist()
+        profits = self.profits[last_rows, np.arange(len(self.players))].tolist()
+        return {player: (profits[column], times[column]) for column, player in enumerate(self.players)}
+
+    # player to a list of (profit, time) for every round they have an entry in
+    def player_history(self):
+        times = self.times.tolist()
+        history = {}
+        for column, player in enumerate(self.players):
+            rows = np.flatnonzero(self.present[:, column])
+            history[player] = list(zip(self.profits[rows, column].tolist(), [times[row] for row in rows.tolist()]))
+        return history
+
+# A StackMatrix from the row, column and profit of every entry, kept as three flat lists
+def stack_matrix(players, times, rows, columns, profits):
+    rows, columns = np.array(rows, dtype=np.intp), np.array(columns, dtype=np.intp)
+    matrix = StackMatrix(
+        list(players),
+        np.array(times, dtype="datetime64[us]"),
+        np.zeros((len(times), len(players)), dtype=np.int32),
+        np.zeros((len(times), len(players)), dtype=np.bool_),
+    )
+    matrix.profits[rows, columns] = np.array(profits, dtype=np.int32)
+    matrix.present[rows, columns] = True
+    return matrix
+
+# Tracks each player's profit as of the start of every round they were part of
+class StackHistory(EventConsumer):
+    def __init__(self):
+        self.player_columns = {} # player name to their column, in the order they first got an entry
+        self.row_orders = [] # start order of each round with any entries
+        self.entry_rows, self.entry_columns, self.entry_profits = [], [], []
+        self.profits = {} # each player's latest profit, kept up as rounds come in so standings don't need the matrix
+        self.player_buyin_amount = {}
+        self.player_sitting_at_table = {}
+        self.player_adjustments = {}
+        self.player_exit = {}
+
+    # Can be called again after more rounds, but the matrix is built from scratch each time, so --follow only calls it
+    # when it redraws the graph
+    def finish(self):
+        times = times_of_orders(self.row_orders)
+        return stack_matrix(self.player_columns, times, self.entry_rows, self.entry_columns, self.entry_profits)
+
+    def on_round(self, poker_round):
+        row_profits = {} # a player with an old exit who's back in the balances gets the balance
+        player_buyin_amount = self.player_buyin_amount
+        player_sitting_at_table = self.player_sitting_at_table
+        player_adjustments = self.player_adjustments
+        player_exit = self.player_exit
+        balances, stand_ups, sit_downs, joins, exits, adjustments = poker_round.player_balances, poker_round.players_stood_up, poker_round.players_sat_down, poker_round.player_game_joins, poker_round.players_exited, poker_round.admin_adjustments
+        start_order = poker_round.start_order
+
+        # some buyins occur before the Player Stacks line in a round, some come after the end. Can have multiple joins per
+        for player, joins_array in joins.items():
+            for join in joins_array:
+                if join.order < start_order:
+                    player_buyin_amount[player] = join.amount + player_buyin_amount.get(player, 0)
+                    if previous_exit := player_exit.get(player):
+                        player_buyin_amount[player] -= previous_exit.amount # if they had exited before, keep track of what they left with in new buyin
+                    player_sitting_at_table[player] = True
+                    player_exit.pop(player, None)
+
+        # check for exits from last round, make sure we record their final balance
+        for player, exit in player_exit.items():
+            # check they haven't come back at the start of the round
+            if not player_sitting_at_table.get(player, False):
+                row_profits[player] = exit.amount - player_buyin_amount[player]
+
+        # CORE PROFIT CALCULATION
+        for player, balance in balances.items():
+            adjusted_balance = balance - player_adjustments.get(player, 0)
+
+            row_profits[player] = adjusted_balance - player_buyin_amount[player]
+
+        if row_profits:
+            player_columns = self.player_columns
+            self.entry_rows += [len(self.row_orders)] * len(row_profits)
+            self.entry_columns += [player_columns.setdefault(player, len(player_columns)) for player in row_profits]
+            self.entry_profits += row_profits.values()
+            self.row_orders.append(start_order)
+            self.profits.update(row_profits)
+
+        # sit downs occur during the round
+        for player, sit_down in sit_downs.items():
+            player_sitting_at_table[player] = True
+            player_exit.pop(player, None)
+
+        # add in buyins that occurred after the end of the round
+        for player, joins_array in joins.items():
+            for join in joins_array:
+                # Check that the player didn't just sit down as we don't want to double count thier money in play
+                if join.order >= start_order and (
+                    not player_sitting_at_table.get(player, False)
+                    or join.movement_type == TYPE_REBUY
+                ):
+                    player_sitting_at_table[player] = True
+                    player_buyin_amount[player] = join.amount + player_buyin_amount.get(player, 0)
+                    if previous_exit := player_exit.get(player):
+                        player_buyin_amount[player] -= previous_exit.amount # if they had exited before, keep track of what they left with in new buyin
+                    player_exit.pop(player, None)
+
+
+
+        # stand ups occurr after the end of the round
+        for player, stand_up in stand_ups.items():
+            player_sitting_at_table[player] = False
+
+
+        # exits always occur after the end of the round
+        for player, exit in exits.items():
+            player_sitting_at_table[player] = False
+            player_exit[player] = exit
+
+        # adjustments are only recorded "for the next hand"
+        for player, amount in adjustments.items():
+            player_adjustments[player] = player_adjustments.get(player, 0) + amount
 
-#            print("ROUND:", poker_round.round_number, "\nSTACK:", player_to_stack_history, "\nBUY INS:", player_buyin_amount)
+class PokerNightEvent():
+    def __init__(self, date, event_logs):
+        self.date = date
+        self.rounds = fan_out(parse_events(event_logs), [RoundCollector()])[0]
 
-        return player_to_stack_history
+    def player_stack_history(self):
+        stack_history = StackHistory()
+        for poker_round in self.rounds:
+            stack_history.on_round(poker_round)
+        return stack_history.finish()
 
 class PokerRound(): # multiple rounds in a poker night event
-    def __init__(self, round_logs):
-        self.metadata_extraction(round_logs)
-        self.starting_balances_extraction(round_logs)
-        self.extract_table_cards(round_logs)
-        self.extract_winner_info(round_logs)
-        self.extract_hands(round_logs)
-        self.extract_admin_balance_adjustments(round_logs)
-        self.extract_player_movements(round_logs)
-        self.extract_player_actions_during_round(round_logs)
-
-    def metadata_extraction(self, round_logs):
-        start_log = round_logs[0]
-        round_number_str, _ = re.findall(START_HAND_REGEX, start_log)[0]
-        self.round_number = int(round_number_str)
-        end_unix_time = round_logs[-1].split(",")[-1]
-        self.end_time = datetime.fromtimestamp(int(end_unix_time) / 100000)
-
-    def extract_admin_balance_adjustments(self, round_logs):
-        self.admin_adjustments = {}
-        for row in round_logs:
-            if re.match(ADMIN_ADJUSTMENT_REGEX, row):
-                player, from_balance, to_balance = re.findall(ADMIN_ADJUSTMENT_REGEX, row)[0]
-                self.admin_adjustments[player] = int(to_balance) - int(from_balance)
+    # start_order, table_cards, the street orders and undealt_cards are only set when the round has them
+    __slots__ = (
+        "round_number", "start_order", "end_order", "flop_order", "turn_order", "river_order",
+        "player_balances", "winning_amounts", "winning_players", "winning_hands", "player_to_hand",
+        "admin_adjustments", "players_exited", "players_stood_up", "players_sat_down", "player_game_joins",
+        "player_actions", "street_starts", "table_cards", "undealt_cards",
+    )
 
-    def extract_player_movements(self, round_logs):
+    def __init__(self, round_events):
+        self.player_balances = {}
+        self.winning_amounts = []
+        self.winning_players = []
+        self.winning_hands = []
+        self.player_to_hand = {}
+        self.admin_adjustments = {}
         self.players_exited = {} # player name to PlayerMovement
         self.players_stood_up = {}
         self.players_sat_down = {}
         self.player_game_joins = {} # player name to array of tuples of PlayerMovement. Can be more than one join! (i.e. round one, but standing, then sit down during round 1 => two joined logs, see 2022-01-13).
-        for row in round_logs:
-            if re.match(EXIT_REGEX, row): # lose all money
-                player, amount, unix_time = re.findall(EXIT_REGEX, row)[0]
-                exited = PlayerMovement(amount, unix_time, TYPE_EXIT)
-                self.players_exited[player] = exited
-            elif re.match(STANDUP_REGEX, row): # stand up
-                player, amount, unix_time = re.findall(STANDUP_REGEX, row)[0]
-                stood_up = PlayerMovement(amount, unix_time, TYPE_STAND)
-                self.players_stood_up[player] = stood_up
-            elif re.match(BUY_IN_REGEX, row): # buy in, can be multiple in round_logs
-                player, amount, unix_time = re.findall(BUY_IN_REGEX, row)[0]
-                buy_in = PlayerMovement(amount, unix_time, TYPE_JOIN)
-                existing_joins = self.player_game_joins.get(player, [])
-                existing_joins.append(buy_in)
-                self.player_game_joins[player] = existing_joins
-            elif re.match(REBUY_REGEX, row):
-                player, amount, unix_time = re.findall(REBUY_REGEX, row)[0]
-                rebuy = PlayerMovement(amount, unix_time, TYPE_REBUY)
-                existing_joins = self.player_game_joins.get(player, [])
-                existing_joins.append(rebuy)
-                self.player_game_joins[player] = existing_joins
-            elif re.match(SIT_DOWN_REGEX, row): # sit down
-                player, amount, unix_time = re.findall(SIT_DOWN_REGEX, row)[0]
-                sit_down = PlayerMovement(amount, unix_time, TYPE_SIT)
-                self.players_sat_down[player] = sit_down
-
-
-    def starting_balances_extraction(self, round_logs):
-        self.player_balances = {}
-        for log in round_logs:
-            if log.startswith("\"Player stacks"):
-                for player, stack in re.findall(PLAYER_STACK_REGEX, log):
-                    self.player_balances[player] = int(stack)
-                # use the timestamp from the balances line instead of the "starting hand" line
-                # because folks join the game in the beginning after the initial "starting hand" line smh
-                unix_time = log.split(",")[-1]
-                self.start_time = datetime.fromtimestamp(int(unix_time) / 100000)
-                break
+        self.player_actions = [] # list of PlayerRoundActions, in order, so each street is a contiguous slice
+        self.street_starts = [0] # index in player_actions where each street the round got to begins
+
+        self.round_number = round_events[0].round_number
+        end_order = None
+        for event in round_events:
+            handler = ROUND_EVENT_HANDLERS.get(type(event))
+            if handler:
+                handler(self, event)
+            # multi-line entries (i.e. "Game Config Changes") leave rows without an order,
+            # so the round ends at the last row that actually has one
+            if event.order is not None:
+                end_order = event.order
+        self.end_order = end_order
+
+    # the datetimes are built on access, a missing street order raises AttributeError just like a missing attribute
+    @property
+    def start_time(self):
+        return time_of_order(self.start_order)
+
+    @property
+    def end_time(self):
+        return time_of_order(self.end_order)
+
+    @property
+    def flop_time(self):
+        return time_of_order(self.flop_order)
+
+    @property
+    def turn_time(self):
+        return time_of_order(self.turn_order)
+
+    @property
+    def river_time(self):
+        return time_of_order(self.river_order)
+
+    def apply_stacks(self, stacks):
+        if hasattr(self, "start_order"):
+            return # only the first stacks line of the round counts
+        self.player_balances.update(stacks.balances)
+        # use the timestamp from the balances line instead of the "starting hand" line
+        # because folks join the game in the beginning after the initial "starting hand" line smh
+        self.start_order = stacks.order
+
+    def apply_player_action(self, action):
+        street = len(self.street_starts) - 1
+        self.player_actions.append(
+            PlayerRoundAction(action.player, action.action_type, action.order, action.amount, action.all_in, street, self)
+        )
 
-    def extract_hands(self, round_logs):
-        self.player_to_hand = {}
-        for row in round_logs:
-            if re.match(PLAYER_HAND_REGEX, row):
-                player, hand = re.findall(PLAYER_HAND_REGEX, row)[0]
-                self.player_to_hand[player] = hand
+    def start_street(self):
+        self.street_starts.append(len(self.player_actions))
 
-    def extract_winner_info(self, round_logs):
-        self.winning_amounts = []
-        self.winning_players = []
-        self.winning_hands = []
-        for row in round_logs:
-            if re.match(PLAYER_WINNER_WITH_HAND_REGEX, row):
-                winning_info = re.findall(PLAYER_WINNER_WITH_HAND_REGEX, row)[0]
-                self.winning_players.append(winning_info[0])
-                self.winning_amounts.append(int(winning_info[1]))
-                self.winning_hands.append(winning_info[2])
-            elif re.match(PLAYER_WINNER_WITHOUT_HAND_REGEX, row):
-                # The winning hand is optional, as folks can win if everyone folds without showing their hand
-                winning_info = re.findall(PLAYER_WINNER_WITHOUT_HAND_REGEX, row)[0]
-                self.winning_players.append(winning_info[0])
-                self.winning_amounts.append(int(winning_info[1]))
-
-    def extract_table_cards(self, round_logs):
-        for row in round_logs:
-            if re.match(FLOP_CARDS_REGEX, row):
-                table_cards, unix_time = re.findall(FLOP_CARDS_REGEX, row)[0]
-                self.table_cards = table_cards.split(", ")
-                self.flop_time = datetime.fromtimestamp(int(unix_time) / 100000)
-            elif re.match(UNDEALT_CARDS_REGEX, row):
-                self.undealt_cards = re.findall(UNDEALT_CARDS_REGEX, row)[0].split(", ")
-            elif re.match(TURN_CARD_REGEX, row):
-                new_card, unix_time = re.findall(TURN_CARD_REGEX, row)[0]
-                self.table_cards.append(new_card)
-                self.turn_time = datetime.fromtimestamp(int(unix_time) / 100000)
-            elif re.match(RIVER_CARD_REGEX, row):
-                new_card, unix_time = re.findall(RIVER_CARD_REGEX, row)[0]
-                self.table_cards.append(new_card)
-                self.river_time = datetime.fromtimestamp(int(unix_time) / 100000)
-
-    def extract_player_actions_during_round(self, round_logs):
-        player_actions = [] # list of PlayerRoundActions
-        for row in round_logs:
-            round_action = None
-            if re.match(PLAYER_INITIAL_POST_REGEX, row):
-                player, action_type, amount, unix_time = re.findall(PLAYER_INITIAL_POST_REGEX, row)[0]
-                round_action = PlayerRoundAction(player, RoundAction(action_type), unix_time, amount)
-            elif re.match(PLAYER_FOLDS_REGEX, row):
-                player, unix_time = re.findall(PLAYER_FOLDS_REGEX, row)[0]
-                round_action = PlayerRoundAction(player, RoundAction.folds, unix_time)
-            elif re.match(PLAYER_CHECKS_REGEX, row):
-                player, unix_time = re.findall(PLAYER_CHECKS_REGEX, row)[0]
-                round_action = PlayerRoundAction(player, RoundAction.checks, unix_time)
-            elif re.match(PLAYER_CALLS_REGEX, row):
-                player, amount, unix_time = re.findall(PLAYER_CALLS_REGEX, row)[0]
-                round_action = PlayerRoundAction(player, RoundAction.calls, unix_time, amount)
-            elif re.match(PLAYER_BETS_REGEX, row):
-                player, amount, unix_time = re.findall(PLAYER_BETS_REGEX, row)[0]
-                round_action = PlayerRoundAction(player, RoundAction.bets, unix_time, amount)
-            elif re.match(PLAYER_RAISES_REGEX, row):
-                player, amount, unix_time = re.findall(PLAYER_RAISES_REGEX, row)[0]
-                round_action = PlayerRoundAction(player, RoundAction.raises, unix_time, amount)
-
-            if round_action:
-                is_all_in = "go all in" in row
-                round_action.all_in = is_all_in
-                player_actions.append(round_action)
-
-        self.player_actions = player_actions
+    def apply_collect(self, collect):
+        self.winning_players.append(collect.player)
+        self.winning_amounts.append(collect.amount)
+        if collect.hand is not None:
+            self.winning_hands.append(collect.hand)
 
-    def pre_flop_actions(self):
-        if not hasattr(self, 'flop_time'): # sometimes rounds don't go to a flop
-            return self.player_actions
+    def apply_show(self, show):
+        self.player_to_hand[show.player] = show.hand
 
-        return list(filter(lambda action: action.time < self.flop_time, self.player_actions))
+    def apply_flop(self, flop):
+        self.table_cards = list(flop.cards)
+        self.flop_order = flop.order
+        self.start_street()
 
-    def pre_turn_actions(self):
-        if not hasattr(self, 'flop_time'):
-            return []
+    def apply_turn(self, turn):
+        self.table_cards.append(turn.card)
+        self.turn_order = turn.order
+        self.start_street()
 
-        # if the round ends after the flop, but before the turn, get all the actions after flop
-        if not hasattr(self, 'turn_time'):
-            return list(filter(lambda action: action.time >= self.flop_time, self.player_actions))
+    def apply_river(self, river):
+        self.table_cards.append(river.card)
+        self.river_order = river.order
+        self.start_street()
 
-        return list(filter(lambda action: action.time >= self.flop_time and action.time < self.turn_time, self.player_actions))
+    def apply_undealt(self, undealt):
+        self.undealt_cards = list(undealt.cards)
 
-    def pre_river_actions(self):
-        if not hasattr(self, 'turn_time'): # sometimes rounds don't go to a turn
-            return []
+    def apply_join(self, join): # buy in or rebuy, can be multiple per round
+        movement = PlayerMovement(join.amount, join.order, join.movement_type)
+        self.player_game_joins.setdefault(join.player, []).append(movement)
 
-        # if the round ends after the turn, but before the river, get all the actions after turn
-        if not hasattr(self, 'river_time'):
-            return list(filter(lambda action: action.time >= self.turn_time, self.player_actions))
+    def apply_quit(self, exit): # lose all money
+        self.players_exited[exit.player] = PlayerMovement(exit.amount, exit.order, TYPE_EXIT)
 
-        return list(filter(lambda action: action.time >= self.turn_time and action.time < self.river_time, self.player_actions))
+    def apply_stand(self, stand_up):
+        self.players_stood_up[stand_up.player] = PlayerMovement(stand_up.amount, stand_up.order, TYPE_STAND)
 
-    def post_river_actions(self):
-        if not hasattr(self, 'river_time'): # sometimes rounds don't go to a turn or river
+    def apply_sit(self, sit_down):
+        self.players_sat_down[sit_down.player] = PlayerMovement(sit_down.amount, sit_down.order, TYPE_SIT)
+
+    def apply_admin_adjustment(self, adjustment):
+        self.admin_adjustments[adjustment.player] = adjustment.to_stack - adjustment.from_stack
+
+    # actions taken on the given street, empty when the round never got there
+    def street_actions(self, street):
+        if street >= len(self.street_starts):
             return []
+        if street + 1 < len(self.street_starts):
+            return self.player_actions[self.street_starts[street]:self.street_starts[street + 1]]
+        return self.player_actions[self.street_starts[street]:]
+
+    def pre_flop_actions(self):
+        return self.street_actions(PRE_FLOP)
+
+    def pre_turn_actions(self):
+        return self.street_actions(PRE_TURN)
+
+    def pre_river_actions(self):
+        return self.street_actions(PRE_RIVER)
 
-        return list(filter(lambda action: action.time >= self.river_time, self.player_actions))
+    def post_river_actions(self):
+        return self.street_actions(POST_RIVER)
+
+ROUND_EVENT_HANDLERS = {
+    Stacks: PokerRound.apply_stacks,
+    Post: PokerRound.apply_player_action,
+    Fold: PokerRound.apply_player_action,
+    Check: PokerRound.apply_player_action,
+    Call: PokerRound.apply_player_action,
+    Bet: PokerRound.apply_player_action,
+    Raise: PokerRound.apply_player_action,
+    Collect: PokerRound.apply_collect,
+    Show: PokerRound.apply_show,
+    Flop: PokerRound.apply_flop,
+    Turn: PokerRound.apply_turn,
+    River: PokerRound.apply_river,
+    Undealt: PokerRound.apply_undealt,
+    Join: PokerRound.apply_join,
+    Rebuy: PokerRound.apply_join,
+    Quit: PokerRound.apply_quit,
+    Stand: PokerRound.apply_stand,
+    Sit: PokerRound.apply_sit,
+    AdminAdjust: PokerRound.apply_admin_adjustment,
+}
 
 def date_of_csv(csv_name):
     base_name = os.path.basename(csv_name)
@@ -416,7 +852,7 @@ def normalize_csv_path(date_arg):
 def fix_up_player_names(log_lines):
     normalized_name_log_lines = []
     for line in log_lines:
-        name_matches = re.findall(PLAYER_NAME_REGEX, line)
+        name_matches = PLAYER_NAME_REGEX.findall(line)
         if name_matches:
             for name in name_matches:
                 if name.lower() in KNOWN_NAME_FIX_UPS:
@@ -438,33 +874,498 @@ def fix_up_player_names(log_lines):
 
     return normalized_name_log_lines
 
+### Parsed night cache
+# Old game nights never change, so the parsed events and stack history of each csv are kept on disk. Entries are
+# keyed by a hash of the csv contents plus the parser version (and the name fix-ups, which rewrite the logs before
+# parsing), so edited csvs or parser changes simply miss the cache. Bump PARSER_VERSION whenever parsing changes.
+
+PARSER_VERSION = 4
+PARSED_NIGHT_CACHE_DIR = ".cache/parsed_nights"
+
+def csv_content_hash(csv_file):
+    with open(csv_file, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+def parser_fingerprint():
+    name_fix_ups = json.dumps(KNOWN_NAME_FIX_UPS, sort_keys=True).encode()
+    return f"{PARSER_VERSION}-{hashlib.sha256(name_fix_ups).hexdigest()[:12]}"
+
+def _night_name(csv_file):
+    return os.path.basename(csv_file).rsplit(".", 1)[0]
+
+def _parsed_night_cache_path(csv_file, csv_sha256, cache_dir=PARSED_NIGHT_CACHE_DIR):
+    cache_key = hashlib.sha256(f"{csv_sha256}:{parser_fingerprint()}".encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{_night_name(csv_file)}.{cache_key}.pickle")
+
+class ParsedNight():
+    def __init__(self, csv_file, csv_sha256, stack_matrix, events=None, event_tuples=None, rounds=None, core_stats=None):
+        self.csv_file = csv_file
+        self.csv_sha256 = csv_sha256
+        self.stack_matrix = stack_matrix
+        self._player_history = None
+        self._events = events
+        self._event_tuples = event_tuples
+        self._rounds = rounds
+        self._core_stats = core_stats
+
+    # player to [(profit, time), ...], for Splitwise and the other per-player consumers of the stack matrix
+    @property
+    def player_history(self):
+        if self._player_history is None:
+            self._player_history = self.stack_matrix.player_history()
+        return self._player_history
+
+    # cached nights only rebuild their events and rounds (no regexes involved) when someone asks for them
+    @property
+    def events(self):
+        if self._events is None:
+            self._events = [event_from_tuple(values) for values in self._event_tuples]
+        return self._events
+
+    @property
+    def rounds(self):
+        if self._rounds is None:
+            self._rounds = fan_out(self.events, [RoundCollector()])[0]
+        return self._rounds
+
+    @property
+    def core_stats(self):
+        if self._core_stats is None:
+            self._core_stats = core_stats_for_rounds(self.rounds)
+        return self._core_stats
+
+    def __getstate__(self):
+        # only builtins cross process boundaries, events and rounds get rebuilt on demand on the other side
+        event_tuples = self._event_tuples
+        if event_tuples is None:
+            event_tuples = [event_to_tuple(event) for event in self._events]
+        return {
+            "csv_file": self.csv_file,
+            "csv_sha256": self.csv_sha256,
+            "stack_matrix": self.stack_matrix,
+            "_player_history": None,
+            "_events": None,
+            "_event_tuples": event_tuples,
+            "_rounds": None,
+            "_core_stats": self._core_stats.state() if self._core_stats is not None else None,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._core_stats is not None:
+            self._core_stats = CoreStats.from_state(self._core_stats)
+
+# csv_sha256 saves hashing the csv again when the caller already has
+def load_night(csv_file, use_cache=True, cache_dir=PARSED_NIGHT_CACHE_DIR, csv_sha256=None):
+    csv_sha256 = csv_sha256 or csv_content_hash(csv_file)
+    cache_path = _parsed_night_cache_path(csv_file, csv_sha256, cache_dir)
+    if use_cache and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as file:
+                pickle.load(file) # skip the header
+                record = pickle.load(file)
+            return ParsedNight(
+                csv_file,
+                csv_sha256,
+                StackMatrix.from_state(record["stack_matrix"]),
+                event_tuples=record["events"],
+                core_stats=CoreStats.from_state(record["core_stats"]),
+            )
+        except (OSError, EOFError, pickle.UnpicklingError, KeyError, IndexError, TypeError, AttributeError):
+            pass # unreadable entry, just parse the csv again
+
+    events = list(read_events(csv_file))
+    stack_matrix, rounds = fan_out(events, [StackHistory(), RoundCollector()])
+    core_stats = core_stats_for_rounds(rounds)
+    if use_cache:
+        # a small header goes first so the cache commands can inspect entries without loading the events
+        header = {
+            "csv_file": os.path.basename(csv_file),
+            "csv_sha256": csv_sha256,
+            "parser_version": parser_fingerprint(),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        record = {
+            "events": [event_to_tuple(event) for event in events],
+            "stack_matrix": stack_matrix.state(),
+            "core_stats": core_stats.state(),
+        }
+        os.makedirs(cache_dir, exist_ok=True)
+        # drop older entries for this night, they can only be for an edited csv or an old parser
+        for stale_entry in _cache_entries_for_night(csv_file, cache_dir):
+            os.remove(stale_entry)
+        temp_path = cache_path + ".tmp"
+        with open(temp_path, "wb") as file:
+            pickle.dump(header, file, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(record, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    return ParsedNight(csv_file, csv_sha256, stack_matrix, events=events, rounds=rounds, core_stats=core_stats)
+
+# Loads the nights in the order given. With jobs > 1 the csvs are parsed in a process pool, but results still come
+# back in order so anything order dependent (like the all-time profit merge) can run as they arrive.
+def load_nights(csv_files, use_cache=True, jobs=1):
+    if jobs <= 1 or len(csv_files) <= 1:
+        for csv_file in csv_files:
+            yield load_night(csv_file, use_cache)
+        return
+
+    chunksize = max(1, len(csv_files) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(load_night, csv_files, repeat(use_cache), chunksize=chunksize)
+
+def _cache_entries(cache_dir=PARSED_NIGHT_CACHE_DIR):
+    if not os.path.isdir(cache_dir):
+        return []
+    return [os.path.join(cache_dir, f) for f in sorted(os.listdir(cache_dir)) if f.endswith(".pickle")]
+
+def _cache_entries_for_night(csv_file, cache_dir=PARSED_NIGHT_CACHE_DIR):
+    night = _night_name(csv_file)
+    return [entry for entry in _cache_entries(cache_dir) if os.path.basename(entry).rsplit(".", 2)[0] == night]
 
-def graph_stack_history(player_history, title, last_file, show_event_points=False):
-    for player in player_history:
-        player_hand_times = [ ht for _, ht in player_history[player] ]
-        player_chips = [ chips for chips, _ in player_history[player] ]
-        df_dict = {
-            player: player_chips,
-            "Time": player_hand_times,
+def _read_cache_header(entry_path):
+    try:
+        with open(entry_path, "rb") as file:
+            return pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+def print_cache_info(cache_dir=PARSED_NIGHT_CACHE_DIR, logs_dir="logs"):
+    entries = _cache_entries(cache_dir)
+    total_size = 0
+    for entry_path in entries:
+        size = os.path.getsize(entry_path)
+        total_size += size
+        header = _read_cache_header(entry_path)
+        status = "unreadable" if header is None else _cache_entry_status(entry_path, header, logs_dir)
+        created_at = header["created_at"] if header else "?"
+        print(f"{os.path.basename(entry_path)} {size / 1024:.0f} KiB created {created_at} {status}")
+    print(f"{len(entries)} cached nights, {total_size / 1024 / 1024:.1f} MiB in {cache_dir} (parser {parser_fingerprint()})")
+
+def _cache_entry_status(entry_path, header, logs_dir="logs"):
+    csv_file = os.path.join(logs_dir, header["csv_file"])
+    if header["parser_version"] != parser_fingerprint():
+        return "stale (old parser)"
+    if not os.path.exists(csv_file):
+        return "stale (csv removed)"
+    if _parsed_night_cache_path(csv_file, csv_content_hash(csv_file), os.path.dirname(entry_path)) != entry_path:
+        return "stale (csv changed)"
+    return "fresh"
+
+# Removes entries that can never be hit again: old parser versions, edited csvs and csvs that are gone
+def prune_cache(cache_dir=PARSED_NIGHT_CACHE_DIR, logs_dir="logs"):
+    removed = 0
+    for entry_path in _cache_entries(cache_dir):
+        header = _read_cache_header(entry_path)
+        if header is None or _cache_entry_status(entry_path, header, logs_dir) != "fresh":
+            os.remove(entry_path)
+            removed += 1
+    return removed
+
+# Drops the cache entries for the given csvs, or the whole cache when none are given
+def invalidate_cache(csv_files=(), cache_dir=PARSED_NIGHT_CACHE_DIR):
+    if csv_files:
+        entries = [entry for csv_file in csv_files for entry in _cache_entries_for_night(csv_file, cache_dir)]
+    else:
+        entries = _cache_entries(cache_dir)
+    for entry in entries:
+        os.remove(entry)
+    return len(entries)
+
+### All-time profit ledger
+# The all-time chart only needs every player's final profit per night. Those are appended to a JSON lines ledger
+# together with the csv hash and parser version they came from, so --all only parses nights that are missing or
+# whose csv changed. The ledger is append-only: a later line for the same night replaces the earlier one. Loading it
+# rewrites it without the replaced lines, and without a last line an append that was cut short left half written.
+
+PROFIT_LEDGER_FILE = ".cache/profit_ledger.jsonl"
+
+class ProfitLedger():
+    def __init__(self, path=PROFIT_LEDGER_FILE):
+        self.path = path
+        self.entries = {} # night name to its latest ledger entry
+        lines = 0
+        if os.path.exists(path):
+            with open(path) as file:
+                for line in file:
+                    if not line.strip():
+                        continue
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except ValueError: # interrupted (Ctrl-C, full disk) while appending, that night gets parsed again
+                        warnings.warn(f"Skipping a half written line in {path}", RuntimeWarning)
+                        continue
+                    self.entries[entry["night"]] = entry
+        if lines > len(self.entries):
+            self.compact()
+
+    # Rewrites the ledger with just the latest entry of each night
+    def compact(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as file:
+            file.writelines(json.dumps(entry) + "\n" for entry in self.entries.values())
+        os.replace(temp_path, self.path)
+
+    def is_current(self, csv_file, csv_sha256):
+        entry = self.entries.get(_night_name(csv_file))
+        return (
+            entry is not None
+            and entry["csv_sha256"] == csv_sha256
+            and entry["parser_version"] == parser_fingerprint()
+        )
+
+    def record(self, night):
+        entry = {
+            "night": _night_name(night.csv_file),
+            "csv_sha256": night.csv_sha256,
+            "parser_version": parser_fingerprint(),
+            # player to [final profit, time of their last stack entry], in the order players show up that night
+            "profits": {
+                player: [profit, time.isoformat()]
+                for player, (profit, time) in night.stack_matrix.final_profits().items()
+            },
         }
-        df = pd.DataFrame(df_dict)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as file:
+            file.write(json.dumps(entry) + "\n")
+        self.entries[entry["night"]] = entry
+
+    def final_profits(self, csv_file):
+        entry = self.entries[_night_name(csv_file)]
+        return {player: (profit, datetime.fromisoformat(time)) for player, (profit, time) in entry["profits"].items()}
+
+# Brings the ledger up to date for csv_files and returns the nights that had to be parsed, by csv path
+def update_profit_ledger(ledger, csv_files, use_cache=True, jobs=1):
+    stale_csv_files = [
+        csv_file for csv_file in csv_files
+        if not ledger.is_current(csv_file, csv_content_hash(csv_file))
+    ]
+    parsed_nights = {}
+    for night in load_nights(stale_csv_files, use_cache, jobs):
+        ledger.record(night)
+        parsed_nights[night.csv_file] = night
+    return parsed_nights
+
+# Merges per-night final profits (dicts of player to (profit, time), in date order) into a StackMatrix of running
+# all-time profits, a row per night at the last time anyone's profit was taken that night. Nights a player missed add
+# nothing, so the running totals are a cumulative sum of the nights x players matrix down the nights.
+def merge_all_time_history(nightly_final_profits):
+    player_columns, night_times, rows, columns, profits = {}, [], [], [], []
+    for final_profits in nightly_final_profits:
+        if not final_profits:
+            continue
+        rows += [len(night_times)] * len(final_profits)
+        columns += [player_columns.setdefault(player, len(player_columns)) for player in final_profits]
+        profits += [profit for profit, _ in final_profits.values()]
+        night_times.append(max(time for _, time in final_profits.values()))
+    nightly = stack_matrix(player_columns, night_times, rows, columns, profits)
+    nightly.profits = np.cumsum(nightly.profits, axis=0, dtype=np.int32)
+    return nightly
+
+
+### Columnar action store
+# Corpus-wide stats don't need PokerRound objects, just a few numbers per action. export_action_store flattens every
+# night's events into typed numpy tables (one .npy file each) that load_action_store memory maps back, so the whole
+# corpus loads instantly and stats run as vectorized array operations. Players and action types are small int codes
+# into the names kept in meta.json, and every timestamp is the raw int64 order value from the csvs.
+
+ACTION_STORE_DIR = ".cache/action_store"
+ACTION_STORE_VERSION = 1
+ACTION_TYPES = list(RoundAction) # action code to RoundAction
+NO_ORDER = -1 # order of a street the round never got to
+
+ROUND_DTYPE = np.dtype([
+    ("night", np.int16), ("round_number", np.int32), ("start_order", np.int64), ("end_order", np.int64),
+    ("flop_order", np.int64), ("turn_order", np.int64), ("river_order", np.int64),
+])
+ACTION_DTYPE = np.dtype([
+    ("round", np.int32), ("order", np.int64), ("player", np.int16), ("action", np.int8), ("street", np.int8),
+    ("amount", np.int32), ("all_in", np.bool_),
+])
+STACK_DTYPE = np.dtype([("round", np.int32), ("order", np.int64), ("player", np.int16), ("stack", np.int32)])
+WINNING_DTYPE = np.dtype([
+    ("round", np.int32), ("order", np.int64), ("player", np.int16), ("amount", np.int32), ("with_hand", np.bool_),
+])
+ACTION_STORE_TABLES = {"rounds": ROUND_DTYPE, "actions": ACTION_DTYPE, "stacks": STACK_DTYPE, "winnings": WINNING_DTYPE}
+
+class ActionStore():
+    def __init__(self, players, nights, rounds, actions, stacks, winnings):
+        self.players = players # player code to name
+        self.nights = nights # night code to {"night", "csv_sha256"}
+        self.rounds = rounds
+        self.actions = actions
+        self.stacks = stacks
+        self.winnings = winnings
+
+    def player_code(self, player):
+        return self.players.index(player)
+
+    def action_code(self, action_type):
+        return ACTION_TYPES.index(action_type)
+
+# Builds the tables in a single pass over each night's events, following the same rules as PokerRound: a round runs
+# from one "starting hand" to the next, only its first stacks line counts, and it ends at the last row with an order.
+def build_action_store(nights):
+    players, player_codes = [], {}
+    def player_code(player):
+        if player not in player_codes:
+            player_codes[player] = len(players)
+            players.append(player)
+        return player_codes[player]
+
+    action_codes = {action_type: code for code, action_type in enumerate(ACTION_TYPES)}
+    night_entries, rounds, actions, stacks, winnings = [], [], [], [], []
+    for night_code, night in enumerate(nights):
+        night_entries.append({"night": _night_name(night.csv_file), "csv_sha256": night.csv_sha256})
+        round_index, round_entry, street, has_stacks = -1, None, 0, False
+        for event in night.events:
+            event_type = type(event)
+            if event_type is HandStart:
+                round_index = len(rounds)
+                round_entry = [night_code, event.round_number, NO_ORDER, event.order, NO_ORDER, NO_ORDER, NO_ORDER]
+                rounds.append(round_entry)
+                street, has_stacks = 0, False
+                continue
+            if round_entry is None:
+                continue # rows before the first hand of the night aren't part of any round
+            if event.order is not None:
+                round_entry[3] = event.order
+            if isinstance(event, PlayerAction):
+                actions.append((
+                    round_index, event.order, player_code(event.player), action_codes[event.action_type], street,
+                    event.amount, event.all_in,
+                ))
+            elif event_type is Stacks:
+                if not has_stacks:
+                    has_stacks = True
+                    round_entry[2] = event.order
+                    for player, stack in event.balances.items():
+                        stacks.append((round_index, event.order, player_code(player), stack))
+            elif event_type is Collect:
+                winnings.append((round_index, event.order, player_code(event.player), event.amount, event.hand is not None))
+            elif event_type is Flop or event_type is Turn or event_type is River:
+                street += 1
+                round_entry[3 + street] = event.order
+
+    return ActionStore(
+        players,
+        night_entries,
+        np.array([tuple(entry) for entry in rounds], dtype=ROUND_DTYPE),
+        np.array(actions, dtype=ACTION_DTYPE),
+        np.array(stacks, dtype=STACK_DTYPE),
+        np.array(winnings, dtype=WINNING_DTYPE),
+    )
+
+def export_action_store(nights, store_dir=ACTION_STORE_DIR):
+    store = build_action_store(nights)
+    os.makedirs(store_dir, exist_ok=True)
+    for table in ACTION_STORE_TABLES:
+        temp_path = os.path.join(store_dir, f"{table}.npy.tmp")
+        with open(temp_path, "wb") as file:
+            np.save(file, getattr(store, table))
+        os.replace(temp_path, os.path.join(store_dir, f"{table}.npy"))
+    # meta.json goes last, so a store is only picked up once every table in it was written
+    meta = {
+        "version": ACTION_STORE_VERSION,
+        "parser_version": parser_fingerprint(),
+        "players": store.players,
+        "action_types": [action_type.value for action_type in ACTION_TYPES],
+        "streets": STREETS,
+        "nights": store.nights,
+    }
+    temp_path = os.path.join(store_dir, "meta.json.tmp")
+    with open(temp_path, "w") as file:
+        json.dump(meta, file, indent=1)
+    os.replace(temp_path, os.path.join(store_dir, "meta.json"))
+    return store
+
+def load_action_store(store_dir=ACTION_STORE_DIR):
+    with open(os.path.join(store_dir, "meta.json")) as file:
+        meta = json.load(file)
+    if meta["version"] != ACTION_STORE_VERSION or meta["action_types"] != [a.value for a in ACTION_TYPES]:
+        raise ValueError(f"{store_dir} was exported by another version, export it again")
+    tables = {}
+    for table, dtype in ACTION_STORE_TABLES.items():
+        array = np.load(os.path.join(store_dir, f"{table}.npy"), mmap_mode="r")
+        if array.dtype != dtype:
+            raise ValueError(f"{store_dir}/{table}.npy has an unexpected layout, export it again")
+        tables[table] = array
+    return ActionStore(meta["players"], meta["nights"], **tables)
+
+# The store's version of the per-player parts of print_core_stats, computed with bincounts over the whole corpus
+def print_action_store_stats(store):
+    num_players = len(store.players)
+    rounds_played = np.bincount(store.stacks["player"], minlength=num_players)
+    wins = np.bincount(store.winnings["player"], minlength=num_players) # counted per pot collected, like CoreStats
+
+    print(f"\n------- Action store: {len(store.nights)} nights, {len(store.rounds)} rounds, {len(store.actions)} actions")
+    print("--- Wins of hands played")
+    for player in np.argsort(-wins, kind="stable"):
+        if rounds_played[player]:
+            print("{: >10} {: >6}/{:<6} ({:,.2f}%)".format(store.players[player], wins[player], rounds_played[player], wins[player] / rounds_played[player] * 100.0))
+
+    folds = store.actions[store.actions["action"] == store.action_code(RoundAction.folds)]
+    all_ins = store.actions[store.actions["all_in"]]
+    raises = store.actions[np.isin(store.actions["action"], [store.action_code(RoundAction.raises), store.action_code(RoundAction.bets)])]
+    for street, street_name in enumerate(STREETS):
+        street_folds = np.bincount(folds["player"][folds["street"] == street], minlength=num_players)
+        street_all_ins = np.bincount(all_ins["player"][all_ins["street"] == street], minlength=num_players)
+        print(f"--- {street_name} folds and all-ins per hand played")
+        for player in np.argsort(-street_folds, kind="stable"):
+            if rounds_played[player]:
+                print("{: >10} {: >6} folds ({:,.2f}%) {: >5} all-ins".format(store.players[player], street_folds[player], street_folds[player] / rounds_played[player] * 100.0, street_all_ins[player]))
+        street_raises = raises[raises["street"] == street]
+        if len(street_raises):
+            biggest = street_raises[np.argmax(street_raises["amount"])]
+            night = store.nights[store.rounds[biggest["round"]]["night"]]["night"]
+            print(f'  Biggest raise/bet: {store.players[biggest["player"]]} {ACTION_TYPES[biggest["action"]].value} {biggest["amount"]} at {datetime.fromtimestamp(biggest["order"] / 100000)} ({night})')
+
+
+# matplotlib is most of the startup time and only the graphs use it, so it loads on the first graph.
+# The Agg backend just renders the png, no display needed.
+def _pyplot():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+def graph_file_name(last_file, show_event_points=False):
+    if show_event_points:
+        file_name = last_file.split(".")[0] + "_all_time_profit_graph.png"
+    else:
+        file_name = last_file.split(".")[0] + "_profit_graph.png"
+    return file_name.replace("logs", "graphs")
+
+# Draws the profit lines of a StackMatrix onto pyplot's current figure, each player's line joining the rows they have
+# an entry in
+def _draw_stack_history(plt, stack_matrix, title, show_event_points=False):
+    for column, player in enumerate(stack_matrix.players):
+        times, profits = stack_matrix.column(column)
         if show_event_points:
-            plt.plot("Time", player, data=df, marker='o', label="{}: ${:.2f}".format(player, player_chips[-1] / 100.00))
+            plt.plot(times, profits, marker='o', label="{}: ${:.2f}".format(player, profits[-1] / 100.00))
         else:
-            plt.plot("Time", player, data=df, label="{}: ${:.2f}".format(player, player_chips[-1] / 100.00))
+            plt.plot(times, profits, label="{}: ${:.2f}".format(player, profits[-1] / 100.00))
 
 
     plt.legend()
     plt.title(title)
     plt.ylabel("Profit in cents")
 
-    if show_event_points:
-        file_name = last_file.split(".")[0] + "_all_time_profit_graph.png"
-    else:
-        file_name = last_file.split(".")[0] + "_profit_graph.png"
-    file_name = file_name.replace("logs", "graphs")
-    plt.savefig(file_name)
+def graph_stack_history(stack_matrix, title, last_file, show_event_points=False):
+    plt = _pyplot()
+    _draw_stack_history(plt, stack_matrix, title, show_event_points)
+    plt.savefig(graph_file_name(last_file, show_event_points))
+    plt.close()
+
+# Same chart as graph_stack_history, returned as png bytes instead of written to graphs/
+def render_stack_history_png(stack_matrix, title, show_event_points=False):
+    plt = _pyplot()
+    _draw_stack_history(plt, stack_matrix, title, show_event_points)
+    png = io.BytesIO()
+    plt.savefig(png, format="png")
     plt.close()
+    return png.getvalue()
 
 def print_splitwise_instructions(player_history):
     splitwise_sum = 0
@@ -503,6 +1404,44 @@ def print_splitwise_instructions(player_history):
 
 
 SPLITWISE_API_URL = "https://secure.splitwise.com/api/v3.0"
+SPLITWISE_EXPENSES_PAGE_SIZE = 50
+SPLITWISE_HEADERS = {"Accept": "application/json", "User-Agent": "poker-with-the-boys/1.0"}
+SPLITWISE_RETRY_STATUSES = {429, 503} # turned away before it was handled, so sending it again is safe
+SPLITWISE_GATEWAY_STATUSES = {502, 504} # the request may still have gone through behind the gateway
+SPLITWISE_MAX_ATTEMPTS = 4
+SPLITWISE_IDLE_RECONNECT_SECONDS = 4.0 # shorter than servers usually keep an idle connection open
+SPLITWISE_BACKFILL_WORKERS = 4
+SPLITWISE_BACKFILL_REQUESTS_PER_SECOND = 2.0
+SPLITWISE_METADATA_FILE = ".cache/splitwise_metadata.json"
+SPLITWISE_METADATA_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+class SplitwiseHTTPError(RuntimeError):
+    def __init__(self, message, status, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+# Splitwise handled the request but turned it down (errors in the payload), so nothing was created
+class SplitwiseAPIError(RuntimeError):
+    pass
+
+
+def _splitwise_payload(status, reason, response_body, retry_after=None):
+    if status >= 400:
+        response_text = response_body.decode("utf-8", errors="replace").strip()
+        detail = f": {response_text}" if response_text else ""
+        raise SplitwiseHTTPError(
+            f"Splitwise API request failed ({status} {reason}){detail}. "
+            "Verify that SPLITWISE_API_TOKEN is the personal API key from the app details page.",
+            status,
+            float(retry_after) if retry_after and retry_after.isdigit() else None,
+        )
+    payload = json.loads(response_body)
+    if payload.get("errors"):
+        raise SplitwiseAPIError(f"Splitwise API error: {payload['errors']}")
+    return payload
 
 
 def _splitwise_request(method, path, token, data=None, opener=urlopen):
@@ -511,27 +1450,85 @@ def _splitwise_request(method, path, token, data=None, opener=urlopen):
     request = Request(
         url,
         data=body,
-        headers={
-            "Authorization": f"Bearer {token}",
-            "Accept": "application/json",
-            "User-Agent": "poker-with-the-boys/1.0",
-        },
+        headers={"Authorization": f"Bearer {token}", **SPLITWISE_HEADERS},
         method=method,
     )
+    status, reason = 200, "OK"
     try:
         with opener(request, timeout=30) as response:
-            payload = json.load(response)
+            response_body = response.read()
     except HTTPError as error:
-        response_body = error.read().decode("utf-8", errors="replace").strip()
-        detail = f": {response_body}" if response_body else ""
-        raise RuntimeError(
-            f"Splitwise API request failed ({error.code} {error.reason}){detail}. "
-            "Verify that SPLITWISE_API_TOKEN is the personal API key from the app details page."
-        ) from error
-
-    if payload.get("errors"):
-        raise RuntimeError(f"Splitwise API error: {payload['errors']}")
-    return payload
+        status, reason, response_body = error.code, error.reason, error.read()
+        return _splitwise_payload(status, reason, response_body, error.headers.get("Retry-After") if error.headers else None)
+    return _splitwise_payload(status, reason, response_body)
+
+
+# Sends every request of a run over one keep-alive connection instead of a new connection (and TLS handshake) each.
+# Given a urlopen style opener, requests go through that instead.
+class SplitwiseSession:
+    def __init__(self, token, base_url=SPLITWISE_API_URL, opener=None, timeout=30, clock=time.monotonic):
+        self.token = token
+        self.opener = opener
+        self.clock = clock
+        self.last_used = None
+        url = urlsplit(base_url)
+        self.base_path = url.path.rstrip("/")
+        connection_type = HTTPSConnection if url.scheme == "https" else HTTPConnection
+        self.connection = connection_type(url.hostname, url.port, timeout=timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def close(self):
+        self.connection.close()
+
+    def request(self, method, path, data=None):
+        if self.opener is not None:
+            return _splitwise_request(method, path, self.token, data, opener=self.opener)
+
+        headers = {"Authorization": f"Bearer {self.token}", **SPLITWISE_HEADERS}
+        body = None
+        if data is not None:
+            body = urlencode(data).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        # the server may have dropped the idle connection since the last request; only GETs are safe to send twice, so
+        # anything else gets a new connection once this one has sat idle (e.g. while the prompts waited for answers)
+        attempts = 2 if method == "GET" else 1
+        if method != "GET" and self.last_used is not None and self.clock() - self.last_used > SPLITWISE_IDLE_RECONNECT_SECONDS:
+            self.connection.close()
+        for attempt in range(attempts):
+            try:
+                self.connection.request(method, self.base_path + path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                response_body = response.read() # the whole body has to be read before the connection can be reused
+                self.last_used = self.clock()
+                break
+            except (RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self.connection.close()
+                if attempt == attempts - 1:
+                    raise
+        return _splitwise_payload(response.status, response.reason, response_body, response.getheader("Retry-After"))
+
+    # Expenses in the group dated within the given window, fetched a page at a time
+    def expenses_between(self, group_id, dated_after, dated_before, page_size=SPLITWISE_EXPENSES_PAGE_SIZE):
+        offset = 0
+        while True:
+            query = urlencode({
+                "group_id": group_id,
+                "dated_after": dated_after.isoformat(),
+                "dated_before": dated_before.isoformat(),
+                "limit": page_size,
+                "offset": offset,
+            })
+            expenses = self.request("GET", f"/get_expenses?{query}").get("expenses", [])
+            yield from expenses
+            if len(expenses) < page_size:
+                return
+            offset += page_size
 
 
 def _choose_poker_night_group(groups, input_fn=input, output_fn=print):
@@ -617,10 +1614,117 @@ def _map_players_to_group_members(
     return mapped_members
 
 
-def add_splitwise_expense(
-    player_history, event_date, token, opener=urlopen, input_fn=input
-):
-    """Create the poker-night expense using cents from the parsed stack history."""
+# The season's group and members rarely change, so the chosen group, its members, the player to member mapping and
+# the nights already in Splitwise are kept on disk for a while. Runs within the TTL skip /get_groups, the prompts and
+# the duplicate lookup; a new player, a member who left, an expired TTL or a different API token looks everything up
+# again.
+class SplitwiseMetadata:
+    def __init__(self, path=SPLITWISE_METADATA_FILE, ttl_seconds=SPLITWISE_METADATA_TTL_SECONDS, clock=time.time):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        try:
+            with open(path) as file:
+                self.data = json.load(file)
+        except (OSError, ValueError):
+            self.data = {}
+
+    @staticmethod
+    def _token_key(token):
+        return hashlib.sha256(token.encode()).hexdigest()[:12]
+
+    @property
+    def group(self):
+        return self.data.get("group")
+
+    @property
+    def player_members(self):
+        return self.data.get("player_members", {})
+
+    @property
+    def posted_dates(self):
+        return set(self.data.get("posted_dates", []))
+
+    def is_fresh(self, token):
+        return (
+            self.group is not None
+            and self.data.get("token") == self._token_key(token)
+            and self.clock() < self.data.get("fetched_at", 0) + self.ttl_seconds
+        )
+
+    def covers(self, token, players):
+        return self.is_fresh(token) and all(player in self.player_members for player in players)
+
+    def _same_group(self, token, group):
+        return bool(self.group) and self.group.get("id") == group.get("id") and self.data.get("token") == self._token_key(token)
+
+    # Emails of the previously mapped players that are still in the group, so refreshing doesn't prompt for them again
+    def known_emails(self, token, group):
+        if not self._same_group(token, group):
+            return {}
+        emails = {str(member.get("email") or "").casefold() for member in group.get("members", [])}
+        return {
+            player: member["email"]
+            for player, member in self.player_members.items()
+            if str(member.get("email") or "").casefold() in emails
+        }
+
+    def update(self, token, group, player_members):
+        self.data = {
+            "token": self._token_key(token),
+            "fetched_at": self.clock(),
+            "group": group,
+            "player_members": player_members,
+            "posted_dates": self.data.get("posted_dates", []) if self._same_group(token, group) else [],
+        }
+
+    def record_posted(self, *event_dates):
+        self.data["posted_dates"] = sorted(self.posted_dates | {event_date.isoformat() for event_date in event_dates})
+
+    def expire(self):
+        self.data.pop("fetched_at", None)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(self.data, file, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+
+def _expire_splitwise_metadata(path=SPLITWISE_METADATA_FILE):
+    metadata = SplitwiseMetadata(path)
+    if metadata.data:
+        metadata.expire()
+        metadata.save()
+
+
+# The cached group when it's still there (no prompt), otherwise the one picked from the Poker Night groups
+def _poker_night_group(session, input_fn, metadata=None):
+    groups = session.request("GET", "/get_groups").get("groups", [])
+    cached_group_id = metadata.group.get("id") if metadata is not None and metadata.group else None
+    group = next((group for group in groups if group.get("id") == cached_group_id), None)
+    if group is None:
+        group = _choose_poker_night_group(groups, input_fn=input_fn)
+    return group
+
+
+def _group_members_for(token, group, players, input_fn, metadata=None):
+    known_emails = metadata.known_emails(token, group) if metadata is not None else {}
+    # players mapped on earlier runs get mapped again too, so the cache keeps covering them
+    mapped_members = _map_players_to_group_members(
+        dict.fromkeys([*players, *known_emails]),
+        group.get("members", []),
+        input_fn=input_fn,
+        email_by_player={**SPLITWISE_EMAIL_BY_PLAYER, **known_emails},
+    )
+    if metadata is not None:
+        metadata.update(token, group, mapped_members)
+        metadata.save()
+    return {player: mapped_members[player] for player in players}
+
+
+def _night_profits(player_history):
     profits = {
         player: entries[-1][0]
         for player, entries in player_history.items()
@@ -633,40 +1737,34 @@ def add_splitwise_expense(
     positive_total = sum(amount for amount in profits.values() if amount > 0)
     if positive_total <= 0:
         raise ValueError("Cannot post a poker night with no positive balance")
+    return profits, positive_total
 
-    groups_response = _splitwise_request("GET", "/get_groups", token, opener=opener)
-    group = _choose_poker_night_group(groups_response.get("groups", []), input_fn=input_fn)
-
-    description = f"Poker Night {event_date}"
-    existing_expenses = _splitwise_request(
-        "GET",
-        f"/get_expenses?group_id={group['id']}",
-        token,
-        opener=opener,
-    ).get("expenses", [])
-    if any(
-        expense.get("description") == description
-        and expense.get("date", "")[:10] == event_date.isoformat()
-        for expense in existing_expenses
-    ):
-        warnings.warn(
-            f'Splitwise expense "{description}" already exists; skipping creation',
-            RuntimeWarning,
-        )
-        return None
 
-    mapped_members = _map_players_to_group_members(
-        profits,
-        group.get("members", []),
-        input_fn=input_fn,
+def _splitwise_description(event_date):
+    return f"Poker Night {event_date}"
+
+
+# The night's expense if it's already in the group. Only the expenses dated around the game night (a day either side
+# for time zones) are fetched instead of the group's whole history.
+def _find_splitwise_expense(session, group_id, event_date):
+    description = _splitwise_description(event_date)
+    existing_expenses = session.expenses_between(group_id, event_date - timedelta(days=1), event_date + timedelta(days=2))
+    return next(
+        (
+            expense for expense in existing_expenses
+            if expense.get("description") == description and expense.get("date", "")[:10] == event_date.isoformat()
+        ),
+        None,
     )
 
+
+def _expense_data(event_date, group_id, profits, positive_total, mapped_members):
     expense_data = {
         "cost": f"{positive_total / 100:.2f}",
-        "description": description,
+        "description": _splitwise_description(event_date),
         "details": "Generated by the poker-with-the-boys script",
         "date": event_date.isoformat(),
-        "group_id": group["id"],
+        "group_id": group_id,
         "currency_code": "CAD",
     }
     for index, (player, amount) in enumerate(profits.items()):
@@ -674,264 +1772,1282 @@ def add_splitwise_expense(
         expense_data[f"users__{index}__user_id"] = str(user_id)
         expense_data[f"users__{index}__paid_share"] = f"{max(amount, 0) / 100:.2f}"
         expense_data[f"users__{index}__owed_share"] = f"{max(-amount, 0) / 100:.2f}"
+    return expense_data
 
-    response = _splitwise_request(
-        "POST", "/create_expense", token, data=expense_data, opener=opener
-    )
+
+def add_splitwise_expense(
+    player_history,
+    event_date,
+    token,
+    opener=None,
+    input_fn=input,
+    base_url=SPLITWISE_API_URL,
+    metadata_path=None,
+):
+    """Create the poker-night expense using cents from the parsed stack history."""
+    profits, positive_total = _night_profits(player_history)
+    metadata = SplitwiseMetadata(metadata_path) if metadata_path else None
+    with SplitwiseSession(token, base_url, opener=opener) as session:
+        return _add_splitwise_expense(session, profits, positive_total, event_date, input_fn, metadata)
+
+
+def _add_splitwise_expense(session, profits, positive_total, event_date, input_fn, metadata=None):
+    description = _splitwise_description(event_date)
+    cached = metadata is not None and metadata.covers(session.token, profits)
+    if cached:
+        group = metadata.group
+        mapped_members = {player: metadata.player_members[player] for player in profits}
+        already_posted = event_date.isoformat() in metadata.posted_dates
+    else:
+        group = _poker_night_group(session, input_fn, metadata)
+        already_posted = _find_splitwise_expense(session, group["id"], event_date) is not None
+    if already_posted:
+        warnings.warn(
+            f'Splitwise expense "{description}" already exists; skipping creation',
+            RuntimeWarning,
+        )
+        return None
+
+    if not cached:
+        mapped_members = _group_members_for(session.token, group, profits, input_fn, metadata)
+
+    expense_data = _expense_data(event_date, group["id"], profits, positive_total, mapped_members)
+    try:
+        response = session.request("POST", "/create_expense", data=expense_data)
+    except SplitwiseAPIError:
+        if not cached:
+            raise
+        # turned down without creating anything, most likely a cached member who left the group, so look the group up
+        # again and post once more
+        metadata.expire()
+        return _add_splitwise_expense(session, profits, positive_total, event_date, input_fn, metadata)
     expense = response.get("expenses", [{}])[0]
+    if metadata is not None:
+        metadata.record_posted(event_date)
+        metadata.save()
     print(
         f"Added Splitwise expense {expense.get('id', '(unknown id)')} "
         f"to group {group['id']} for {event_date}"
     )
     return expense
-### Stats methods
 
-# helper method to get the poker round from a timestamp
-def poker_round_for_timestamp(rounds, time):
-    for round in rounds:
-        if round.start_time <= time and round.end_time >= time:
-            return round
 
-    return None
+# Spaces calls out evenly so concurrent posts stay under the API's rate limit
+class RateLimiter:
+    def __init__(self, per_second, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1 / per_second
+        self.clock = clock
+        self.sleep = sleep
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = self.clock()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        if start > now:
+            self.sleep(start - now)
+
+
+# Sends again after a rate limit or an unavailable server. After a gateway error the expense may have been created
+# anyway, so it's only sent again when find_existing (the dated duplicate lookup) doesn't turn it up.
+def _with_retries(send, attempts=SPLITWISE_MAX_ATTEMPTS, backoff_seconds=1.0, sleep=time.sleep, find_existing=None):
+    for attempt in range(attempts):
+        try:
+            return send()
+        except SplitwiseHTTPError as error:
+            uncertain = find_existing is not None and error.status in SPLITWISE_GATEWAY_STATUSES
+            if not (uncertain or error.status in SPLITWISE_RETRY_STATUSES) or attempt == attempts - 1:
+                raise
+            sleep(error.retry_after if error.retry_after is not None else backoff_seconds * 2 ** attempt)
+            if uncertain:
+                existing = find_existing()
+                if existing is not None:
+                    return existing
+
+
+def backfill_splitwise_expenses(
+    nights,
+    token,
+    opener=None,
+    input_fn=input,
+    base_url=SPLITWISE_API_URL,
+    workers=SPLITWISE_BACKFILL_WORKERS,
+    requests_per_second=SPLITWISE_BACKFILL_REQUESTS_PER_SECOND,
+    sleep=time.sleep,
+    metadata_path=None,
+):
+    """Post every (event date, player history) night that isn't in Splitwise yet.
+
+    The group, member mapping (unless the metadata cache covers them) and existing expenses are looked up once for
+    the whole range. Returns a list of
+    (event date, outcome, detail) in date order, where outcome is posted, exists, skipped or failed.
+    """
+    results = []
+    postable = []
+    for event_date, player_history in nights:
+        try:
+            profits, positive_total = _night_profits(player_history)
+        except ValueError as error:
+            results.append((event_date, "skipped", str(error)))
+            continue
+        postable.append((event_date, profits, positive_total))
+    if not postable:
+        return sorted(results, key=lambda result: result[0])
+
+    metadata = SplitwiseMetadata(metadata_path) if metadata_path else None
+    players = dict.fromkeys(player for _, profits, _ in postable for player in profits)
+    with SplitwiseSession(token, base_url, opener=opener) as session:
+        cached = metadata is not None and metadata.covers(token, players)
+        group = metadata.group if cached else _poker_night_group(session, input_fn, metadata)
+        first_date = min(event_date for event_date, _, _ in postable)
+        last_date = max(event_date for event_date, _, _ in postable)
+        existing = {
+            (expense.get("description"), expense.get("date", "")[:10])
+            for expense in session.expenses_between(group["id"], first_date - timedelta(days=1), last_date + timedelta(days=2))
+        }
+        if cached:
+            mapped_members = {player: metadata.player_members[player] for player in players}
+        else:
+            mapped_members = _group_members_for(token, group, players, input_fn, metadata)
+
+    missing = []
+    for event_date, profits, positive_total in postable:
+        expense_key = (_splitwise_description(event_date), event_date.isoformat())
+        if expense_key in existing:
+            results.append((event_date, "exists", "already in Splitwise"))
+        elif any(event_date == missing_date for missing_date, _, _ in missing):
+            results.append((event_date, "skipped", "another night on this date is being posted"))
+        else:
+            missing.append((event_date, profits, positive_total))
 
-# returns the player name who won the most rounds and those rounds. Also all other player wins
-def most_wins(rounds):
-    player_wins = {}
-    for round in rounds:
-        for player in round.winning_players:
-            existing_winning_rounds = player_wins.get(player, [])
-            existing_winning_rounds.append(round)
-            player_wins[player] = existing_winning_rounds
+    # http.client connections can't be shared between threads, so every worker gets its own session
+    limiter = RateLimiter(requests_per_second, sleep=sleep)
+    local = threading.local()
+    sessions = []
 
-    most_winning_player, winning_rounds = max(player_wins.items(), key = lambda k : len(k[1]))
+    def post(event_date, profits, positive_total):
+        if not hasattr(local, "session"):
+            local.session = SplitwiseSession(token, base_url, opener=opener)
+            sessions.append(local.session)
+        expense_data = _expense_data(event_date, group["id"], profits, positive_total, mapped_members)
 
-    return most_winning_player, winning_rounds, player_wins
+        def send():
+            limiter.wait()
+            return local.session.request("POST", "/create_expense", data=expense_data).get("expenses", [{}])[0]
 
-# returns the round where the most amount was won
-def biggest_win(rounds):
-    biggest_amount = 0
-    biggest_round = None
-    for round in rounds:
-        for amount in round.winning_amounts:
-            if amount > biggest_amount:
-                biggest_amount = amount
-                biggest_round = round
+        def find_existing():
+            limiter.wait()
+            return _find_splitwise_expense(local.session, group["id"], event_date)
+
+        return _with_retries(send, sleep=sleep, find_existing=find_existing)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {executor.submit(post, *night): night[0] for night in missing}
+            for future in as_completed(futures):
+                try:
+                    expense = future.result()
+                except (RuntimeError, OSError) as error:
+                    results.append((futures[future], "failed", str(error)))
+                else:
+                    results.append((futures[future], "posted", f"expense {expense.get('id', '(unknown id)')}"))
+    finally:
+        for session in sessions:
+            session.close()
+    if metadata is not None:
+        metadata.record_posted(*(event_date for event_date, outcome, _ in results if outcome in ("posted", "exists")))
+        metadata.save()
+    return sorted(results, key=lambda result: result[0])
+
+
+def print_backfill_summary(results):
+    print("=== Splitwise Backfill ===")
+    for event_date, outcome, detail in results:
+        print(f"{event_date} {outcome: <8} {detail}")
+    counts = Counter(outcome for _, outcome, _ in results)
+    print(
+        f"Posted {counts['posted']}, already in Splitwise {counts['exists']}, "
+        f"skipped {counts['skipped']}, failed {counts['failed']}"
+    )
+    print("=" * 20)
+
+
+### Graph regeneration
+# Rebuilds graphs/poker_night_*_profit_graph.png after parser or chart changes without a run per date. A manifest
+# records the csv hash, parser version and render settings each png was drawn with, so only pngs whose inputs
+# changed (or that are missing) get drawn again. Every worker imports matplotlib once and redraws one figure.
+
+GRAPH_MANIFEST_FILE = ".cache/graph_manifest.json"
+GRAPH_RENDER_VERSION = 1 # bump whenever the chart itself changes
+
+def graph_render_fingerprint():
+    from importlib.metadata import PackageNotFoundError, version
+    try:
+        matplotlib_version = version("matplotlib")
+    except PackageNotFoundError:
+        matplotlib_version = "unknown"
+    return f"{GRAPH_RENDER_VERSION}-agg-matplotlib-{matplotlib_version}"
+
+def load_graph_manifest(path=GRAPH_MANIFEST_FILE):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def save_graph_manifest(manifest, path=GRAPH_MANIFEST_FILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    os.replace(temp_path, path)
+
+def _graph_manifest_entry(csv_sha256):
+    return {"csv_sha256": csv_sha256, "parser_version": parser_fingerprint(), "render": graph_render_fingerprint()}
+
+# The nights whose png is missing or was drawn from a different csv, parser or renderer than the current ones
+def stale_graphs(csv_files, manifest):
+    return [
+        csv_file for csv_file in csv_files
+        if not os.path.exists(graph_file_name(csv_file))
+        or manifest.get(graph_file_name(csv_file)) != _graph_manifest_entry(csv_content_hash(csv_file))
+    ]
+
+def _init_graph_worker():
+    _pyplot().figure() # stays the current figure for every night this worker draws
+
+def render_night_graph(csv_file, use_cache=True):
+    plt = _pyplot()
+    night = load_night(csv_file, use_cache)
+    plt.clf()
+    _draw_stack_history(plt, night.stack_matrix, "Profit for " + date_of_csv(csv_file).strftime("%Y/%m/%d"))
+    png = graph_file_name(csv_file)
+    plt.savefig(png)
+    return png, night.csv_sha256
+
+# Draws the stale pngs (in a process pool with jobs > 1), updating the manifest as they finish. Returns the pngs drawn
+def regenerate_graphs(csv_files, jobs=1, use_cache=True, manifest_path=GRAPH_MANIFEST_FILE):
+    manifest = load_graph_manifest(manifest_path)
+    stale_csv_files = stale_graphs(csv_files, manifest)
+    rendered = []
+    try:
+        if jobs <= 1 or len(stale_csv_files) <= 1:
+            _init_graph_worker()
+            try:
+                for csv_file in stale_csv_files:
+                    png, csv_sha256 = render_night_graph(csv_file, use_cache)
+                    manifest[png] = _graph_manifest_entry(csv_sha256)
+                    rendered.append(png)
+            finally:
+                _pyplot().close()
+        else:
+            chunksize = max(1, len(stale_csv_files) // (jobs * 4))
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_graph_worker) as executor:
+                for png, csv_sha256 in executor.map(render_night_graph, stale_csv_files, repeat(use_cache), chunksize=chunksize):
+                    manifest[png] = _graph_manifest_entry(csv_sha256)
+                    rendered.append(png)
+    finally:
+        save_graph_manifest(manifest, manifest_path)
+    return rendered
+
+### Stats methods
+
+# The hand type of a logged winning hand, i.e. "Pair" for "Pair, K's (combination: K♠, K♥, ...)"
+def logged_hand_type(hand):
+    prefix = hand.split("(combination:")[0] # i.e. Pair, K's
+    hand_type = prefix.split(",")[0] # i.e. Pair
+    if "High" in hand_type: # "A's High" -> "High Card"
+        hand_type = "High Card"
+    return hand_type
+
+
+### Hand evaluation
+# Cards are ints, rank * 4 + suit with ranks 0 (a 2) to 12 (an ace). A hand of 5 to 7 cards becomes one 13 bit rank
+# mask per suit, and from those the ranks held at least 1, 2, 3 and 4 times are plain bitwise ands and ors. Tables
+# indexed by a rank mask (8192 entries each) give its bit count, highest rank, straight and top kickers, so a hand
+# is ranked without sorting or trying every 5 card combination. A hand's value is its category << 20 followed by up
+# to five 4 bit ranks, so better hands always have bigger values. evaluate_many does the same with numpy for whole
+# arrays of hands at once, for when millions of them need ranking.
+
+HAND_CATEGORIES = ["High Card", "Pair", "Two Pair", "Three of a Kind", "Straight", "Flush", "Full House", "Four of a Kind", "Straight Flush"]
+HIGH_CARD, PAIR, TWO_PAIR, THREE_OF_A_KIND, STRAIGHT, FLUSH, FULL_HOUSE, FOUR_OF_A_KIND, STRAIGHT_FLUSH = range(len(HAND_CATEGORIES))
+CARD_RANKS = {"2": 0, "3": 1, "4": 2, "5": 3, "6": 4, "7": 5, "8": 6, "9": 7, "10": 8, "J": 9, "Q": 10, "K": 11, "A": 12}
+CARD_SUITS = {"♣": 0, "♦": 1, "♥": 2, "♠": 3}
+# logs/poker_night_20240612.csv went through a utf-8 as cp1252 round trip, "♥" there is "â™¥". ♠ should end in a nbsp
+# but that became a plain space, so it's just "â™"
+MISDECODED_CARD_SUITS = {suit.encode().decode("cp1252").rstrip("\xa0"): suit for suit in CARD_SUITS}
+_HAND_TABLES = None
+
+def card_code(card):
+    suit = card[-1]
+    if suit not in CARD_SUITS:
+        rank, _, misdecoded_suit = card.partition("â")
+        card, suit = rank, MISDECODED_CARD_SUITS["â" + misdecoded_suit]
+    else:
+        card = card[:-1]
+    return CARD_RANKS[card] * 4 + CARD_SUITS[suit]
+
+# "K♣, 7♥" (or a list of cards, like table_cards) to card codes
+def card_codes(cards):
+    if isinstance(cards, str):
+        cards = cards.split(", ")
+    return [card_code(card.strip(" ")) for card in cards if card.strip(" ")]
+
+# (popcount, highest rank, straight high, top 1..5 ranks packed 4 bits each) per 13 bit rank mask, as numpy arrays
+def _build_hand_tables():
+    masks = np.arange(1 << 13, dtype=np.int64)
+    bits = (masks[:, None] >> np.arange(13)) & 1
+    popcount = bits.sum(axis=1)
+    high_rank = np.where(masks > 0, 12 - np.argmax(bits[:, ::-1], axis=1), -1)
+
+    straight_high = np.full(len(masks), -1, dtype=np.int64)
+    for high in range(12, 3, -1):
+        window = 0b11111 << (high - 4)
+        straight_high = np.where((straight_high < 0) & (masks & window == window), high, straight_high)
+    wheel = (1 << 12) | 0b1111
+    straight_high = np.where((straight_high < 0) & (masks & wheel == wheel), 3, straight_high)
+
+    top_ranks = [np.zeros(len(masks), dtype=np.int64)]
+    remaining, packed = masks.copy(), np.zeros(len(masks), dtype=np.int64)
+    for _ in range(5):
+        rank = np.maximum(high_rank[remaining], 0)
+        packed = packed << 4 | rank
+        remaining = remaining & ~(1 << rank)
+        top_ranks.append(packed.copy())
+    return popcount, high_rank, straight_high, np.stack(top_ranks)
+
+def _hand_tables():
+    global _HAND_TABLES
+    if _HAND_TABLES is None:
+        popcount, high_rank, straight_high, top_ranks = _build_hand_tables()
+        _HAND_TABLES = {
+            "arrays": (popcount, high_rank, straight_high, top_ranks),
+            "lists": (popcount.tolist(), high_rank.tolist(), straight_high.tolist(), top_ranks.tolist()),
+        }
+    return _HAND_TABLES
+
+# The value of the best 5 card hand in 5 to 7 card codes
+def hand_value(cards):
+    popcount, high_rank, straight_high, top_ranks = _hand_tables()["lists"]
+    suit_masks = [0, 0, 0, 0]
+    for card in cards:
+        suit_masks[card & 3] |= 1 << (card >> 2)
+    s0, s1, s2, s3 = suit_masks
+    ranks = s0 | s1 | s2 | s3
+
+    flush = None
+    for suit_mask in suit_masks:
+        if popcount[suit_mask] >= 5:
+            if straight_high[suit_mask] >= 0:
+                return STRAIGHT_FLUSH << 20 | straight_high[suit_mask] << 16
+            flush = FLUSH << 20 | top_ranks[5][suit_mask]
+            break
 
-    return biggest_round
+    quads = s0 & s1 & s2 & s3
+    if quads:
+        quad_rank = high_rank[quads]
+        return FOUR_OF_A_KIND << 20 | quad_rank << 16 | top_ranks[1][ranks & ~(1 << quad_rank)] << 12
+    trips = (s0 & s1 & s2) | (s0 & s1 & s3) | (s0 & s2 & s3) | (s1 & s2 & s3)
+    pairs = (s0 & s1) | (s0 & s2) | (s0 & s3) | (s1 & s2) | (s1 & s3) | (s2 & s3) # held at least twice
+    if trips:
+        trips_rank = high_rank[trips]
+        full_house_pairs = pairs & ~(1 << trips_rank)
+        if full_house_pairs:
+            return FULL_HOUSE << 20 | trips_rank << 16 | high_rank[full_house_pairs] << 12
+    if flush is not None:
+        return flush
+    if straight_high[ranks] >= 0:
+        return STRAIGHT << 20 | straight_high[ranks] << 16
+    if trips:
+        return THREE_OF_A_KIND << 20 | trips_rank << 16 | top_ranks[2][ranks & ~(1 << trips_rank)] << 8
+    if popcount[pairs] >= 2:
+        top_pairs = top_ranks[2][pairs]
+        kickers = ranks & ~(1 << (top_pairs >> 4)) & ~(1 << (top_pairs & 15))
+        return TWO_PAIR << 20 | top_pairs << 12 | top_ranks[1][kickers] << 8
+    if pairs:
+        return PAIR << 20 | high_rank[pairs] << 16 | top_ranks[3][ranks & ~pairs] << 4
+    return HIGH_CARD << 20 | top_ranks[5][ranks]
+
+# hand_value for every row of an (n, 5 to 7) array of card codes
+def evaluate_many(cards):
+    popcount, high_rank, straight_high, top_ranks = _hand_tables()["arrays"]
+    cards = np.asarray(cards, dtype=np.int64)
+    # one 64 bit mask per hand with each suit's 13 ranks 16 bits apart, then split back into the suits
+    hand_masks = np.bitwise_or.reduce(np.left_shift(1, (cards & 3) * 16 + (cards >> 2)), axis=1)
+    s0, s1, s2, s3 = ((hand_masks >> (16 * suit)) & 0x1FFF for suit in range(4))
+    ranks = s0 | s1 | s2 | s3
+    quads = s0 & s1 & s2 & s3
+    trips = (s0 & s1 & s2) | (s0 & s1 & s3) | (s0 & s2 & s3) | (s1 & s2 & s3)
+    pairs = (s0 & s1) | (s0 & s2) | (s0 & s3) | (s1 & s2) | (s1 & s3) | (s2 & s3)
+
+    flush_mask = np.zeros(len(cards), dtype=np.int64)
+    for suit_mask in (s0, s1, s2, s3):
+        flush_mask = np.where(popcount[suit_mask] >= 5, suit_mask, flush_mask)
+    quad_rank = np.maximum(high_rank[quads], 0)
+    trips_rank = np.maximum(high_rank[trips], 0)
+    full_house_pairs = pairs & ~(1 << trips_rank)
+    top_pairs = top_ranks[2][pairs]
+    two_pair_kickers = ranks & ~(1 << (top_pairs >> 4)) & ~(1 << (top_pairs & 15))
+
+    return np.select(
+        [
+            straight_high[flush_mask] >= 0,
+            quads != 0,
+            (trips != 0) & (full_house_pairs != 0),
+            flush_mask != 0,
+            straight_high[ranks] >= 0,
+            trips != 0,
+            popcount[pairs] >= 2,
+            pairs != 0,
+        ],
+        [
+            STRAIGHT_FLUSH << 20 | straight_high[flush_mask] << 16,
+            FOUR_OF_A_KIND << 20 | quad_rank << 16 | top_ranks[1][ranks & ~(1 << quad_rank)] << 12,
+            FULL_HOUSE << 20 | trips_rank << 16 | np.maximum(high_rank[full_house_pairs], 0) << 12,
+            FLUSH << 20 | top_ranks[5][flush_mask],
+            STRAIGHT << 20 | straight_high[ranks] << 16,
+            THREE_OF_A_KIND << 20 | trips_rank << 16 | top_ranks[2][ranks & ~(1 << trips_rank)] << 8,
+            TWO_PAIR << 20 | top_pairs << 12 | top_ranks[1][two_pair_kickers] << 8,
+            PAIR << 20 | np.maximum(high_rank[pairs], 0) << 16 | top_ranks[3][ranks & ~pairs] << 4,
+        ],
+        default=HIGH_CARD << 20 | top_ranks[5][ranks],
+    )
 
-# returns the number of rounds where a player was seated
-def rounds_played_by_players(rounds):
-    player_round_counts = defaultdict(lambda: 0)
+# The site's name for a hand value's type, "Royal Flush" being the ace high straight flush
+def hand_category(value):
+    if value >> 20 == STRAIGHT_FLUSH and (value >> 16) & 15 == 12:
+        return "Royal Flush"
+    return HAND_CATEGORIES[value >> 20]
+
+# Ranks every showdown with a full board: whoever has the best of the hands shown by players who didn't fold wins at
+# least the main pot, so they have to be among the logged winners, and every winner's hand has to be the type the site
+# logged for it. Hands run twice are skipped, only the first board gets parsed. Returns (showdowns checked, problems).
+def check_showdowns(rounds):
+    checked, problems = 0, []
     for round in rounds:
-        for player in round.player_balances: # they only have a balance if they're in the start of that round
-            player_round_counts[player] += 1
-
-    return player_round_counts
-
-# returns the largest raise/bet for the round actions provided
-def largest_raise_or_bet_for_round_actions(round_actions):
-    biggest_raise_action = None
-
-    raise_or_bet_actions = filter(lambda action: action.action_type in [RoundAction.raises, RoundAction.bets], round_actions)
-    for raise_action in raise_or_bet_actions:
-        if biggest_raise_action is None or raise_action.amount > biggest_raise_action.amount:
-                biggest_raise_action = raise_action
-
-    return biggest_raise_action
-
-# returns the number of folds per player in round_actions
-def number_of_folds_per_player(round_actions):
-    player_folds = defaultdict(lambda: 0)
-    fold_actions = filter(lambda action: action.action_type == RoundAction.folds, round_actions)
-    for action in fold_actions:
-        player_folds[action.player] += 1
-
-    return player_folds
-
-# all-ins for players in round_actions
-def all_ins_per_player(round_actions):
-    player_all_ins = defaultdict(lambda: [])
-    for round in round_actions:
-        if round.all_in:
-            player_all_ins[round.player].append(round)
-
-    return player_all_ins
-
-# returns the winning PokerRounds by each player corresponding to the rounds in the
-# player_to_round_actions dict rounds.
-def player_wins_for_round_actions(all_rounds, player_to_round_actions):
-    player_to_winning_rounds = defaultdict(lambda: [])
-    for player, round_actions in player_to_round_actions.items():
-        for action in round_actions:
-            poker_round = poker_round_for_timestamp(all_rounds, action.time) # use the timestamp to look up the round (inefficient, but it works)
-            if player in poker_round.winning_players:
-                player_to_winning_rounds[player].append(poker_round)
-
-    return player_to_winning_rounds
-
-# returns the number of times per player that they showed their hidden hand
-# after they won the round
-def gentleman_scores_by_player(rounds):
-    rounds_without_winner_showing_hand = list(filter(lambda r: r.winning_hands == [], rounds))
-    player_to_num_hand_shows_post_win = defaultdict(lambda: 0)
-    for round in rounds_without_winner_showing_hand:
-        for winning_player in round.winning_players:
-            if winning_player in round.player_to_hand: # if we know what their hand is
-                player_to_num_hand_shows_post_win[winning_player] += 1
-
-    return player_to_num_hand_shows_post_win
-
-# returns the number of different types of shown winning hands per player
-def winning_hand_types_by_player(rounds):
-    player_to_hand_type_to_wins = defaultdict(lambda: defaultdict(lambda: 0))
-    hands_with_known_win = 0
+        board = getattr(round, "table_cards", None)
+        if not round.winning_hands or board is None or len(board) != 5:
+            continue
+        if any("second run" in hand for hand in round.winning_hands):
+            continue
+        folded = {action.player for action in round.player_actions if action.action_type == RoundAction.folds}
+        hole_cards = {player: card_codes(hand) for player, hand in round.player_to_hand.items() if player not in folded}
+        hole_cards = {player: cards for player, cards in hole_cards.items() if len(cards) == 2}
+        if not hole_cards:
+            continue
+        board_codes = card_codes(board)
+        values = {player: hand_value(cards + board_codes) for player, cards in hole_cards.items()}
+        checked += 1
+
+        where = f"hand #{round.round_number} at {round.start_time}"
+        best_value = max(values.values())
+        best_players = sorted(player for player, value in values.items() if value == best_value)
+        if not set(best_players) & set(round.winning_players):
+            problems.append(f"{where}: {', '.join(best_players)} had the best hand ({hand_category(best_value)}) but won nothing")
+        if len(round.winning_hands) == len(round.winning_players):
+            for player, hand in zip(round.winning_players, round.winning_hands):
+                if player in values and hand_category(values[player]) != logged_hand_type(hand).rstrip():
+                    problems.append(f"{where}: {player} won with {hand.strip()} but has {hand_category(values[player])}")
+    return checked, problems
+
+
+### Preflop equity table
+# Heads-up equity before the flop only depends on the two starting hands, and with suits that don't matter folded away
+# there are 169 of those (13 pairs, 78 suited and 78 offsuit hands). build_preflop_equity_table works out every class
+# against every other once: all 1326 two card hands get ranked on the same sampled boards, and each matchup compares a
+# random hand of each class on every board that misses both. The table is 169 * 169 uint16 after a small header, so
+# it's 57KB on disk and load_preflop_equity_table memory maps it instead of reading it, which lets every --jobs process
+# share one copy. Entry [a, b] is class a's equity against class b out of PREFLOP_EQUITY_SCALE, with [b, a] stored as
+# the rest so the two always add up to exactly 1.
+
+PREFLOP_EQUITY_FILE = ".cache/preflop_equity.bin"
+PREFLOP_EQUITY_MAGIC = b"PFEQ"
+PREFLOP_EQUITY_VERSION = 1
+PREFLOP_EQUITY_HEADER = struct.Struct("<4sHHI") # magic, version, hand classes, boards sampled
+PREFLOP_EQUITY_SCALE = 65534 # even, so a class against itself is exactly half
+PREFLOP_EQUITY_BOARDS = 50000
+PREFLOP_EQUITY_CHUNK = 5000 # boards ranked at a time, every hand on them is a (1326, chunk) int64 array
+STARTING_HAND_CLASSES = 169
+RANK_LETTERS = "23456789TJQKA"
+_PREFLOP_EQUITY_TABLES = {} # path to the loaded table, or None when there's no file
+
+# Row is the higher rank for suited hands and pairs, the lower one for offsuit hands, like the usual 13 x 13 chart
+def starting_hand_class(cards):
+    first, second = cards
+    high, low = max(first >> 2, second >> 2), min(first >> 2, second >> 2)
+    if (first & 3) == (second & 3) or high == low:
+        return high * 13 + low
+    return low * 13 + high
+
+def starting_hand_name(hand_class):
+    row, column = divmod(hand_class, 13)
+    if row == column:
+        return RANK_LETTERS[row] * 2
+    if row > column:
+        return RANK_LETTERS[row] + RANK_LETTERS[column] + "s"
+    return RANK_LETTERS[column] + RANK_LETTERS[row] + "o"
+
+# Every two card hand as a (1326, 2) array of card codes, and the class of each
+def _starting_hands():
+    hands = np.array(list(combinations(range(52), 2)), dtype=np.int64)
+    return hands, np.array([starting_hand_class(hand) for hand in hands.tolist()])
+
+class PreflopEquityTable():
+    def __init__(self, quantized, boards):
+        self.quantized = quantized # uint16 [hand class, opponent's hand class]
+        self.boards = boards
+
+    # Chance the first starting hand beats the second heads-up, ties counting half
+    def equity(self, cards, other_cards):
+        return int(self.quantized[starting_hand_class(cards), starting_hand_class(other_cards)]) / PREFLOP_EQUITY_SCALE
+
+def build_preflop_equity_table(boards=PREFLOP_EQUITY_BOARDS, seed=0):
+    hands, hand_classes = _starting_hands()
+    hand_masks = (1 << hands[:, 0]) | (1 << hands[:, 1])
+    class_hands = [np.flatnonzero(hand_classes == hand_class) for hand_class in range(STARTING_HAND_CLASSES)]
+    class_sizes = np.array([len(members) for members in class_hands])
+    class_members = np.array([np.resize(members, class_sizes.max()) for members in class_hands]) # padded to 12 each
+
+    rng = np.random.default_rng(seed)
+    wins = np.zeros((STARTING_HAND_CLASSES, STARTING_HAND_CLASSES))
+    matchups = np.zeros((STARTING_HAND_CLASSES, STARTING_HAND_CLASSES))
+    for start in range(0, boards, PREFLOP_EQUITY_CHUNK):
+        chunk = remaining_boards([], 5, rng, samples=min(PREFLOP_EQUITY_CHUNK, boards - start))
+        columns = np.arange(len(chunk))
+        values = np.stack([evaluate_many(np.hstack([np.broadcast_to(hand, (len(chunk), 2)), chunk])) for hand in hands])
+        board_masks = np.bitwise_or.reduce(1 << chunk, axis=1)
+        values[(hand_masks[:, None] & board_masks) != 0] = -1 # the board uses one of the hand's cards
+        for hand_class in range(STARTING_HAND_CLASSES - 1):
+            others = np.arange(hand_class + 1, STARTING_HAND_CLASSES)
+            hero = class_members[hand_class][rng.integers(0, class_sizes[hand_class], size=len(chunk))]
+            villains = class_members[others[:, None], rng.integers(0, class_sizes[others][:, None], size=(len(others), len(chunk)))]
+            hero_values, villain_values = values[hero, columns], values[villains, columns]
+            counted = (hero_values >= 0) & (villain_values >= 0) & ((hand_masks[hero] & hand_masks[villains]) == 0)
+            scores = (hero_values > villain_values) + 0.5 * (hero_values == villain_values)
+            wins[hand_class, others] += (scores * counted).sum(axis=1)
+            matchups[hand_class, others] += counted.sum(axis=1)
+
+    upper = np.triu_indices(STARTING_HAND_CLASSES, 1)
+    quantized = np.full((STARTING_HAND_CLASSES, STARTING_HAND_CLASSES), PREFLOP_EQUITY_SCALE // 2, dtype=np.uint16)
+    quantized[upper] = np.rint(wins[upper] / matchups[upper] * PREFLOP_EQUITY_SCALE)
+    quantized.T[upper] = PREFLOP_EQUITY_SCALE - quantized[upper]
+    return PreflopEquityTable(quantized, boards)
+
+def write_preflop_equity_table(table, path=PREFLOP_EQUITY_FILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(PREFLOP_EQUITY_HEADER.pack(PREFLOP_EQUITY_MAGIC, PREFLOP_EQUITY_VERSION, STARTING_HAND_CLASSES, table.boards))
+        file.write(np.ascontiguousarray(table.quantized, dtype="<u2").tobytes())
+    os.replace(temp_path, path)
+
+def load_preflop_equity_table(path=PREFLOP_EQUITY_FILE):
+    with open(path, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    table_size = STARTING_HAND_CLASSES * STARTING_HAND_CLASSES
+    if len(mapped) != PREFLOP_EQUITY_HEADER.size + 2 * table_size:
+        raise ValueError(f"{path} is the wrong size for a preflop equity table, build it again")
+    magic, version, hand_classes, boards = PREFLOP_EQUITY_HEADER.unpack_from(mapped)
+    if magic != PREFLOP_EQUITY_MAGIC or version != PREFLOP_EQUITY_VERSION or hand_classes != STARTING_HAND_CLASSES:
+        raise ValueError(f"{path} was built by another version, build it again")
+    quantized = np.frombuffer(mapped, dtype="<u2", count=table_size, offset=PREFLOP_EQUITY_HEADER.size)
+    return PreflopEquityTable(quantized.reshape(STARTING_HAND_CLASSES, STARTING_HAND_CLASSES), boards)
+
+# The table at path, loaded once per process, or None when it hasn't been built
+def preflop_equity_table(path=PREFLOP_EQUITY_FILE):
+    if path not in _PREFLOP_EQUITY_TABLES:
+        _PREFLOP_EQUITY_TABLES[path] = load_preflop_equity_table(path) if os.path.exists(path) else None
+    return _PREFLOP_EQUITY_TABLES[path]
+
+# A class against class equity sampled independently of the table: a random hand of each class on every board
+def sample_class_equity(hand_class, other_class, boards, rng):
+    hands, hand_classes = _starting_hands()
+    heroes, villains = hands[hand_classes == hand_class], hands[hand_classes == other_class]
+    scores = []
+    while sum(len(score) for score in scores) < boards:
+        hero = heroes[rng.integers(0, len(heroes), size=boards)]
+        villain = villains[rng.integers(0, len(villains), size=boards)]
+        board = rng.integers(0, 52, size=(boards, 5))
+        cards = np.hstack([hero, villain, board])
+        ordered = np.sort(cards, axis=1)
+        distinct = (ordered[:, 1:] != ordered[:, :-1]).all(axis=1)
+        hero_values = evaluate_many(np.hstack([hero, board])[distinct])
+        villain_values = evaluate_many(np.hstack([villain, board])[distinct])
+        scores.append((hero_values > villain_values) + 0.5 * (hero_values == villain_values))
+    return np.concatenate(scores)[:boards].mean()
+
+# Problems with the table at path: a bad header, matchups that don't add up to 1, and random matchups whose freshly
+# sampled equity is further from the stored one than sampling error explains. Returns (problems, matchups sampled)
+def verify_preflop_equity_table(path=PREFLOP_EQUITY_FILE, matchups=200, boards=10000, seed=1):
+    try:
+        table = load_preflop_equity_table(path)
+    except (OSError, ValueError) as error:
+        return [str(error)], 0
+    problems = []
+    quantized = table.quantized.astype(np.int64)
+    lopsided = np.argwhere(quantized + quantized.T != PREFLOP_EQUITY_SCALE)
+    for hand_class, other_class in lopsided[lopsided[:, 0] <= lopsided[:, 1]].tolist():
+        problems.append(f"{starting_hand_name(hand_class)} vs {starting_hand_name(other_class)} and back don't add up to 1")
+
+    rng = np.random.default_rng(seed)
+    for hand_class, other_class in rng.choice(STARTING_HAND_CLASSES, size=(matchups, 2)).tolist():
+        stored = int(quantized[hand_class, other_class]) / PREFLOP_EQUITY_SCALE
+        sampled = sample_class_equity(hand_class, other_class, boards, rng)
+        # a matchup gets counted on a bit over half the boards the table was built from
+        error = np.sqrt(max(stored * (1 - stored), 0.01) * (1 / boards + 2 / table.boards))
+        if abs(sampled - stored) > 4 * error:
+            problems.append(
+                f"{starting_hand_name(hand_class)} vs {starting_hand_name(other_class)}: "
+                f"table has {stored:.4f}, sampling {boards} boards gives {sampled:.4f}"
+            )
+    return problems, matchups
+
+
+### All-in equity
+# How much of the pot each player could expect at the moment the last money went in, for showdowns where somebody was
+# all in and every player still in had their cards shown. The board left to come is enumerated after the flop or turn
+# and sampled before it, every board gets ranked at once with evaluate_many, and each side pot is split between its
+# best eligible hands. Heads-up all-ins before the flop come from the preflop equity table instead when it's been
+# built. Winnings minus that expectation is luck, and real profit minus luck is the EV profit.
+
+EQUITY_SAMPLES = 10000 # boards sampled for all-ins before the flop, enumerating them all is ~1.7M boards a player
+MONEY_ACTIONS = (RoundAction.posts_small_blind, RoundAction.posts_big_blind, RoundAction.posts_straddle, RoundAction.bets, RoundAction.raises, RoundAction.calls)
+BOARD_CARDS_BY_STREET = [0, 3, 4, 5]
+
+# Chips each player put in the pot. Bets, raises and calls are the player's total for the street, and whatever the
+# biggest contributor put in over the next biggest was an uncalled bet that went back to them.
+def round_contributions(round):
+    contributions = {}
+    for street in range(len(round.street_starts)):
+        street_totals = {}
+        for action in round.street_actions(street):
+            if action.action_type in MONEY_ACTIONS:
+                street_totals[action.player] = max(street_totals.get(action.player, 0), action.amount)
+        for player, amount in street_totals.items():
+            contributions[player] = contributions.get(player, 0) + amount
+    if len(contributions) > 1:
+        (top_player, top_amount), (_, next_amount) = sorted(contributions.items(), key=lambda c: c[1], reverse=True)[:2]
+        contributions[top_player] = next_amount
+    return contributions
+
+# The main pot then each side pot as (amount, players still in who can win it)
+def pot_layers(contributions, live_players):
+    pots, previous_level = [], 0
+    for level in sorted({contributions[player] for player in live_players}):
+        amount = sum(min(contribution, level) - min(contribution, previous_level) for contribution in contributions.values())
+        eligible = [player for player in live_players if contributions[player] >= level]
+        if amount:
+            pots.append((amount, eligible))
+        previous_level = level
+    return pots
+
+# (street the money went in on, {player: hole card codes}, pots) for an all-in showdown we can replay, otherwise None
+def all_in_showdown(round):
+    board = getattr(round, "table_cards", None)
+    if board is None or len(board) != 5 or any("second run" in hand for hand in round.winning_hands):
+        return None
+    if not any(action.all_in for action in round.player_actions):
+        return None
+    folded = {action.player for action in round.player_actions if action.action_type == RoundAction.folds}
+    contributions = round_contributions(round)
+    live_players = [player for player in contributions if player not in folded]
+    if len(live_players) < 2 or not any(action.all_in for action in round.player_actions if action.player in live_players):
+        return None
+    hole_cards = {player: card_codes(round.player_to_hand.get(player, "")) for player in live_players}
+    if any(len(cards) != 2 for cards in hole_cards.values()):
+        return None # somebody still in never showed
+    if sum(contributions.values()) != sum(round.winning_amounts):
+        return None # dead blinds and the like, the pot can't be rebuilt from the actions
+    money_street = max(action.street for action in round.player_actions if action.action_type in MONEY_ACTIONS)
+    return money_street, hole_cards, pot_layers(contributions, live_players)
+
+# Every way (or samples random ways) the rest of the board can come, as an (n, cards to come) array
+def remaining_boards(dead_cards, cards_to_come, rng, samples=EQUITY_SAMPLES):
+    deck = np.array([card for card in range(52) if card not in set(dead_cards)], dtype=np.int64)
+    if cards_to_come <= 2:
+        return deck[np.array(list(combinations(range(len(deck)), cards_to_come)), dtype=np.int64).reshape(-1, cards_to_come)]
+    # drawing with replacement and dropping boards with a repeated card is a lot faster than shuffling the deck per
+    # board, and about 80% of 5 card draws from 48 survive
+    picks = np.empty((0, cards_to_come), dtype=np.int64)
+    while len(picks) < samples:
+        draws = rng.integers(0, len(deck), size=(2 * samples, cards_to_come))
+        ordered = np.sort(draws, axis=1)
+        picks = np.vstack([picks, draws[(ordered[:, 1:] != ordered[:, :-1]).all(axis=1)]])
+    return deck[picks[:samples]]
+
+# Each player's expected winnings from the pots, given the board cards known when the money went in. Heads-up before
+# the flop that's a lookup in preflop_table when there is one.
+def expected_winnings(hole_cards, known_board, pots, rng, preflop_table=None):
+    players = list(hole_cards)
+    if preflop_table is not None and not known_board and len(players) == 2:
+        equity = preflop_table.equity(hole_cards[players[0]], hole_cards[players[1]])
+        expected = dict.fromkeys(players, 0.0)
+        for amount, eligible in pots:
+            if len(eligible) == 1:
+                expected[eligible[0]] += amount # the part of a bet only one of them could cover
+            else:
+                expected[players[0]] += amount * equity
+                expected[players[1]] += amount * (1 - equity)
+        return expected
+    dead_cards = known_board + [card for cards in hole_cards.values() for card in cards]
+    boards = remaining_boards(dead_cards, 5 - len(known_board), rng)
+    boards = np.hstack([np.tile(np.array(known_board, dtype=np.int64), (len(boards), 1)), boards])
+    values = np.stack([evaluate_many(np.hstack([np.tile(hole_cards[player], (len(boards), 1)), boards])) for player in players], axis=1)
+
+    expected = dict.fromkeys(players, 0.0)
+    for amount, eligible in pots:
+        eligible_mask = np.array([player in eligible for player in players])
+        eligible_values = np.where(eligible_mask, values, -1)
+        winners = eligible_values == eligible_values.max(axis=1, keepdims=True)
+        shares = (winners / winners.sum(axis=1, keepdims=True)).mean(axis=0)
+        for player, share in zip(players, shares):
+            expected[player] += amount * share
+    return expected
+
+# Player to (chips won - chips expected) summed over a night's all-in showdowns, and how many showdowns that was
+def all_in_luck(rounds, preflop_table=None):
+    luck, showdowns = {}, 0
     for round in rounds:
-        for i in range(len(round.winning_players)):
-            if round.winning_hands == []:
-                continue # unknown winning hand
-            winning_player = round.winning_players[i]
-            hand = round.winning_hands[i]
-            hands_with_known_win += 1
-            prefix, _ = hand.split("(combination:")# i.e. Pair, K's
-            hand_type = prefix.split(",")[0] # i.e. Pair
-            if "High" in hand_type: # "A's High" -> "High Card"
-                hand_type = "High Card"
-            player_to_hand_type_to_wins[winning_player][hand_type] += 1
+        showdown = all_in_showdown(round)
+        if showdown is None:
+            continue
+        money_street, hole_cards, pots = showdown
+        known_board = card_codes(round.table_cards[:BOARD_CARDS_BY_STREET[money_street]])
+        if len(known_board) == 5:
+            continue # nothing left to come, no luck involved
+        rng = np.random.default_rng(round.start_order) # the same sampled boards every run
+        expected = expected_winnings(hole_cards, known_board, pots, rng, preflop_table)
+        won = Counter()
+        for player, amount in zip(round.winning_players, round.winning_amounts):
+            won[player] += amount
+        for player, expected_amount in expected.items():
+            luck[player] = luck.get(player, 0.0) + won[player] - expected_amount
+        showdowns += 1
+    return luck, showdowns
+
+def _night_luck(csv_file, use_cache=True):
+    night = load_night(csv_file, use_cache)
+    luck, showdowns = all_in_luck(night.rounds, preflop_equity_table())
+    final_profits = {player: profit for player, (profit, _) in night.stack_matrix.final_profits().items()}
+    return final_profits, luck, showdowns
+
+# (player to real profit, player to luck, all-in showdowns) added up over the nights, parsed in jobs processes
+def luck_for_nights(csv_files, use_cache=True, jobs=1):
+    profits, luck, showdowns = Counter(), Counter(), 0
+    if jobs <= 1 or len(csv_files) <= 1:
+        results = (_night_luck(csv_file, use_cache) for csv_file in csv_files)
+    else:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        results = executor.map(_night_luck, csv_files, repeat(use_cache), chunksize=max(1, len(csv_files) // (jobs * 4)))
+    try:
+        for night_profits, night_luck, night_showdowns in results:
+            profits.update(night_profits)
+            luck.update(night_luck)
+            showdowns += night_showdowns
+    finally:
+        if jobs > 1 and len(csv_files) > 1:
+            executor.shutdown()
+    return dict(profits), dict(luck), showdowns
+
+def print_ev_profits(title, profits, luck, showdowns):
+    print(f"=== Luck-adjusted profit, {title} ===")
+    print(f"From {showdowns} all-in showdowns with the cards shown")
+    for player, profit in sorted(profits.items(), key=lambda p: p[1] - luck.get(p[0], 0.0), reverse=True):
+        player_luck = luck.get(player, 0.0)
+        print(f" {player}: {profit / 100.0:.2f} (EV {(profit - player_luck) / 100.0:.2f}, luck {player_luck / 100.0:+.2f})")
+    print("=" * 20)
 
-    hand_display_sort_order = {"High Card": 0, "Pair": 1, "Two Pair": 2, "Three of a Kind": 3, "Straight": 4, "Flush": 5, "Full House": 6, "Four of a Kind": 7, "Straight Flush": 8, "Royal Flush": 9}
-    for player, winning_hands_counts in player_to_hand_type_to_wins.items():
-        sorted_winning_hands_counts = sorted(winning_hands_counts.items(), key=lambda i:hand_display_sort_order[i[0].rstrip()])
-        print(f'{player}:')
-        for hand, count in sorted_winning_hands_counts:
-            print(f'  {hand}: {count}/{hands_with_known_win} ({count / hands_with_known_win * 100.0:.2f}%)')
 
-    return player_to_hand_type_to_wins, hands_with_known_win
+### Core stats
+# Everything print_core_stats shows, accumulated in a single pass over the rounds. Partials for separate nights merge
+# into exactly what one pass over all of their rounds gives (dict orders and ties included), so --all just combines
+# the per-night partials kept in the parsed night cache. Only builtins are kept so a partial pickles anywhere.
 
+def _round_summary(round):
+    return {
+        "winning_players": round.winning_players,
+        "winning_amounts": round.winning_amounts,
+        "start_time": round.start_time,
+        "table_cards": getattr(round, "table_cards", None), # the pot can be won before the flop
+        "winning_hands": round.winning_hands,
+        "player_to_hand": round.player_to_hand,
+    }
 
+def _add_counts(counts, other_counts):
+    for player, count in other_counts.items():
+        counts[player] = counts.get(player, 0) + count
+
+class CoreStats():
+    def __init__(self):
+        self.rounds_played = {} # player to rounds they had a stack at the start of
+        self.wins = {} # player to pots collected
+        self.biggest_win = None # {"amount", "round"}
+        self.gentleman_scores = {} # player to hidden hands shown after winning
+        self.biggest_raises = [None for _ in STREETS] # per street {"amount", "player", "action", "time", "description", "round"}
+        self.folds = [{} for _ in STREETS] # per street, player to folds
+        self.all_ins = [{} for _ in STREETS] # per street, player to [all-ins, all-ins in rounds they won]
+        self.hand_type_wins = {} # player to hand type to shown wins
+        self.hands_with_known_win = 0
+
+    @classmethod
+    def from_state(cls, state):
+        core_stats = cls.__new__(cls)
+        core_stats.__dict__.update(state)
+        return core_stats
+
+    def state(self):
+        return dict(vars(self))
+
+    def add_round(self, round):
+        for player in round.player_balances: # they only have a balance if they're in the start of that round
+            self.rounds_played[player] = self.rounds_played.get(player, 0) + 1
 
-def print_core_stats(rounds):
-    num_rounds_with_player = rounds_played_by_players(rounds)
-    most_wins_player, winning_rounds, all_player_wins = most_wins(rounds)
-
-    all_player_wins_list = list(all_player_wins.items())
-    all_player_wins_list.sort(key=lambda w: len(w[1]), reverse=True)
-    print("\n------- Winning Hands of Hands Played")
-    print(f'{most_wins_player} won the most rounds at {len(winning_rounds)} rounds out of {num_rounds_with_player[most_wins_player]} played rounds ({len(winning_rounds)/num_rounds_with_player[most_wins_player] * 100:.2f}%).\n')
-    for player, rounds_won in all_player_wins_list:
-        print(f'{player} won {len(rounds_won)}/{num_rounds_with_player[player]} ({len(rounds_won)/num_rounds_with_player[player] * 100:.2f}%)')
-
-    biggest_win_round = biggest_win(rounds)
-    print("\n------- Biggest Winning Hand")
-    print(f'{", ".join(biggest_win_round.winning_players)} won the most at {biggest_win_round.winning_amounts} on {biggest_win_round.start_time}.\nTable cards: {biggest_win_round.table_cards}.\nWinning hands: {", ".join(biggest_win_round.winning_hands)}.\nAll player\'s cards: {biggest_win_round.player_to_hand}')
-
-    gent_scores_by_player_dict = gentleman_scores_by_player(rounds)
-    gent_scores_by_player = list(gent_scores_by_player_dict.items())
-    gent_scores_by_player.sort(key=lambda p: p[1], reverse=True)
-
-    print("\n------- Gentleman Scores (Showing Hidden Hand After Win)")
-    formatted = "\n".join("{: >10} {: >5} ({:,.2f}%)".format(player, gent_score, gent_score / len(all_player_wins[player]) * 100.0) for player, gent_score in gent_scores_by_player)
-    print(formatted)
-
-    all_pre_flop_actions = reduce(lambda acc_actions, round: acc_actions + round.pre_flop_actions(), rounds, [])
-    all_pre_turn_actions = reduce(lambda acc_actions, round: acc_actions + round.pre_turn_actions(), rounds, [])
-    all_pre_river_actions = reduce(lambda acc_actions, round: acc_actions + round.pre_river_actions(), rounds, [])
-    all_post_river_actions = reduce(lambda acc_actions, round: acc_actions + round.post_river_actions(), rounds, [])
-
-    biggest_raise_pre_flop = largest_raise_or_bet_for_round_actions(all_pre_flop_actions)
-    biggest_raise_pre_turn = largest_raise_or_bet_for_round_actions(all_pre_turn_actions)
-    biggest_raise_pre_river = largest_raise_or_bet_for_round_actions(all_pre_river_actions)
-    biggest_raise_post_river = largest_raise_or_bet_for_round_actions(all_post_river_actions)
-
-    print("\n------- Biggest Raises/Bets")
-    # if biggest_raise_pre_flop:
-    #     print("--- Pre-flop")
-    #     print(f'{biggest_raise_pre_flop.to_string()}')
-    #     round = poker_round_for_timestamp(rounds, biggest_raise_pre_flop.time)
-    #     print(f'  {", ".join(round.winning_players)} won {round.winning_amounts} this round\n  Table cards: {round.table_cards}\n  Winning hands: {", ".join(round.winning_hands)}\n  All player\'s cards: {round.player_to_hand}')
-    if biggest_raise_pre_turn:
-        print("--- Pre-turn")
-        print(f'{biggest_raise_pre_turn.to_string()}')
-        round = poker_round_for_timestamp(rounds, biggest_raise_pre_turn.time)
-        print(f'  {", ".join(round.winning_players)} won {round.winning_amounts} this round\n  Table cards: {round.table_cards}\n  Winning hands: {", ".join(round.winning_hands)}\n  All player\'s cards: {round.player_to_hand}')
-    if biggest_raise_pre_river:
-        print("--- Pre-river")
-        print(f'{biggest_raise_pre_river.to_string()}')
-        round = poker_round_for_timestamp(rounds, biggest_raise_pre_river.time)
-        print(f'  {", ".join(round.winning_players)} won {round.winning_amounts} this round\n  Table cards: {round.table_cards}\n  Winning hands: {", ".join(round.winning_hands)}\n  All player\'s cards: {round.player_to_hand}')
-    if biggest_raise_post_river:
-        print("--- Post-river")
-        print(f'{biggest_raise_post_river.to_string()}')
-        round = poker_round_for_timestamp(rounds, biggest_raise_post_river.time)
-        print(f'  {", ".join(round.winning_players)} won {round.winning_amounts} this round\n  Table cards: {round.table_cards}\n  Winning hands: {", ".join(round.winning_hands)}\n  All player\'s cards: {round.player_to_hand}')
-
-    player_pre_flop_folds = list(number_of_folds_per_player(all_pre_flop_actions).items())
-    player_pre_flop_folds.sort(key=lambda w: w[1], reverse=True)
-
-    player_pre_turn_folds = list(number_of_folds_per_player(all_pre_turn_actions).items())
-    player_pre_turn_folds.sort(key=lambda w: w[1], reverse=True)
-
-    player_pre_river_folds = list(number_of_folds_per_player(all_pre_river_actions).items())
-    player_pre_river_folds.sort(key=lambda w: w[1], reverse=True)
-
-    player_post_river_folds = list(number_of_folds_per_player(all_post_river_actions).items())
-    player_post_river_folds.sort(key=lambda w: w[1], reverse=True)
-
-    print("\n------- Folds Per Player of Hands Played")
-    print("--- Pre-flop")
-    formatted = "\n".join("{: >10} {: >10} ({:,.2f}%)".format(player, fold_count, fold_count / num_rounds_with_player[player] * 100.0) for player, fold_count in player_pre_flop_folds)
-    print(formatted)
-    print("--- Pre-turn")
-    formatted = "\n".join("{: >10} {: >10} ({:,.2f}%)".format(player, fold_count, fold_count / num_rounds_with_player[player] * 100.0) for player, fold_count in player_pre_turn_folds)
-    print(formatted)
-    print("--- Pre-river")
-    formatted = "\n".join("{: >10} {: >10} ({:,.2f}%)".format(player, fold_count, fold_count / num_rounds_with_player[player] * 100.0) for player, fold_count in player_pre_river_folds)
-    print(formatted)
-    print("--- Post-river")
-    formatted = "\n".join("{: >10} {: >10} ({:,.2f}%)".format(player, fold_count, fold_count / num_rounds_with_player[player] * 100.0) for player, fold_count in player_post_river_folds)
-    print(formatted)
-
-    player_pre_flop_all_ins_dict = all_ins_per_player(all_pre_flop_actions)
-    player_pre_flop_all_ins = list(player_pre_flop_all_ins_dict.items())
-    player_pre_flop_all_ins.sort(key=lambda w: len(w[1]), reverse=True)
-    player_wins_for_pre_flop_all_ins = player_wins_for_round_actions(rounds, player_pre_flop_all_ins_dict)
-
-    player_pre_turn_all_ins_dict = all_ins_per_player(all_pre_turn_actions)
-    player_pre_turn_all_ins = list(player_pre_turn_all_ins_dict.items())
-    player_pre_turn_all_ins.sort(key=lambda w: len(w[1]), reverse=True)
-    player_wins_for_pre_turn_all_ins = player_wins_for_round_actions(rounds, player_pre_turn_all_ins_dict)
-
-    player_pre_river_all_ins_dict = all_ins_per_player(all_pre_river_actions)
-    player_pre_river_all_ins = list(player_pre_river_all_ins_dict.items())
-    player_pre_river_all_ins.sort(key=lambda w: len(w[1]), reverse=True)
-    player_wins_for_pre_river_all_ins = player_wins_for_round_actions(rounds, player_pre_river_all_ins_dict)
-
-    player_post_river_all_ins_dict = all_ins_per_player(all_post_river_actions)
-    player_post_river_all_ins = list(player_post_river_all_ins_dict.items())
-    player_post_river_all_ins.sort(key=lambda w: len(w[1]), reverse=True)
-    player_wins_for_post_river_all_ins = player_wins_for_round_actions(rounds, player_post_river_all_ins_dict)
-
-    print("\n------- All-ins Per Player of Hands Played")
-    if player_pre_flop_all_ins:
-        print("--- Pre-flop")
-        formatted = "\n".join("{: >10} {: >10} {:,.2f}% (Won {:,.2f}%)".format(player, len(all_ins), len(all_ins) / num_rounds_with_player[player] * 100.0, len(player_wins_for_pre_flop_all_ins[player]) / len(all_ins) * 100.0) for player, all_ins in player_pre_flop_all_ins)
-        print(formatted)
-    if player_pre_turn_all_ins:
-        print("--- Pre-turn")
-        formatted = "\n".join("{: >10} {: >10} {:,.2f}% (Won {:,.2f}%)".format(player, len(all_ins), len(all_ins) / num_rounds_with_player[player] * 100.0, len(player_wins_for_pre_turn_all_ins[player]) / len(all_ins) * 100.0) for player, all_ins in player_pre_turn_all_ins)
-        print(formatted)
+        for player in round.winning_players:
+            self.wins[player] = self.wins.get(player, 0) + 1
+        for amount in round.winning_amounts:
+            if amount > (self.biggest_win["amount"] if self.biggest_win else 0):
+                self.biggest_win = {"amount": amount, "round": _round_summary(round)}
 
-    if player_pre_river_all_ins:
-        print("--- Pre-river")
-        formatted = "\n".join("{: >10} {: >10} {:,.2f}% (Won {:,.2f}%)".format(player, len(all_ins), len(all_ins) / num_rounds_with_player[player] * 100.0, len(player_wins_for_pre_river_all_ins[player]) / len(all_ins) * 100.0) for player, all_ins in player_pre_river_all_ins)
-        print(formatted)
+        if round.winning_hands == []:
+            for winning_player in round.winning_players:
+                if winning_player in round.player_to_hand: # if we know what their hand is
+                    self.gentleman_scores[winning_player] = self.gentleman_scores.get(winning_player, 0) + 1
+        else:
+            for winning_player, hand in zip(round.winning_players, round.winning_hands):
+                self.hands_with_known_win += 1
+                hand_type = logged_hand_type(hand)
+                hand_types = self.hand_type_wins.setdefault(winning_player, {})
+                hand_types[hand_type] = hand_types.get(hand_type, 0) + 1
+
+        for action in round.player_actions:
+            street = action.street
+            if action.action_type in (RoundAction.raises, RoundAction.bets):
+                biggest_raise = self.biggest_raises[street]
+                if biggest_raise is None or action.amount > biggest_raise["amount"]:
+                    self.biggest_raises[street] = {
+                        "amount": action.amount,
+                        "player": action.player,
+                        "action": action.action_type.value,
+                        "time": action.time,
+                        "description": action.to_string(),
+                        "round": _round_summary(round),
+                    }
+            elif action.action_type == RoundAction.folds:
+                self.folds[street][action.player] = self.folds[street].get(action.player, 0) + 1
+            if action.all_in:
+                all_ins = self.all_ins[street].setdefault(action.player, [0, 0])
+                all_ins[0] += 1
+                if action.player in round.winning_players:
+                    all_ins[1] += 1
+
+    # adds the stats of rounds played after the ones already in here
+    def merge(self, other):
+        _add_counts(self.rounds_played, other.rounds_played)
+        _add_counts(self.wins, other.wins)
+        if other.biggest_win and other.biggest_win["amount"] > (self.biggest_win["amount"] if self.biggest_win else 0):
+            self.biggest_win = other.biggest_win
+        _add_counts(self.gentleman_scores, other.gentleman_scores)
+        for street in range(len(STREETS)):
+            biggest_raise, other_biggest_raise = self.biggest_raises[street], other.biggest_raises[street]
+            if other_biggest_raise and (biggest_raise is None or other_biggest_raise["amount"] > biggest_raise["amount"]):
+                self.biggest_raises[street] = other_biggest_raise
+            _add_counts(self.folds[street], other.folds[street])
+            for player, (count, won) in other.all_ins[street].items():
+                all_ins = self.all_ins[street].setdefault(player, [0, 0])
+                all_ins[0] += count
+                all_ins[1] += won
+        for player, hand_types in other.hand_type_wins.items():
+            _add_counts(self.hand_type_wins.setdefault(player, {}), hand_types)
+        self.hands_with_known_win += other.hands_with_known_win
+        return self
+
+    # The stats as plain data, with the lists in the order they're printed in
+    def results(self):
+        rounds_played = self.rounds_played
+        wins = [
+            {"player": player, "wins": count, "rounds_played": rounds_played[player], "percent": count / rounds_played[player] * 100}
+            for player, count in sorted(self.wins.items(), key=lambda w: w[1], reverse=True)
+        ]
+        streets = []
+        for street, street_name in enumerate(STREETS):
+            streets.append({
+                "street": street_name,
+                "biggest_raise": self.biggest_raises[street],
+                "folds": [
+                    {"player": player, "folds": count, "rounds_played": rounds_played[player], "percent": count / rounds_played[player] * 100.0}
+                    for player, count in sorted(self.folds[street].items(), key=lambda w: w[1], reverse=True)
+                ],
+                "all_ins": [
+                    {
+                        "player": player, "all_ins": count, "rounds_played": rounds_played[player],
+                        "percent": count / rounds_played[player] * 100.0, "won": won, "won_percent": won / count * 100.0,
+                    }
+                    for player, (count, won) in sorted(self.all_ins[street].items(), key=lambda w: w[1][0], reverse=True)
+                ],
+            })
+        hand_display_sort_order = {"High Card": 0, "Pair": 1, "Two Pair": 2, "Three of a Kind": 3, "Straight": 4, "Flush": 5, "Full House": 6, "Four of a Kind": 7, "Straight Flush": 8, "Royal Flush": 9}
+        return {
+            "most_wins": wins[0] if wins else None, # None (and no biggest_win) until a pot has been won
+            "wins": wins,
+            "biggest_win": dict(self.biggest_win["round"], amount=self.biggest_win["amount"]) if self.biggest_win else None,
+            "gentleman_scores": [
+                {"player": player, "score": score, "wins": self.wins[player], "percent": score / self.wins[player] * 100.0}
+                for player, score in sorted(self.gentleman_scores.items(), key=lambda p: p[1], reverse=True)
+            ],
+            "streets": streets,
+            "winning_hand_types": {
+                "hands_with_known_win": self.hands_with_known_win,
+                "players": [
+                    {
+                        "player": player,
+                        "hand_types": [
+                            {"hand_type": hand, "wins": count, "percent": count / self.hands_with_known_win * 100.0}
+                            for hand, count in sorted(hand_types.items(), key=lambda i: hand_display_sort_order[i[0].rstrip()])
+                        ],
+                    }
+                    for player, hand_types in self.hand_type_wins.items()
+                ],
+            },
+        }
 
-    if player_post_river_all_ins:
-        print("--- Post-river")
-        formatted = "\n".join("{: >10} {: >10} {:,.2f}% (Won {:,.2f}%)".format(player, len(all_ins), len(all_ins) / num_rounds_with_player[player] * 100.0, len(player_wins_for_post_river_all_ins[player]) / len(all_ins) * 100.0) for player, all_ins in player_post_river_all_ins)
+    def print_stats(self):
+        results = self.results()
+        most_wins = results["most_wins"]
+        print("\n------- Winning Hands of Hands Played")
+        if most_wins: # no pot has been won yet at the very start of a night
+            print(f'{most_wins["player"]} won the most rounds at {most_wins["wins"]} rounds out of {most_wins["rounds_played"]} played rounds ({most_wins["percent"]:.2f}%).\n')
+        for entry in results["wins"]:
+            print(f'{entry["player"]} won {entry["wins"]}/{entry["rounds_played"]} ({entry["percent"]:.2f}%)')
+
+        biggest_win = results["biggest_win"]
+        print("\n------- Biggest Winning Hand")
+        if biggest_win:
+            print(f'{", ".join(biggest_win["winning_players"])} won the most at {biggest_win["winning_amounts"]} on {biggest_win["start_time"]}.\nTable cards: {biggest_win["table_cards"]}.\nWinning hands: {", ".join(biggest_win["winning_hands"])}.\nAll player\'s cards: {biggest_win["player_to_hand"]}')
+
+        print("\n------- Gentleman Scores (Showing Hidden Hand After Win)")
+        formatted = "\n".join("{: >10} {: >5} ({:,.2f}%)".format(entry["player"], entry["score"], entry["percent"]) for entry in results["gentleman_scores"])
         print(formatted)
 
-    print("\n------- Winning Hand Breakdown By Player")
-    winning_hand_types_by_player(rounds)
+        streets = results["streets"]
+        print("\n------- Biggest Raises/Bets")
+        for street in streets[PRE_TURN:]: # pre-flop raises aren't that interesting
+            biggest_raise = street["biggest_raise"]
+            if biggest_raise:
+                round = biggest_raise["round"]
+                print(f'--- {street["street"]}')
+                print(biggest_raise["description"])
+                print(f'  {", ".join(round["winning_players"])} won {round["winning_amounts"]} this round\n  Table cards: {round["table_cards"]}\n  Winning hands: {", ".join(round["winning_hands"])}\n  All player\'s cards: {round["player_to_hand"]}')
+
+        print("\n------- Folds Per Player of Hands Played")
+        for street in streets:
+            print(f'--- {street["street"]}')
+            formatted = "\n".join("{: >10} {: >10} ({:,.2f}%)".format(entry["player"], entry["folds"], entry["percent"]) for entry in street["folds"])
+            print(formatted)
+
+        print("\n------- All-ins Per Player of Hands Played")
+        for street in streets:
+            if street["all_ins"]:
+                print(f'--- {street["street"]}')
+                formatted = "\n".join("{: >10} {: >10} {:,.2f}% (Won {:,.2f}%)".format(entry["player"], entry["all_ins"], entry["percent"], entry["won_percent"]) for entry in street["all_ins"])
+                print(formatted)
+
+        print("\n------- Winning Hand Breakdown By Player")
+        hands_with_known_win = results["winning_hand_types"]["hands_with_known_win"]
+        for player_hand_types in results["winning_hand_types"]["players"]:
+            print(f'{player_hand_types["player"]}:')
+            for entry in player_hand_types["hand_types"]:
+                print(f'  {entry["hand_type"]}: {entry["wins"]}/{hands_with_known_win} ({entry["percent"]:.2f}%)')
+
+def core_stats_for_rounds(rounds):
+    core_stats = CoreStats()
+    for round in rounds:
+        core_stats.add_round(round)
+    return core_stats
+
+def print_core_stats(rounds):
+    core_stats_for_rounds(rounds).print_stats()
+
+CORE_STATS_CSV_FIELDS = ["section", "street", "player", "label", "value", "out_of", "percent"]
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+# One row per number in the results, so the csv loads straight into a spreadsheet or dataframe
+def core_stats_csv_rows(results):
+    if biggest_win := results["biggest_win"]:
+        yield {"section": "biggest_win", "player": ", ".join(biggest_win["winning_players"]), "label": biggest_win["start_time"].isoformat(), "value": biggest_win["amount"]}
+    for entry in results["wins"]:
+        yield {"section": "wins", "player": entry["player"], "value": entry["wins"], "out_of": entry["rounds_played"], "percent": entry["percent"]}
+    for entry in results["gentleman_scores"]:
+        yield {"section": "gentleman_score", "player": entry["player"], "value": entry["score"], "out_of": entry["wins"], "percent": entry["percent"]}
+    for street in results["streets"]:
+        if biggest_raise := street["biggest_raise"]:
+            yield {"section": "biggest_raise", "street": street["street"], "player": biggest_raise["player"], "label": biggest_raise["action"], "value": biggest_raise["amount"]}
+        for entry in street["folds"]:
+            yield {"section": "folds", "street": street["street"], "player": entry["player"], "value": entry["folds"], "out_of": entry["rounds_played"], "percent": entry["percent"]}
+        for entry in street["all_ins"]:
+            yield {"section": "all_ins", "street": street["street"], "player": entry["player"], "value": entry["all_ins"], "out_of": entry["rounds_played"], "percent": entry["percent"]}
+            yield {"section": "all_ins_won", "street": street["street"], "player": entry["player"], "value": entry["won"], "out_of": entry["all_ins"], "percent": entry["won_percent"]}
+    hands_with_known_win = results["winning_hand_types"]["hands_with_known_win"]
+    for player_hand_types in results["winning_hand_types"]["players"]:
+        for entry in player_hand_types["hand_types"]:
+            yield {"section": "winning_hand_type", "player": player_hand_types["player"], "label": entry["hand_type"], "value": entry["wins"], "out_of": hands_with_known_win, "percent": entry["percent"]}
+
+# Writes the stats as text, json or csv. The json and csv documents go out in a single write.
+def write_core_stats(core_stats, output_format="text", file=None):
+    file = file or sys.stdout
+    if output_format == "text":
+        with redirect_stdout(file):
+            core_stats.print_stats()
+    elif output_format == "json":
+        file.write(json.dumps(core_stats.results(), default=_json_default, ensure_ascii=False, indent=1) + "\n")
+    elif output_format == "csv":
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=CORE_STATS_CSV_FIELDS, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(core_stats_csv_rows(core_stats.results()))
+        file.write(output.getvalue())
+    else:
+        raise ValueError(f"Unknown stats format {output_format}")
+
+### Following a night in progress
+# --follow keeps re-reading a csv export that's still growing. Exports are newest row first, so each read stops at
+# the first row it has already seen, and only the new rows get their names fixed up and parsed. A hand only goes
+# into the stack history and stats once the next hand starts (movements between hands belong to the hand before),
+# so each update costs the new hands only. The graph is redrawn at most every graph_seconds.
+
+FOLLOW_POLL_SECONDS = 2.0
+FOLLOW_GRAPH_SECONDS = 30.0
+
+class NightFollower():
+    def __init__(self, csv_file):
+        self.csv_file = csv_file
+        self.last_order = None # newest row parsed so far
+        self.open_round = [] # events of the hand still being played (or from before the first hand)
+        self.stack_history = StackHistory()
+        self.core_stats = CoreStats()
+        self.last_round_number = None
+
+    # The rows newer than last_order, newest first like the csv
+    def read_new_rows(self):
+        new_rows, row_lines = [], []
+        with open(self.csv_file) as file:
+            for line in file:
+                if line == "entry,at,order\n":
+                    continue
+                row_lines.append(line)
+                order = _row_order(line)
+                if order is None:
+                    continue # multi line rows only have their order on their last line
+                if self.last_order is not None and order <= self.last_order:
+                    row_lines = []
+                    break
+                new_rows += row_lines
+                row_lines = []
+        new_rows += row_lines
+        newest_order = next((order for order in map(_row_order, new_rows) if order is not None), None)
+        if newest_order is not None:
+            self.last_order = newest_order
+        return new_rows
+
+    def _close_round(self):
+        if type(self.open_round[0]) is HandStart:
+            poker_round = PokerRound(self.open_round)
+            if hasattr(poker_round, "start_order"): # stopped before the hand's stacks were logged, nothing to count yet
+                self.stack_history.on_round(poker_round)
+                self.core_stats.add_round(poker_round)
+                self.last_round_number = poker_round.round_number
+        self.open_round = []
+
+    # Parses the new rows and returns how many hands were completed by them
+    def update(self):
+        new_rows = self.read_new_rows()
+        new_rows.reverse()
+        completed_rounds = 0
+        for event in parse_events(fix_up_player_names(new_rows)):
+            if type(event) is HandStart and self.open_round:
+                completed_rounds += type(self.open_round[0]) is HandStart
+                self._close_round()
+            self.open_round.append(event)
+        return completed_rounds
+
+    # Counts the hand still open too, like a full parse of the export would
+    def finish(self):
+        if self.open_round:
+            self._close_round()
+        return self.stack_history.finish()
+
+def standings(profits):
+    profits = sorted(((profit, player) for player, profit in profits.items()), reverse=True)
+    return ", ".join("{}: ${:.2f}".format(player, profit / 100.00) for profit, player in profits)
+
+def follow_night(csv_file, poll_seconds=FOLLOW_POLL_SECONDS, graph_seconds=FOLLOW_GRAPH_SECONDS, graph=True, sleep=time.sleep):
+    follower = NightFollower(csv_file)
+    title = "Profit for " + date_of_csv(csv_file).strftime("%Y/%m/%d")
+    last_modified, last_graph, graph_stale = None, None, False
+    print(f"Following {csv_file}, press Ctrl-C to stop")
+    try:
+        while True:
+            try:
+                modified = os.stat(csv_file).st_mtime_ns
+            except FileNotFoundError:
+                modified = last_modified # in the middle of being exported again
+            if modified != last_modified:
+                last_modified = modified
+                if follower.update():
+                    print(f"After hand #{follower.last_round_number}: {standings(follower.stack_history.profits)}")
+                    graph_stale = True
+            if graph and graph_stale and (last_graph is None or time.monotonic() - last_graph >= graph_seconds):
+                graph_stack_history(follower.stack_history.finish(), title, csv_file)
+                last_graph, graph_stale = time.monotonic(), False
+            sleep(poll_seconds)
+    except KeyboardInterrupt:
+        pass
+
+    stack_matrix = follower.finish()
+    print()
+    write_core_stats(follower.core_stats)
+    print_splitwise_instructions(stack_matrix.player_history())
+    if graph:
+        graph_stack_history(stack_matrix, title, csv_file)
+    return stack_matrix
+
+### Profiling
+# --profile parses the nights from scratch phase by phase and reports where the time went. While it runs, every
+# compiled pattern global is swapped for a ProfiledPattern that counts and times its calls; the parser looks the
+# patterns up as globals on each call, so without the flag nothing is wrapped and nothing is counted.
+
+PROFILE_CARD_REGEX = re.compile("(?:10|[2-9JQKA])[♠♥♦♣]")
+PROFILE_PLAYER_REGEX = re.compile('""[^"]+? @ [^"]+""')
+
+class ProfiledPattern():
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.calls = 0
+        self.hits = 0
+        self.seconds = 0.0
+
+    def _timed(self, method, row):
+        start = time.perf_counter()
+        result = method(row)
+        self.seconds += time.perf_counter() - start
+        self.calls += 1
+        if result:
+            self.hits += 1
+        return result
+
+    def match(self, row):
+        return self._timed(self.pattern.match, row)
+
+    def findall(self, row):
+        return self._timed(self.pattern.findall, row)
+
+# What a line that matched nothing looks like with its players, cards and numbers blanked out
+def unmatched_line_shape(row):
+    entry = row.rsplit(",", 2)[0].strip()
+    entry = entry[1:] if entry.startswith('"') else entry # multi line rows only have one of their quotes per line
+    entry = entry[:-1] if entry.endswith('"') else entry
+    entry = PROFILE_PLAYER_REGEX.sub("<player>", entry)
+    entry = PROFILE_CARD_REGEX.sub("<card>", entry)
+    return re.sub(r"\d+", "N", entry)
+
+class Profiler():
+    def __init__(self):
+        self.phase_seconds = defaultdict(float)
+        self.file_seconds = {}
+        self.file_rows = {}
+        self.patterns = {}
+        self.unmatched = Counter()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_seconds[name] += time.perf_counter() - start
+
+    @contextmanager
+    def patterns_installed(self):
+        module_globals = globals()
+        originals = {
+            name: value for name, value in module_globals.items()
+            if name.endswith("_REGEX") and not name.startswith("PROFILE_") and isinstance(value, re.Pattern)
+        }
+        for name, pattern in originals.items():
+            self.patterns[name] = module_globals[name] = ProfiledPattern(pattern)
+        try:
+            yield
+        finally:
+            module_globals.update(originals)
+
+    def count_unmatched(self, events):
+        for event in events:
+            if type(event) is Unrecognized:
+                self.unmatched[unmatched_line_shape(event.row)] += 1
+
+    def print_report(self, file=None, top=20):
+        file = file or sys.stderr
+        print("\nProfile", file=file)
+        print("  Phases:", file=file)
+        for name, seconds in self.phase_seconds.items():
+            print(f"    {name: <28} {seconds:8.3f} s", file=file)
+        print(f"  Files (slowest {min(top, len(self.file_seconds))} of {len(self.file_seconds)}):", file=file)
+        for csv_file, seconds in sorted(self.file_seconds.items(), key=lambda item: item[1], reverse=True)[:top]:
+            print(f"    {csv_file: <40} {seconds:8.3f} s {self.file_rows[csv_file]:8} rows", file=file)
+        print("  Patterns:", file=file)
+        print(f"    {'pattern': <34} {'calls': >9} {'hits': >9} {'seconds': >9}", file=file)
+        for name, pattern in sorted(self.patterns.items(), key=lambda item: item[1].seconds, reverse=True):
+            print(f"    {name: <34} {pattern.calls:9} {pattern.hits:9} {pattern.seconds:9.3f}", file=file)
+        print(f"  Unmatched lines ({sum(self.unmatched.values())} lines, {len(self.unmatched)} shapes):", file=file)
+        for shape, count in self.unmatched.most_common(top):
+            print(f"    {count:8}  {shape}", file=file)
+
+# Runs the same parse, stats and graph steps as main, but timed phase by phase and without the cache
+def run_profiled(csv_paths, title, all_time=False, output_format="text", profiler=None, graph=True):
+    profiler = profiler or Profiler()
+    core_stats = CoreStats()
+    histories = []
+    with profiler.patterns_installed():
+        for csv_path in csv_paths:
+            start = time.perf_counter()
+            with profiler.phase("read_csv"):
+                with open(csv_path) as file:
+                    lines = file.readlines()
+            with profiler.phase("fix_up_player_names"):
+                logs = fix_up_player_names(lines)
+            if logs and logs[0] == "entry,at,order\n":
+                logs.pop(0) # drop csv header
+            logs.reverse()
+            with profiler.phase("parse_events"):
+                events = list(parse_events(logs))
+            with profiler.phase("rounds_and_stack_history"):
+                stack_matrix, rounds = fan_out(events, [StackHistory(), RoundCollector()])
+            with profiler.phase("core_stats"):
+                core_stats.merge(core_stats_for_rounds(rounds))
+            profiler.file_seconds[csv_path] = time.perf_counter() - start
+            profiler.file_rows[csv_path] = len(logs)
+            profiler.count_unmatched(events)
+            histories.append(stack_matrix)
+
+    with profiler.phase("write_stats"):
+        write_core_stats(core_stats, output_format)
+    if output_format == "text" and graph:
+        with profiler.phase("graph"):
+            if all_time:
+                all_time_matrix = merge_all_time_history(history.final_profits() for history in histories)
+                graph_stack_history(all_time_matrix, title, csv_paths[-1], show_event_points=True)
+            else:
+                graph_stack_history(histories[0], title, csv_paths[0])
+    if output_format == "text" and not all_time:
+        with profiler.phase("splitwise_instructions"):
+            print_splitwise_instructions(histories[0].player_history())
+    profiler.print_report()
+    return profiler
 
 ### Main execution
 
@@ -947,85 +3063,263 @@ def main():
         action="store_true",
         help="append this single game night as an expense in Splitwise",
     )
+    parser.add_argument(
+        "--splitwise-backfill",
+        nargs=2,
+        metavar=("FROM", "TO"),
+        help="post every game night from FROM to TO (YYYYMMDD, inclusive) that isn't in Splitwise yet and exit",
+    )
+    parser.add_argument(
+        "--splitwise-refresh",
+        action="store_true",
+        help=f"look the Splitwise group and members up again instead of using {SPLITWISE_METADATA_FILE}",
+    )
+    parser.add_argument("--no-graph", action="store_true", help="skip drawing the profit graph (and loading matplotlib)")
+    parser.add_argument(
+        "--format",
+        choices=["text", "json", "csv"],
+        default="text",
+        help="how to write the stats, json and csv only write the stats (no graph or Splitwise step)",
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="parse the --all csvs in this many processes (0 uses every core)")
+    parser.add_argument("--no-cache", action="store_true", help=f"parse every csv from scratch instead of using {PARSED_NIGHT_CACHE_DIR}")
+    parser.add_argument("--cache-info", action="store_true", help="list the cached parsed nights and exit")
+    parser.add_argument("--cache-prune", action="store_true", help="remove cache entries for old parser versions, edited or removed csvs and exit")
+    parser.add_argument(
+        "--cache-invalidate",
+        nargs="*",
+        metavar="DATE",
+        help="drop the cached parse of the given nights (everything when no date is given) and exit",
+    )
+    parser.add_argument("--export-action-store", action="store_true", help=f"write every csv's actions, stacks and winnings to {ACTION_STORE_DIR} and exit")
+    parser.add_argument("--action-store-stats", action="store_true", help=f"print corpus-wide stats from {ACTION_STORE_DIR} and exit")
+    parser.add_argument(
+        "--regenerate-graphs",
+        action="store_true",
+        help=f"redraw the graphs/ pngs whose csv, parser or chart changed since {GRAPH_MANIFEST_FILE} and exit",
+    )
+    parser.add_argument(
+        "--check-showdowns",
+        action="store_true",
+        help="rank every shown hand in logs/ and report showdowns whose logged winners or hand types don't add up, then exit",
+    )
+    parser.add_argument(
+        "--ev",
+        action="store_true",
+        help="print each player's real and luck-adjusted profit from all-in showdown equities (the --date night or --all) and exit",
+    )
+    parser.add_argument(
+        "--preflop-table-build",
+        action="store_true",
+        help=f"work out every starting hand's heads-up equity against every other into {PREFLOP_EQUITY_FILE} (about a minute) and exit",
+    )
+    parser.add_argument(
+        "--preflop-table-verify",
+        action="store_true",
+        help=f"check {PREFLOP_EQUITY_FILE} adds up and matches freshly sampled matchups, then exit",
+    )
+    parser.add_argument("--follow", action="store_true", help="keep parsing the --date csv as it gets re-exported during the night")
+    parser.add_argument(
+        "--graph-seconds",
+        type=float,
+        default=FOLLOW_GRAPH_SECONDS,
+        help="with --follow, redraw the graph at most this often",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="parse without the cache and report time per phase and file, pattern hit counts and unmatched lines (to stderr)",
+    )
 
     args = parser.parse_args()
 
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 (every core) or a positive number of processes")
+    jobs = args.jobs or os.cpu_count() or 1
+
+    if args.cache_info:
+        print_cache_info()
+        return
+    if args.cache_prune:
+        print(f"Removed {prune_cache()} stale cache entries")
+        return
+    if args.cache_invalidate is not None:
+        csv_files = [normalize_csv_path(date) for date in args.cache_invalidate]
+        print(f"Removed {invalidate_cache(csv_files)} cache entries")
+        return
+    if args.export_action_store:
+        csv_paths = sorted('logs/' + f for f in os.listdir('logs/') if os.path.isfile('logs/' + f) and f.endswith(".csv"))
+        store = export_action_store(load_nights(csv_paths, use_cache=not args.no_cache, jobs=jobs))
+        print(f"Exported {len(store.actions)} actions from {len(store.rounds)} rounds of {len(store.nights)} nights to {ACTION_STORE_DIR}")
+        return
+    if args.action_store_stats:
+        print_action_store_stats(load_action_store())
+        return
+    if args.check_showdowns:
+        csv_paths = sorted('logs/' + f for f in os.listdir('logs/') if os.path.isfile('logs/' + f) and f.endswith(".csv"))
+        checked, problem_count = 0, 0
+        for night in load_nights(csv_paths, use_cache=not args.no_cache, jobs=jobs):
+            night_checked, problems = check_showdowns(night.rounds)
+            checked += night_checked
+            problem_count += len(problems)
+            for problem in problems:
+                print(f"{night.csv_file} {problem}")
+        print(f"Checked {checked} showdowns in {len(csv_paths)} nights, {problem_count} didn't match the logged winners")
+        if problem_count:
+            sys.exit(1)
+        return
+    if args.preflop_table_build:
+        started = time.time()
+        write_preflop_equity_table(build_preflop_equity_table())
+        print(f"Wrote {PREFLOP_EQUITY_FILE} in {time.time() - started:.0f}s")
+        return
+    if args.preflop_table_verify:
+        problems, matchups = verify_preflop_equity_table()
+        for problem in problems:
+            print(problem)
+        print(f"Checked {PREFLOP_EQUITY_FILE} and {matchups} sampled matchups, {len(problems)} problems")
+        if problems:
+            sys.exit(1)
+        return
+    if args.ev:
+        if preflop_equity_table() is None:
+            print(f"No {PREFLOP_EQUITY_FILE}, sampling heads-up preflop all-ins (--preflop-table-build makes one)")
+        if args.all:
+            csv_paths = sorted('logs/' + f for f in os.listdir('logs/') if os.path.isfile('logs/' + f) and f.endswith(".csv"))
+            title = "all time as of " + date_of_csv(csv_paths[-1]).strftime("%Y/%m/%d")
+        else:
+            csv_paths = [normalize_csv_path(args.date)]
+            title = date_of_csv(csv_paths[0]).strftime("%Y/%m/%d")
+        print_ev_profits(title, *luck_for_nights(csv_paths, use_cache=not args.no_cache, jobs=jobs))
+        return
+    if args.regenerate_graphs:
+        csv_paths = sorted('logs/' + f for f in os.listdir('logs/') if os.path.isfile('logs/' + f) and f.endswith(".csv"))
+        rendered = regenerate_graphs(csv_paths, jobs=jobs, use_cache=not args.no_cache)
+        print(f"Redrew {len(rendered)} of {len(csv_paths)} graphs")
+        return
+
     if args.splitwise and args.all:
         parser.error("--splitwise cannot be used with --all; choose one game-night date")
-    if args.splitwise and not os.environ.get("SPLITWISE_API_TOKEN"):
+    if args.splitwise and args.format != "text":
+        parser.error("--splitwise only works with --format text")
+    stats_only = args.format != "text"
+    if (args.splitwise or args.splitwise_backfill) and not os.environ.get("SPLITWISE_API_TOKEN"):
         parser.error(
-            "--splitwise requires a Splitwise API key. Obtain one at "
+            "--splitwise and --splitwise-backfill require a Splitwise API key. Obtain one at "
             "https://secure.splitwise.com/apps/new, then run `export "
             "SPLITWISE_API_TOKEN=<your-api-key>` and try again."
         )
 
+    if args.splitwise_backfill:
+        try:
+            first_date, last_date = (datetime.strptime(date, "%Y%m%d").date() for date in args.splitwise_backfill)
+        except ValueError:
+            parser.error("--splitwise-backfill takes two YYYYMMDD dates")
+        csv_paths = sorted(
+            'logs/' + f for f in os.listdir('logs/')
+            if os.path.isfile('logs/' + f) and f.endswith(".csv") and first_date <= date_of_csv(f) <= last_date
+        )
+        if not csv_paths:
+            parser.error(f"No csvs in logs/ between {first_date} and {last_date}")
+        nights = [(date_of_csv(night.csv_file), night.player_history) for night in load_nights(csv_paths, use_cache=not args.no_cache, jobs=jobs)]
+        try:
+            if args.splitwise_refresh:
+                _expire_splitwise_metadata()
+            results = backfill_splitwise_expenses(
+                nights, os.environ["SPLITWISE_API_TOKEN"], input_fn=input, metadata_path=SPLITWISE_METADATA_FILE
+            )
+        except (RuntimeError, ValueError) as error:
+            parser.error(str(error))
+        print_backfill_summary(results)
+        if any(outcome == "failed" for _, outcome, _ in results):
+            sys.exit(1)
+        return
+
+    if args.follow:
+        if args.all or args.splitwise or args.profile or stats_only:
+            parser.error("--follow only works on a single --date night with --format text, without --splitwise or --profile")
+        follow_night(normalize_csv_path(args.date), graph_seconds=args.graph_seconds, graph=not args.no_graph)
+        return
+
+    if args.profile:
+        if args.splitwise:
+            parser.error("--profile cannot be used with --splitwise")
+        if args.all:
+            csv_paths = sorted('logs/' + f for f in os.listdir('logs/') if os.path.isfile('logs/' + f) and f.endswith(".csv"))
+            title = "All-time profit history as of " + date_of_csv(csv_paths[-1]).strftime("%Y/%m/%d")
+        else:
+            csv_paths = [normalize_csv_path(args.date)]
+            title = "Profit for " + date_of_csv(csv_paths[0]).strftime("%Y/%m/%d")
+        if not stats_only and not args.no_graph:
+            print("Graphing all csvs in single chart" if args.all else "Graphing single csv " + csv_paths[0])
+        run_profiled(csv_paths, title, args.all, args.format, graph=not args.no_graph)
+        return
+
     if args.all:
-        print("Graphing all csvs in single chart")
+        if not stats_only and not args.no_graph:
+            print("Graphing all csvs in single chart")
         csv_files = [f for f in os.listdir('logs/') if os.path.isfile('logs/' + f) and f.endswith(".csv")]
         csv_files.sort()
 
         event_date = date_of_csv(csv_files[-1]).strftime("%Y/%m/%d")
-        all_player_history = {}
-        all_poker_rounds = []
-        for filename in csv_files:
-            filename = 'logs/' + filename
-            with open(filename) as file:
-                logs = fix_up_player_names(file.readlines())
-                if logs[0] == "entry,at,order\n":
-                    logs.pop(0) # drop csv header
-                logs.reverse()
-                curr_event_date = date_of_csv(filename).strftime("%Y/%m/%d")
-                event = PokerNightEvent(curr_event_date, logs)
-                all_poker_rounds += event.rounds
-                player_history = event.player_stack_history()
-
-                # now merge the latest event with the on-going logs that only store the final profits each week
-                for player, current_event_stack in player_history.items():
-                    if player not in all_player_history:
-                        # they're new this game, just add them cause they start at zero
-                        all_player_history[player] = [current_event_stack[-1]]
-                    else:
-                        # need to update the current event's profit to account for profit before this game
-                        last_profit = all_player_history[player][-1][0]
-                        updated_event_stack = [(current_event_stack[-1][0] + last_profit, current_event_stack[-1][1])]
-                        all_player_history[player] += updated_event_stack
+        csv_paths = ['logs/' + filename for filename in csv_files]
+
+        parsed_nights = {}
+        if not stats_only and not args.no_graph:
+            # only nights missing from the ledger (or whose csv changed) get parsed, possibly in parallel
+            ledger = ProfitLedger()
+            parsed_nights = update_profit_ledger(ledger, csv_paths, use_cache=not args.no_cache, jobs=jobs)
+            # now merge every night's final profits, in date order, into the all-time history
+            all_time_matrix = merge_all_time_history(ledger.final_profits(csv_path) for csv_path in csv_paths)
+
+        # the stats combine every night's core stats, nights that weren't just parsed come from the cache
+        unparsed_csv_paths = [csv_path for csv_path in csv_paths if csv_path not in parsed_nights]
+        for night in load_nights(unparsed_csv_paths, use_cache=not args.no_cache, jobs=jobs):
+            parsed_nights[night.csv_file] = night
+        all_core_stats = CoreStats()
+        for csv_path in csv_paths:
+            all_core_stats.merge(parsed_nights[csv_path].core_stats)
 
         # Print some stats out
-        print_core_stats(all_poker_rounds)
+        write_core_stats(all_core_stats, args.format)
+        if stats_only or args.no_graph:
+            return
 
-        graph_stack_history(all_player_history, "All-time profit history as of " + event_date, csv_files[-1], show_event_points=True)
+        graph_stack_history(all_time_matrix, "All-time profit history as of " + event_date, csv_files[-1], show_event_points=True)
 
     else:
         csv_file = normalize_csv_path(args.date)
-        print("Graphing single csv", csv_file)
+        if not stats_only and not args.no_graph:
+            print("Graphing single csv", csv_file)
         game_date = date_of_csv(csv_file)
         event_date = game_date.strftime("%Y/%m/%d")
-        with open(csv_file) as file:
-            logs = fix_up_player_names(file.readlines())
-            if logs[0] == "entry,at,order\n":
-                logs.pop(0) # drop csv header
-            logs.reverse()
-            event = PokerNightEvent(event_date, logs)
-            player_history = event.player_stack_history()
-
-            # Print some stats out
-            print_core_stats(event.rounds)
+        night = load_night(csv_file, use_cache=not args.no_cache)
+        player_history = night.player_history
 
-            # Print out Splitwise instructions or post the expense when explicitly requested.
-            if args.splitwise:
-                try:
-                    add_splitwise_expense(
-                        player_history,
-                        game_date,
-                        os.environ["SPLITWISE_API_TOKEN"],
-                        input_fn=input,
-                    )
-                except (RuntimeError, ValueError) as error:
-                    parser.error(str(error))
-            else:
-                print_splitwise_instructions(player_history)
+        # Print some stats out
+        write_core_stats(night.core_stats, args.format)
+        if stats_only:
+            return
+
+        # Print out Splitwise instructions or post the expense when explicitly requested.
+        if args.splitwise:
+            try:
+                if args.splitwise_refresh:
+                    _expire_splitwise_metadata()
+                add_splitwise_expense(
+                    player_history,
+                    game_date,
+                    os.environ["SPLITWISE_API_TOKEN"],
+                    input_fn=input,
+                    metadata_path=SPLITWISE_METADATA_FILE,
+                )
+            except (RuntimeError, ValueError) as error:
+                parser.error(str(error))
+        else:
+            print_splitwise_instructions(player_history)
 
-            graph_stack_history(player_history, "Profit for " + event_date, csv_file)
+        if not args.no_graph:
+            graph_stack_history(night.stack_matrix, "Profit for " + event_date, csv_file)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import regex_based_graph_night as poker
+
+
+class ActionStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.csv_files = ["logs/poker_night_20260708.csv", "logs/poker_night_20260715.csv"]
+        self.nights = list(poker.load_nights(self.csv_files, use_cache=False))
+        poker.export_action_store(self.nights, self.tmp)
+        self.store = poker.load_action_store(self.tmp)
+
+    def test_tables_are_memory_mapped_with_compact_codes(self):
+        self.assertIsInstance(self.store.actions, np.memmap)
+        self.assertEqual(self.store.actions.dtype["player"], np.int16)
+        self.assertEqual(self.store.actions.dtype["action"], np.int8)
+        self.assertEqual(self.store.actions.dtype["order"], np.int64)
+        self.assertEqual([night["night"] for night in self.store.nights], ["poker_night_20260708", "poker_night_20260715"])
+
+    def test_tables_match_the_parsed_rounds(self):
+        rounds = [poker_round for night in self.nights for poker_round in night.rounds]
+        self.assertEqual(list(self.store.rounds["round_number"]), [r.round_number for r in rounds])
+
+        round_index = next(i for i, r in enumerate(rounds) if r.round_number == 119 and r.undealt_cards == ["6♠", "5♥"])
+        poker_round = rounds[round_index]
+        actions = self.store.actions[self.store.actions["round"] == round_index]
+        for street, street_actions in enumerate([
+            poker_round.pre_flop_actions(),
+            poker_round.pre_turn_actions(),
+            poker_round.pre_river_actions(),
+            poker_round.post_river_actions(),
+        ]):
+            self.assertEqual(
+                [(self.store.players[a["player"]], poker.ACTION_TYPES[a["action"]], a["amount"]) for a in actions[actions["street"] == street]],
+                [(a.player, a.action_type, a.amount) for a in street_actions],
+            )
+
+        stacks = self.store.stacks[self.store.stacks["round"] == round_index]
+        self.assertEqual({self.store.players[s["player"]]: s["stack"] for s in stacks}, poker_round.player_balances)
+        winnings = self.store.winnings[self.store.winnings["round"] == round_index]
+        self.assertEqual([self.store.players[w["player"]] for w in winnings], poker_round.winning_players)
+
+        folds = self.store.actions[self.store.actions["action"] == self.store.action_code(poker.RoundAction.folds)]
+        self.assertEqual(
+            np.bincount(folds["player"], minlength=len(self.store.players))[self.store.player_code("Prilik")],
+            sum(street_folds.get("Prilik", 0) for street_folds in poker.core_stats_for_rounds(rounds).folds),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import io
+import unittest
+from contextlib import redirect_stdout
+
+import benchmark
+import regex_based_graph_night as poker
+
+
+class BenchmarkTests(unittest.TestCase):
+    def test_synthetic_night_repeats_the_night_in_order(self):
+        csv_lines = benchmark.read_csv_lines("logs/poker_night_20260715.csv")
+        synthetic = benchmark.synthetic_night(csv_lines, 3)
+
+        self.assertEqual(len(synthetic), 3 * (len(csv_lines) - 1) + 1)
+        orders = [order for order in map(poker._row_order, reversed(synthetic[1:])) if order is not None]
+        self.assertEqual(orders, sorted(orders))
+        rounds = poker.fan_out(poker.parse_events(poker.fix_up_player_names(synthetic[:0:-1])), [poker.RoundCollector()])[0]
+        self.assertEqual(len(rounds), 3 * len(poker.load_night("logs/poker_night_20260715.csv", use_cache=False).rounds))
+
+    def test_compare_flags_time_and_memory_regressions(self):
+        baseline = {
+            "corpus/parse_events": {"seconds": 1.0, "peak_mib": 10.0},
+            "corpus/build_rounds": {"seconds": 1.0, "peak_mib": 10.0},
+            "corpus/split_rounds": {"seconds": 1.0, "peak_mib": 10.0},
+        }
+        results = {
+            "corpus/parse_events": {"seconds": 1.05, "peak_mib": 10.0},
+            "corpus/build_rounds": {"seconds": 1.5, "peak_mib": 10.0},
+            "corpus/split_rounds": {"seconds": 0.5, "peak_mib": 12.0},
+            "corpus/graph_stack_history": {"seconds": 0.5, "peak_mib": 1.0},
+        }
+
+        with redirect_stdout(io.StringIO()):
+            regressions = benchmark.compare_results(baseline, results, threshold=0.1)
+
+        self.assertEqual(regressions, ["corpus/build_rounds", "corpus/split_rounds"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import regex_based_graph_night as poker
+
+
+class ParsedNightCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.logs_dir = os.path.join(self.tmp, "logs")
+        self.cache_dir = os.path.join(self.tmp, "cache")
+        os.makedirs(self.logs_dir)
+        self.csv_file = os.path.join(self.logs_dir, "poker_night_20260715.csv")
+        shutil.copy("logs/poker_night_20260715.csv", self.csv_file)
+
+    def test_second_load_comes_from_cache_with_identical_results(self):
+        parsed = poker.load_night(self.csv_file, cache_dir=self.cache_dir)
+        cached = poker.load_night(self.csv_file, cache_dir=self.cache_dir)
+
+        self.assertIsNotNone(cached._event_tuples)
+        self.assertEqual(cached.player_history, parsed.player_history)
+        self.assertEqual(cached.core_stats.state(), parsed.core_stats.state())
+        self.assertEqual(
+            [(r.round_number, r.winning_players, r.player_balances) for r in cached.rounds],
+            [(r.round_number, r.winning_players, r.player_balances) for r in parsed.rounds],
+        )
+        self.assertEqual(
+            [(a.player, a.action_type, a.amount, a.all_in) for a in cached.rounds[-1].player_actions],
+            [(a.player, a.action_type, a.amount, a.all_in) for a in parsed.rounds[-1].player_actions],
+        )
+
+    def test_edited_csv_replaces_its_cache_entry(self):
+        poker.load_night(self.csv_file, cache_dir=self.cache_dir)
+        first_entries = os.listdir(self.cache_dir)
+        with open(self.csv_file, "a") as file:
+            file.write('"The player ""Jonah @ xrBY5OZYCv"" requested a seat.",2026-07-16T00:00:00.000Z,178416000000000\n')
+
+        night = poker.load_night(self.csv_file, cache_dir=self.cache_dir)
+
+        self.assertIsNone(night._event_tuples) # parsed again
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        self.assertNotEqual(os.listdir(self.cache_dir), first_entries)
+
+    def test_prune_and_invalidate(self):
+        poker.load_night(self.csv_file, cache_dir=self.cache_dir)
+        self.assertEqual(poker.prune_cache(self.cache_dir, self.logs_dir), 0)
+
+        os.remove(self.csv_file)
+        self.assertEqual(poker.prune_cache(self.cache_dir, self.logs_dir), 1)
+
+        shutil.copy("logs/poker_night_20260715.csv", self.csv_file)
+        poker.load_night(self.csv_file, cache_dir=self.cache_dir)
+        self.assertEqual(poker.invalidate_cache(["logs/poker_night_20260722.csv"], self.cache_dir), 0)
+        self.assertEqual(poker.invalidate_cache([self.csv_file], self.cache_dir), 1)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+
+class ParallelLoadTests(unittest.TestCase):
+    def test_process_pool_matches_serial_load_in_order(self):
+        csv_files = [
+            "logs/poker_night_20260624.csv",
+            "logs/poker_night_20260708.csv",
+            "logs/poker_night_20260715.csv",
+        ]
+        serial = list(poker.load_nights(csv_files, use_cache=False, jobs=1))
+        parallel = list(poker.load_nights(csv_files, use_cache=False, jobs=2))
+
+        self.assertEqual([night.csv_file for night in parallel], csv_files)
+        self.assertEqual([night.player_history for night in parallel], [night.player_history for night in serial])
+        self.assertEqual(
+            [[r.round_number for r in night.rounds] for night in parallel],
+            [[r.round_number for r in night.rounds] for night in serial],
+        )
+
+
+class ProfitLedgerTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.ledger_path = os.path.join(self.tmp, "ledger.jsonl")
+        self.csv_files = []
+        for name in ["poker_night_20260708.csv", "poker_night_20260715.csv"]:
+            csv_file = os.path.join(self.tmp, name)
+            shutil.copy("logs/" + name, csv_file)
+            self.csv_files.append(csv_file)
+
+    def test_only_missing_or_changed_nights_are_parsed(self):
+        ledger = poker.ProfitLedger(self.ledger_path)
+        parsed = poker.update_profit_ledger(ledger, self.csv_files, use_cache=False)
+        self.assertEqual(sorted(parsed), sorted(self.csv_files))
+
+        ledger = poker.ProfitLedger(self.ledger_path)
+        self.assertEqual(poker.update_profit_ledger(ledger, self.csv_files, use_cache=False), {})
+
+        with open(self.csv_files[0], "a") as file:
+            file.write('"The player ""Jonah @ xrBY5OZYCv"" requested a seat.",2026-07-09T00:00:00.000Z,178355000000000\n')
+        parsed = poker.update_profit_ledger(ledger, self.csv_files, use_cache=False)
+        self.assertEqual(list(parsed), [self.csv_files[0]])
+        with open(self.ledger_path) as file:
+            self.assertEqual(len(file.readlines()), 3)
+        poker.ProfitLedger(self.ledger_path)
+        with open(self.ledger_path) as file:
+            self.assertEqual(len(file.readlines()), 2) # compacted on load
+
+    def test_a_half_written_last_line_is_skipped(self):
+        poker.update_profit_ledger(poker.ProfitLedger(self.ledger_path), self.csv_files, use_cache=False)
+        with open(self.ledger_path) as file:
+            lines = file.readlines()
+        with open(self.ledger_path, "w") as file:
+            file.writelines([lines[0], lines[1][:40]])
+
+        with self.assertWarnsRegex(RuntimeWarning, "half written"):
+            ledger = poker.ProfitLedger(self.ledger_path)
+        self.assertEqual(list(poker.update_profit_ledger(ledger, self.csv_files, use_cache=False)), [self.csv_files[1]])
+        with open(self.ledger_path) as file:
+            self.assertEqual(file.readlines(), lines)
+
+    def test_all_time_history_matches_merging_stack_histories(self):
+        ledger = poker.ProfitLedger(self.ledger_path)
+        parsed = poker.update_profit_ledger(ledger, self.csv_files, use_cache=False)
+
+        all_time = poker.merge_all_time_history(
+            poker.ProfitLedger(self.ledger_path).final_profits(csv_file) for csv_file in self.csv_files
+        ).player_history()
+
+        first, second = (parsed[csv_file].player_history for csv_file in self.csv_files)
+        self.assertEqual(all_time["Prilik"][0], first["Prilik"][-1])
+        self.assertEqual(all_time["Prilik"][-1][0], first["Prilik"][-1][0] + second["Prilik"][-1][0])
+        self.assertEqual(all_time["Prilik"][-1][1], second["Prilik"][-1][1])
+        self.assertEqual(sum(entries[-1][0] for entries in all_time.values()), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import csv
+import io
+import json
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+from contextlib import redirect_stdout
+
+import numpy as np
+
+import regex_based_graph_night as poker
+
+
+def printed(core_stats):
+    output = io.StringIO()
+    with redirect_stdout(output):
+        core_stats.print_stats()
+    return output.getvalue()
+
+
+class CoreStatsTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        csv_files = ["logs/poker_night_20260624.csv", "logs/poker_night_20260708.csv", "logs/poker_night_20260715.csv"]
+        cls.nights = list(poker.load_nights(csv_files, use_cache=False))
+        cls.rounds = [poker_round for night in cls.nights for poker_round in night.rounds]
+
+    def test_single_pass_matches_the_action_store(self):
+        core_stats = poker.core_stats_for_rounds(self.rounds)
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        poker.export_action_store(self.nights, tmp)
+        store = poker.load_action_store(tmp)
+
+        def per_player(table):
+            return {store.players[player]: count for player, count in enumerate(np.bincount(table["player"], minlength=len(store.players))) if count}
+
+        self.assertEqual(core_stats.rounds_played, per_player(store.stacks))
+        self.assertEqual(core_stats.wins, per_player(store.winnings))
+        self.assertEqual(core_stats.biggest_win["amount"], store.winnings["amount"].max())
+        raises = store.actions[np.isin(store.actions["action"], [store.action_code(poker.RoundAction.raises), store.action_code(poker.RoundAction.bets)])]
+        folds = store.actions[store.actions["action"] == store.action_code(poker.RoundAction.folds)]
+        all_ins = store.actions[store.actions["all_in"]]
+        for street in range(len(poker.STREETS)):
+            self.assertEqual(core_stats.folds[street], per_player(folds[folds["street"] == street]))
+            self.assertEqual({player: count for player, (count, _) in core_stats.all_ins[street].items()}, per_player(all_ins[all_ins["street"] == street]))
+            self.assertEqual(core_stats.biggest_raises[street]["amount"], raises[raises["street"] == street]["amount"].max())
+
+        shown_after_winning = [
+            player for poker_round in self.rounds if not poker_round.winning_hands
+            for player in poker_round.winning_players if player in poker_round.player_to_hand
+        ]
+        self.assertEqual(core_stats.gentleman_scores, dict(Counter(shown_after_winning)))
+
+    def test_merged_night_partials_match_one_pass_over_every_round(self):
+        merged = poker.CoreStats()
+        for night in self.nights:
+            merged.merge(poker.CoreStats.from_state(night.core_stats.state()))
+
+        single_pass = poker.core_stats_for_rounds(self.rounds)
+        self.assertEqual(merged.state(), single_pass.state())
+        self.assertEqual(list(merged.wins), list(single_pass.wins)) # same order, so ties print the same
+        self.assertEqual(printed(merged), printed(single_pass))
+
+    def test_results_serialize_to_json_and_csv(self):
+        core_stats = poker.core_stats_for_rounds(self.rounds)
+        results = core_stats.results()
+
+        output = io.StringIO()
+        poker.write_core_stats(core_stats, "json", output)
+        document = json.loads(output.getvalue())
+        self.assertEqual(document["most_wins"]["player"], results["most_wins"]["player"])
+        self.assertEqual([entry["player"] for entry in document["wins"]], [entry["player"] for entry in results["wins"]])
+        self.assertEqual(document["biggest_win"]["start_time"], results["biggest_win"]["start_time"].isoformat())
+        self.assertEqual([street["street"] for street in document["streets"]], poker.STREETS)
+
+        output = io.StringIO()
+        poker.write_core_stats(core_stats, "csv", output)
+        rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+        self.assertEqual(list(rows[0]), poker.CORE_STATS_CSV_FIELDS)
+        folds = {row["player"]: int(row["value"]) for row in rows if row["section"] == "folds" and row["street"] == "Pre-flop"}
+        self.assertEqual(folds, core_stats.folds[poker.PRE_FLOP])
+
+        output = io.StringIO()
+        poker.write_core_stats(core_stats, "text", output)
+        self.assertEqual(output.getvalue(), printed(core_stats))
+
+    def test_results_before_any_pot_is_won(self):
+        results = poker.CoreStats().results()
+        self.assertEqual((results["most_wins"], results["wins"], results["biggest_win"]), (None, [], None))
+
+        output = io.StringIO()
+        poker.write_core_stats(poker.CoreStats(), "csv", output)
+        self.assertEqual(output.getvalue(), ",".join(poker.CORE_STATS_CSV_FIELDS) + "\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
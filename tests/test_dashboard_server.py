@@ -0,0 +1,144 @@
+import asyncio
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+
+import dashboard_server
+import regex_based_graph_night as poker
+
+
+class DashboardTests(unittest.TestCase):
+    def setUp(self):
+        self.logs_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.logs_dir)
+        for night in ["20260708", "20260715"]:
+            shutil.copy(f"logs/poker_night_{night}.csv", self.logs_dir)
+        self.dashboard = dashboard_server.Dashboard(self.logs_dir, use_cache=False)
+        self.addCleanup(self.dashboard.render_executor.shutdown)
+        self.dashboard.refresh()
+
+    def get(self, path, headers=None):
+        return asyncio.run(self.dashboard.respond("GET", path, headers or {}))
+
+    def test_night_stats_match_the_script(self):
+        status, content_type, body, _ = self.get("/nights/20260715.json")
+        self.assertEqual((status, content_type), (200, "application/json"))
+        document = json.loads(body)
+        night = poker.load_night("logs/poker_night_20260715.csv", use_cache=False)
+        self.assertEqual(document["csv_sha256"], night.csv_sha256)
+        self.assertEqual(document["profits"], {player: entries[-1][0] for player, entries in night.player_history.items()})
+        self.assertEqual(document["stats"]["wins"], json.loads(json.dumps(night.core_stats.results(), default=poker._json_default))["wins"])
+        self.assertEqual(self.get("/nights/20990101.json")[0], 404)
+
+    def test_requests_are_served_from_memory(self):
+        first = self.get("/all-time.json")
+        for _ in range(20):
+            self.assertIs(self.get("/all-time.json")[2], first[2])
+        self.assertEqual(self.dashboard.refresh(), set())
+        self.assertEqual(self.dashboard.parses, 2)
+        self.assertEqual(self.get("/all-time.json", {"if-none-match": first[3]})[:3], (304, "application/json", b""))
+
+    def test_new_csv_only_invalidates_the_responses_it_affects(self):
+        old_night = self.get("/nights/20260708.json")
+        old_all_time = self.get("/all-time.json")
+        shutil.copy("logs/poker_night_20260722.csv", self.logs_dir)
+
+        self.assertEqual(self.dashboard.refresh(), {"20260722"})
+        self.assertEqual(self.dashboard.parses, 3)
+        self.assertIs(self.get("/nights/20260708.json")[2], old_night[2])
+        new_all_time = self.get("/all-time.json")
+        self.assertNotEqual(new_all_time[3], old_all_time[3])
+        self.assertEqual(json.loads(new_all_time[2])["nights"], 3)
+
+    def test_background_refresh_swaps_in_edited_and_touched_csvs(self):
+        old_night = self.get("/nights/20260708.json")
+        night_csv = os.path.join(self.logs_dir, "poker_night_20260715.csv")
+        with open(night_csv) as file:
+            lines = file.readlines()
+        with open(night_csv, "w") as file:
+            file.writelines(lines[1:]) # the newest row is gone
+        os.utime(os.path.join(self.logs_dir, "poker_night_20260708.csv"), ns=(0, 0)) # same contents, new mtime
+
+        self.assertEqual(asyncio.run(self.dashboard.refresh_in_background()), {"20260715"})
+        self.assertEqual(self.dashboard.parses, 3)
+        self.assertEqual(self.dashboard.nights["20260715"].csv_sha256, poker.csv_content_hash(night_csv))
+        self.assertIs(self.get("/nights/20260708.json")[2], old_night[2])
+        self.assertEqual(asyncio.run(self.dashboard.refresh_in_background()), set())
+
+    def test_a_broken_csv_does_not_stop_the_scans(self):
+        broken_csv = os.path.join(self.logs_dir, "poker_night_20260716.csv")
+        with open(broken_csv, "w") as file:
+            file.write('entry,at,order\n"The player ""Nobody @ zz0"" joined')
+        with redirect_stderr(io.StringIO()) as errors, redirect_stdout(io.StringIO()):
+            self.assertEqual(asyncio.run(self.dashboard.refresh_in_background()), set())
+            self.assertEqual(asyncio.run(self.dashboard.refresh_in_background()), set()) # not tried again until it changes
+        self.assertEqual(errors.getvalue().count("poker_night_20260716.csv"), 1)
+        self.assertEqual(list(self.dashboard.nights), ["20260708", "20260715"])
+
+        shutil.copy("logs/poker_night_20260722.csv", self.logs_dir)
+        self.assertEqual(asyncio.run(self.dashboard.refresh_in_background()), {"20260722"})
+        self.assertEqual(self.get("/nights/20260722.json")[0], 200)
+
+        shutil.copy("logs/poker_night_20260715.csv", broken_csv) # exported again in full
+        self.assertEqual(asyncio.run(self.dashboard.refresh_in_background()), {"20260716"})
+
+    def test_a_night_before_any_pot_is_won(self):
+        for csv_file in os.listdir(self.logs_dir):
+            os.remove(os.path.join(self.logs_dir, csv_file))
+        with open("logs/poker_night_20260708.csv") as file:
+            lines = file.readlines()
+        first_collect = max(i for i, line in enumerate(lines) if " collected " in line)
+        with open(os.path.join(self.logs_dir, "poker_night_20260708.csv"), "w") as file:
+            file.writelines([lines[0], *lines[first_collect + 1:]]) # the first hand has started but nobody has won it yet
+        self.dashboard.refresh()
+
+        for path in ["/nights/20260708.json", "/all-time.json"]:
+            status, _, body, _ = self.get(path)
+            self.assertEqual(status, 200)
+            self.assertEqual((json.loads(body)["stats"]["most_wins"], json.loads(body)["stats"]["biggest_win"]), (None, None))
+
+    def test_a_failing_build_is_a_500(self):
+        self.dashboard.nights["20260715"].core_stats = None
+        with redirect_stderr(io.StringIO()) as errors:
+            self.assertEqual(self.get("/nights/20260715.json"), (500, "text/plain", b"Internal error\n", None))
+            self.assertEqual(self.get("/nights/20260715.json")[0], 500) # not cached
+        self.assertIn("/nights/20260715.json", errors.getvalue())
+        self.assertEqual(self.dashboard.rendering, {})
+        self.assertEqual(self.get("/nights/20260708.json")[0], 200)
+        self.assertEqual(dashboard_server.STATUS_TEXT[500], "Internal Server Error")
+
+    def test_two_games_on_one_day_are_separate_nights(self):
+        shutil.copy("logs/poker_night_20220106.csv", self.logs_dir)
+        shutil.copy("logs/poker_night_20220106_tourney.csv", self.logs_dir)
+        self.assertEqual(self.dashboard.refresh(), {"20220106", "20220106_tourney"})
+        self.assertEqual(self.dashboard.refresh(), set())
+        self.assertEqual(self.get("/nights/20220106_tourney.json")[0], 200)
+
+    def test_http_round_trip(self):
+        async def round_trip():
+            server = await asyncio.start_server(self.dashboard.handle_connection, "127.0.0.1", 0)
+            async with server:
+                reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+                responses = []
+                for path in ["/", "/nights/20260708.json"]:
+                    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+                    await writer.drain()
+                    head = (await reader.readuntil(b"\r\n\r\n")).decode()
+                    length = int(head.split("Content-Length: ")[1].split("\r\n")[0])
+                    responses.append((head.split("\r\n")[0], json.loads(await reader.readexactly(length))))
+                writer.close()
+                return responses
+
+        (index_status, index), (night_status, night) = asyncio.run(round_trip())
+        self.assertEqual(index_status, "HTTP/1.1 200 OK")
+        self.assertEqual([entry["night"] for entry in index["nights"]], ["20260708", "20260715"])
+        self.assertEqual(night_status, "HTTP/1.1 200 OK")
+        self.assertEqual(night["night"], "20260708")
+
+
+if __name__ == "__main__":
+    unittest.main()
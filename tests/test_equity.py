@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import unittest
+from itertools import combinations
+
+import numpy as np
+
+import regex_based_graph_night as poker
+
+
+class EquityTests(unittest.TestCase):
+    def test_side_pots(self):
+        contributions = {"Alex": 100, "Sam": 300, "Jo": 300, "Max": 50} # Max folded
+        self.assertEqual(
+            poker.pot_layers(contributions, ["Alex", "Sam", "Jo"]),
+            [(350, ["Alex", "Sam", "Jo"]), (400, ["Sam", "Jo"])],
+        )
+
+    def test_uncalled_bet_goes_back(self):
+        round = poker.load_night("logs/poker_night_20260715.csv", use_cache=False).rounds[0]
+        contributions = poker.round_contributions(round)
+        self.assertEqual(sum(contributions.values()), sum(round.winning_amounts))
+
+    def test_aces_against_kings_before_the_flop(self):
+        hole_cards = {"Alex": poker.card_codes("A♠, A♥"), "Sam": poker.card_codes("K♣, K♦")}
+        expected = poker.expected_winnings(hole_cards, [], [(1000, ["Alex", "Sam"])], np.random.default_rng(1))
+        self.assertAlmostEqual(expected["Alex"] / 1000, 0.82, delta=0.015)
+        self.assertAlmostEqual(expected["Alex"] + expected["Sam"], 1000)
+
+    def test_flop_all_in_is_enumerated_exactly(self):
+        hole_cards = {"Alex": poker.card_codes("A♠, K♠"), "Sam": poker.card_codes("Q♣, Q♦"), "Jo": poker.card_codes("7♥, 7♦")}
+        flop = poker.card_codes("Q♠, 7♠, 2♥")
+        expected = poker.expected_winnings(hole_cards, flop, [(300, ["Alex", "Sam", "Jo"])], None)
+
+        dead = set(flop) | {card for cards in hole_cards.values() for card in cards}
+        shares = dict.fromkeys(hole_cards, 0.0)
+        runouts = list(combinations([card for card in range(52) if card not in dead], 2))
+        for runout in runouts:
+            values = {player: poker.hand_value(cards + flop + list(runout)) for player, cards in hole_cards.items()}
+            winners = [player for player, value in values.items() if value == max(values.values())]
+            for player in winners:
+                shares[player] += 300 / len(winners) / len(runouts)
+        for player in hole_cards:
+            self.assertAlmostEqual(expected[player], shares[player])
+
+    def test_luck_adds_up_to_zero(self):
+        night = poker.load_night("logs/poker_night_20260715.csv", use_cache=False)
+        luck, showdowns = poker.all_in_luck(night.rounds)
+        self.assertEqual(showdowns, 5)
+        self.assertAlmostEqual(sum(luck.values()), 0)
+        self.assertEqual(poker.all_in_luck(night.rounds), (luck, showdowns)) # the sampled boards don't change
+
+
+class PreflopEquityTableTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.table_dir = tempfile.mkdtemp()
+        cls.table_path = os.path.join(cls.table_dir, "preflop_equity.bin")
+        poker.write_preflop_equity_table(poker.build_preflop_equity_table(boards=3000), cls.table_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.table_dir)
+
+    def test_starting_hand_classes(self):
+        hands, hand_classes = poker._starting_hands()
+        sizes = {poker.starting_hand_name(hand_class): count for hand_class, count in enumerate(np.bincount(hand_classes))}
+        self.assertEqual(len(sizes), 169)
+        self.assertEqual((sizes["AA"], sizes["AKs"], sizes["AKo"], sizes["72o"]), (6, 4, 12, 12))
+        self.assertEqual(poker.starting_hand_class(poker.card_codes("K♦, A♠")), poker.starting_hand_class(poker.card_codes("A♣, K♥")))
+
+    def test_table_round_trips_through_the_file(self):
+        table = poker.load_preflop_equity_table(self.table_path)
+        self.assertEqual(os.path.getsize(self.table_path), poker.PREFLOP_EQUITY_HEADER.size + 2 * 169 * 169)
+        self.assertEqual(table.boards, 3000)
+        quantized = table.quantized.astype(np.int64)
+        self.assertTrue((quantized + quantized.T == poker.PREFLOP_EQUITY_SCALE).all())
+        self.assertAlmostEqual(table.equity(poker.card_codes("A♠, A♥"), poker.card_codes("K♣, K♦")), 0.82, delta=0.03)
+        self.assertAlmostEqual(table.equity(poker.card_codes("7♠, 2♦"), poker.card_codes("A♣, A♦")), 0.12, delta=0.03)
+
+    def test_verify(self):
+        self.assertEqual(poker.verify_preflop_equity_table(self.table_path, matchups=20, boards=2000), ([], 20))
+        broken_path = os.path.join(self.table_dir, "broken.bin")
+        with open(self.table_path, "rb") as file, open(broken_path, "wb") as broken:
+            broken.write(b"XXXX" + file.read()[4:])
+        problems, _ = poker.verify_preflop_equity_table(broken_path)
+        self.assertIn("build it again", problems[0])
+
+    def test_heads_up_preflop_all_ins_use_the_table(self):
+        table = poker.load_preflop_equity_table(self.table_path)
+        hole_cards = {"Alex": poker.card_codes("A♠, A♥"), "Sam": poker.card_codes("K♣, K♦")}
+        equity = table.equity(hole_cards["Alex"], hole_cards["Sam"])
+        pots = [(1000, ["Alex", "Sam"]), (200, ["Alex"])]
+        expected = poker.expected_winnings(hole_cards, [], pots, None, table)
+        self.assertAlmostEqual(expected["Alex"], 1000 * equity + 200)
+        self.assertAlmostEqual(expected["Sam"], 1000 * (1 - equity))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+import regex_based_graph_night as poker
+
+
+def chronological_lines(csv_file):
+    with open(csv_file) as file:
+        return file.readlines()[1:][::-1]
+
+
+class NightFollowerTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    # Exports the oldest `cut` lines of the night, newest first like the real exports
+    def export(self, csv_file, lines, cut):
+        export = os.path.join(self.tmp, os.path.basename(csv_file))
+        with open(export, "w") as file:
+            file.writelines(["entry,at,order\n"] + lines[:cut][::-1])
+        return export
+
+    def test_following_a_growing_export_matches_a_full_parse(self):
+        for csv_file in ["logs/poker_night_20260624.csv", "logs/poker_night_20260715.csv"]:
+            lines = chronological_lines(csv_file)
+            follower = poker.NightFollower(self.export(csv_file, lines, 0))
+            cut = 0
+            while cut < len(lines):
+                cut = min(cut + 400, len(lines))
+                while cut < len(lines) and not lines[cut].startswith('"""'):
+                    cut += 1 # exports never end in the middle of a multi line row
+                self.export(csv_file, lines, cut)
+                follower.update()
+            self.assertEqual(follower.read_new_rows(), [])
+
+            night = poker.load_night(csv_file, use_cache=False)
+            self.assertEqual(follower.finish(), night.stack_matrix)
+            self.assertEqual(follower.core_stats.state(), night.core_stats.state())
+
+    def test_updates_only_read_and_count_the_new_rows(self):
+        csv_file = "logs/poker_night_20260715.csv"
+        lines = chronological_lines(csv_file)
+        hand_starts = [i for i, line in enumerate(lines) if line.startswith('"-- starting hand #')]
+        follower = poker.NightFollower(self.export(csv_file, lines, hand_starts[3] + 1)) # into the 4th hand
+
+        self.assertEqual(follower.update(), 3)
+        self.assertEqual(follower.last_round_number, 3)
+        self.assertEqual(follower.update(), 0)
+
+        self.export(csv_file, lines, hand_starts[6] + 2)
+        probe = poker.NightFollower(follower.csv_file)
+        probe.last_order = follower.last_order
+        self.assertEqual(probe.read_new_rows(), lines[hand_starts[3] + 1:hand_starts[6] + 2][::-1])
+        self.assertEqual(follower.update(), 3)
+        self.assertEqual(follower.last_round_number, 6)
+
+        stack_matrix = follower.stack_history.finish()
+        self.assertEqual(len(stack_matrix.column(0)[1]), 6)
+        profits = {player: profit for player, (profit, _) in stack_matrix.final_profits().items()}
+        self.assertEqual(follower.stack_history.profits, profits)
+        self.assertIn(f"{stack_matrix.players[0]}: $", poker.standings(follower.stack_history.profits))
+
+
+    def test_stopping_before_the_first_hand_is_finished(self):
+        def interrupt(seconds):
+            raise KeyboardInterrupt
+
+        csv_file = "logs/poker_night_20260715.csv"
+        lines = chronological_lines(csv_file)
+        first_hand = next(i for i, line in enumerate(lines) if line.startswith('"-- starting hand #'))
+        first_stacks = next(i for i, line in enumerate(lines) if line.startswith('"Player stacks'))
+        # nothing exported yet, the first hand before its stacks are logged, and into the first hand
+        for cut, rounds in [(0, 0), (first_hand + 3, 0), (first_stacks + 3, 1)]:
+            output = io.StringIO()
+            with redirect_stdout(output):
+                stack_matrix = poker.follow_night(self.export(csv_file, lines, cut), graph=False, sleep=interrupt)
+            self.assertEqual(len(stack_matrix.times), rounds)
+            self.assertIn("------- Winning Hands of Hands Played", output.getvalue())
+            self.assertIn("=== Splitwise Instructions ===", output.getvalue())
+
+if __name__ == "__main__":
+    unittest.main()
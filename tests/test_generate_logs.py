@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date
+
+import generate_logs
+import regex_based_graph_night as poker
+
+
+class GenerateLogsTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.csv_files = generate_logs.write_nights(cls.tmp, 6, seed=3, players=10, hands=150)
+        cls.nights = list(poker.load_nights(cls.csv_files, use_cache=False))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def test_nights_parse_and_profits_sum_to_zero(self):
+        for night in self.nights:
+            self.assertEqual(sum(entries[-1][0] for entries in night.player_history.values()), 0, night.csv_file)
+            self.assertEqual(night.rounds[-1].round_number, 151)
+        self.assertEqual(max(len(r.player_balances) for night in self.nights for r in night.rounds), 10)
+
+    def test_nights_cover_every_kind_of_event(self):
+        event_types = {type(event) for night in self.nights for event in night.events}
+        for event_type in [poker.Join, poker.Rebuy, poker.Stand, poker.Sit, poker.Quit, poker.AdminAdjust, poker.Show, poker.Undealt]:
+            self.assertIn(event_type, event_types)
+        rounds = [r for night in self.nights for r in night.rounds]
+        self.assertTrue(any(action.all_in for r in rounds for action in r.player_actions))
+        self.assertTrue(any(r.winning_hands for r in rounds))
+
+    def test_rows_are_newest_first_and_the_seed_decides_the_output(self):
+        with open(self.csv_files[0]) as file:
+            lines = file.readlines()
+        self.assertEqual(lines[0], "entry,at,order\n")
+        orders = [int(line.rsplit(",", 1)[1]) for line in lines[1:]]
+        self.assertEqual(orders, sorted(orders, reverse=True))
+        self.assertEqual(len(set(orders)), len(orders))
+        self.assertEqual(os.path.basename(self.csv_files[1]), "poker_night_20300110.csv")
+
+        night = generate_logs.generate_night(3, date(2030, 1, 3), 10, 150)
+        self.assertEqual(night, lines)
+        self.assertNotEqual(generate_logs.generate_night(4, date(2030, 1, 3), 10, 150), lines)
+
+    def test_describes_hands_like_the_logs(self):
+        cards = [(14, "♠"), (13, "♠"), (12, "♠"), (11, "♠"), (10, "♠"), (2, "♥"), (3, "♦")]
+        self.assertEqual(generate_logs.describe_hand(generate_logs.best_hand(cards)[0]), "Royal Flush")
+        cards = [(12, "♠"), (12, "♥"), (6, "♦"), (6, "♣"), (9, "♠"), (2, "♥"), (3, "♦")]
+        self.assertEqual(generate_logs.describe_hand(generate_logs.best_hand(cards)[0]), "Two Pair, Q's & 6's")
+        cards = [(14, "♠"), (2, "♥"), (3, "♦"), (4, "♣"), (5, "♠"), (9, "♥"), (9, "♦")]
+        self.assertEqual(generate_logs.describe_hand(generate_logs.best_hand(cards)[0]), "Straight, 5 High")
+
+
+if __name__ == "__main__":
+    unittest.main()
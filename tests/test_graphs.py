@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import regex_based_graph_night as poker
+
+
+class RegenerateGraphsTests(unittest.TestCase):
+    def setUp(self):
+        repo_dir = os.getcwd()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        os.makedirs(os.path.join(self.tmp, "logs"))
+        os.makedirs(os.path.join(self.tmp, "graphs"))
+        for night in ["20260708", "20260715"]:
+            shutil.copy(f"logs/poker_night_{night}.csv", os.path.join(self.tmp, "logs"))
+        os.chdir(self.tmp)
+        self.addCleanup(os.chdir, repo_dir)
+        self.csv_files = ["logs/poker_night_20260708.csv", "logs/poker_night_20260715.csv"]
+
+    def regenerate(self, jobs=1):
+        return poker.regenerate_graphs(self.csv_files, jobs=jobs, use_cache=False, manifest_path="manifest.json")
+
+    def test_only_stale_graphs_are_redrawn(self):
+        self.assertEqual(
+            self.regenerate(jobs=2),
+            ["graphs/poker_night_20260708_profit_graph.png", "graphs/poker_night_20260715_profit_graph.png"],
+        )
+        self.assertEqual(self.regenerate(), [])
+
+        with open("logs/poker_night_20260715.csv", "a") as file:
+            file.write("\n") # a changed csv
+        os.remove("graphs/poker_night_20260708_profit_graph.png") # a missing png
+        self.assertEqual(
+            self.regenerate(),
+            ["graphs/poker_night_20260708_profit_graph.png", "graphs/poker_night_20260715_profit_graph.png"],
+        )
+
+        manifest = poker.load_graph_manifest("manifest.json")
+        manifest["graphs/poker_night_20260715_profit_graph.png"]["render"] = "0-old-renderer"
+        poker.save_graph_manifest(manifest, "manifest.json")
+        self.assertEqual(self.regenerate(), ["graphs/poker_night_20260715_profit_graph.png"])
+
+    def test_reused_figure_draws_the_same_png_as_a_fresh_one(self):
+        self.regenerate()
+        with open("graphs/poker_night_20260715_profit_graph.png", "rb") as file:
+            reused = file.read()
+        night = poker.load_night("logs/poker_night_20260715.csv", use_cache=False)
+        poker.graph_stack_history(night.stack_matrix, "Profit for 2026/07/15", "logs/poker_night_20260715.csv")
+        with open("graphs/poker_night_20260715_profit_graph.png", "rb") as file:
+            self.assertEqual(file.read(), reused)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import random
+import unittest
+
+import numpy as np
+
+import generate_logs
+import regex_based_graph_night as poker
+
+
+# generate_logs scores every 5 card combination the slow way, which makes it an independent reference
+def reference_value(cards):
+    score, _ = generate_logs.best_hand([(card // 4 + 2, generate_logs.SUITS[card % 4]) for card in cards])
+    return score[0] << 20 | sum((rank - 2) << (16 - 4 * i) for i, rank in enumerate(score[1:]))
+
+
+class HandEvaluationTests(unittest.TestCase):
+    def test_card_codes(self):
+        self.assertEqual(poker.card_codes("10♦, A♠"), [8 * 4 + 1, 12 * 4 + 3])
+        self.assertEqual(poker.card_codes(["2♣", "K♥"]), [0, 11 * 4 + 2])
+        self.assertEqual(poker.card_codes("Aâ™ , 10â™¦"), poker.card_codes("A♠, 10♦")) # logs/poker_night_20240612.csv
+
+    def test_matches_scoring_every_combination(self):
+        rng = random.Random(7)
+        for _ in range(3000):
+            cards = rng.sample(range(52), rng.choice([5, 6, 7]))
+            self.assertEqual(poker.hand_value(cards), reference_value(cards), cards)
+
+    def test_evaluate_many_matches_hand_value(self):
+        rng = random.Random(8)
+        for size in [5, 6, 7]:
+            hands = np.array([rng.sample(range(52), size) for _ in range(2000)], dtype=np.int8)
+            self.assertEqual(poker.evaluate_many(hands).tolist(), [poker.hand_value(hand) for hand in hands.tolist()])
+
+    def test_hand_categories(self):
+        def category(cards):
+            return poker.hand_category(poker.hand_value(poker.card_codes(cards)))
+
+        self.assertEqual(category("A♠, 2♦, 3♣, 4♥, 5♠, K♦, K♣"), "Straight")
+        self.assertEqual(category("10♥, J♥, Q♥, K♥, A♥, 2♠, 2♦"), "Royal Flush")
+        self.assertEqual(category("9♥, 10♥, J♥, Q♥, K♥, A♠, A♦"), "Straight Flush")
+        self.assertEqual(category("9♥, 9♦, 9♣, Q♥, Q♦, Q♠, 2♦"), "Full House")
+        self.assertEqual(category("9♥, 2♥, 5♥, Q♥, K♥, K♠, K♦"), "Flush")
+        self.assertGreater(
+            poker.hand_value(poker.card_codes("A♠, 2♦, 3♣, 4♥, 5♠, 6♦")), # a 6 high straight beats the wheel
+            poker.hand_value(poker.card_codes("A♠, 2♦, 3♣, 4♥, 5♠, K♦")),
+        )
+
+    def test_logged_winners_match_the_shown_hands(self):
+        rounds = poker.load_night("logs/poker_night_20260715.csv", use_cache=False).rounds
+        checked, problems = poker.check_showdowns(rounds)
+        self.assertGreater(checked, 20)
+        self.assertEqual(problems, [])
+
+    def test_two_seats_fixed_up_to_one_player_show_up(self):
+        # "susan" and "arash" both get fixed up to Arash, but they sat at the same table that night
+        rounds = poker.load_night("logs/poker_night_20210805.csv", use_cache=False).rounds
+        _, problems = poker.check_showdowns(rounds)
+        self.assertIn("Arash won with Full House, J's over Q's", "\n".join(problems))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+from datetime import datetime
+
+import regex_based_graph_night as poker
+
+
+def load_event(path):
+    with open(path) as file:
+        logs = poker.fix_up_player_names(file.readlines())
+    logs.pop(0)
+    logs.reverse()
+    return poker.PokerNightEvent(poker.date_of_csv(path), logs)
+
+
+class PokerRoundParsingTests(unittest.TestCase):
+    def test_single_pass_fills_every_round_field(self):
+        event = load_event("logs/poker_night_20260715.csv")
+        poker_round = next(r for r in event.rounds if r.round_number == 119)
+
+        self.assertEqual(
+            poker_round.player_balances,
+            {"George": 720, "Stephen": 1065, "Prilik": 1450, "Spencer": 490, "Jonah": 790},
+        )
+        self.assertEqual(poker_round.table_cards, ["10♦", "2♣", "A♣"])
+        self.assertEqual(poker_round.undealt_cards, ["6♠", "5♥"])
+        self.assertEqual(poker_round.winning_players, ["Jonah"])
+        self.assertEqual(poker_round.winning_amounts, [170])
+        self.assertEqual(poker_round.winning_hands, [])
+        self.assertEqual(
+            poker_round.player_to_hand,
+            {"Spencer": "9♦, 7♠", "Jonah": "K♥", "George": "K♣, 7♥"},
+        )
+        self.assertEqual(
+            [(action.player, action.action_type) for action in poker_round.player_actions[:3]],
+            [
+                ("Spencer", poker.RoundAction.posts_small_blind),
+                ("Jonah", poker.RoundAction.posts_big_blind),
+                ("George", poker.RoundAction.calls),
+            ],
+        )
+        self.assertEqual(len(poker_round.pre_flop_actions()), 10)
+        self.assertEqual(len(poker_round.pre_turn_actions()), 4)
+        self.assertEqual({action.street for action in poker_round.pre_turn_actions()}, {poker.PRE_TURN})
+        self.assertEqual(poker_round.pre_river_actions(), [])
+
+    def test_round_records_keep_integer_orders(self):
+        event = load_event("logs/poker_night_20260715.csv")
+        poker_round = event.rounds[0]
+        action = poker_round.player_actions[0]
+
+        self.assertIsInstance(action.order, int)
+        self.assertEqual(action.time, datetime.fromtimestamp(action.order / 100000))
+        self.assertEqual(poker_round.start_time, datetime.fromtimestamp(poker_round.start_order / 100000))
+        no_river_round = next(r for r in event.rounds if not hasattr(r, "river_order"))
+        self.assertFalse(hasattr(no_river_round, "river_time"))
+        self.assertIs(action.player, next(p for p in poker_round.player_balances if p == action.player)) # interned
+        with self.assertRaises(AttributeError):
+            action.extra = 1
+
+    def test_actions_know_their_round(self):
+        event = load_event("logs/poker_night_20260715.csv")
+
+        for poker_round in event.rounds:
+            for action in poker_round.player_actions:
+                self.assertIs(action.poker_round, poker_round)
+                self.assertLessEqual(poker_round.start_order, action.order)
+                self.assertLessEqual(action.order, poker_round.end_order)
+
+    def test_multi_line_config_change_does_not_break_round_end_time(self):
+        event = load_event("logs/poker_night_20260624.csv")
+        history = event.player_stack_history().player_history()
+
+        for poker_round in event.rounds:
+            self.assertLessEqual(poker_round.start_time, poker_round.end_time)
+        self.assertEqual(sum(entries[-1][0] for entries in history.values()), 0)
+
+
+class EventStreamTests(unittest.TestCase):
+    def test_rows_become_typed_events(self):
+        events = list(poker.parse_events([
+            '"-- starting hand #7 (id: abc)  No Limit Texas Hold\'em (dealer: ""Jonah @ x"") --",2026-07-16T02:30:15.059Z,178416901505900\n',
+            '"Player stacks: #2 ""George @ a"" (720) | #10 ""Jonah @ x"" (790)",2026-07-16T02:30:15.059Z,178416901505901\n',
+            '"""Jonah @ x"" posts a big blind of 20",2026-07-16T02:30:15.059Z,178416901505908\n',
+            '"""George @ a"" raises to 720 and go all in",2026-07-16T02:30:16.869Z,178416901686900\n',
+            '"""Jonah @ x"" collected 1440 from pot with Pair, K\'s (combination: K♣, K♥, 7♥, 5♦, 2♣)",2026-07-16T02:30:46.498Z,178416904649801\n',
+            '"The player ""Sam @ b"" joined the game with a stack of 1000.",2026-07-16T02:30:47.498Z,178416904749801\n',
+            '"Your hand is 3♣, 6♠",2026-07-16T02:30:54.501Z,178416905450103\n',
+        ]))
+
+        self.assertEqual(
+            [type(event) for event in events],
+            [poker.HandStart, poker.Stacks, poker.Post, poker.Raise, poker.Collect, poker.Join, poker.Unrecognized],
+        )
+        self.assertEqual(events[0].round_number, 7)
+        self.assertEqual(events[1].balances, {"George": 720, "Jonah": 790})
+        self.assertEqual(events[2].action_type, poker.RoundAction.posts_big_blind)
+        self.assertTrue(events[3].all_in)
+        self.assertEqual(events[3].amount, 720)
+        self.assertEqual(events[4].hand, "Pair, K's (combination: K♣, K♥, 7♥, 5♦, 2♣)")
+        self.assertEqual(events[5].order, 178416904749801)
+        with self.assertRaises(AttributeError):
+            events[0].extra = 1 # slotted records
+
+    def test_fan_out_serves_every_consumer_from_one_pass(self):
+        path = "logs/poker_night_20260715.csv"
+        seen = []
+
+        class CountingConsumer(poker.EventConsumer):
+            def on_event(self, event):
+                seen.append(event)
+
+        history, rounds, _ = poker.fan_out(
+            poker.read_events(path),
+            [poker.StackHistory(), poker.RoundCollector(), CountingConsumer()],
+        )
+
+        event = load_event(path)
+        self.assertEqual(history, event.player_stack_history())
+        self.assertEqual([r.round_number for r in rounds], [r.round_number for r in event.rounds])
+        self.assertGreater(len(seen), len(rounds))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import io
+import json
+import re
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+
+import regex_based_graph_night as poker
+
+
+class ProfileTests(unittest.TestCase):
+    def test_profiled_run_counts_patterns_and_unmatched_lines(self):
+        csv_file = "logs/poker_night_20260715.csv"
+        output, report = io.StringIO(), io.StringIO()
+        with redirect_stdout(output), redirect_stderr(report):
+            profiler = poker.run_profiled([csv_file], "Profit", output_format="json")
+
+        night = poker.load_night(csv_file, use_cache=False)
+        expected = io.StringIO()
+        poker.write_core_stats(night.core_stats, "json", expected)
+        self.assertEqual(json.loads(output.getvalue()), json.loads(expected.getvalue()))
+
+        event_types = [type(event) for event in night.events]
+        self.assertEqual(profiler.patterns["PLAYER_CALLS_REGEX"].hits, event_types.count(poker.Call))
+        self.assertEqual(profiler.patterns["START_HAND_REGEX"].calls, event_types.count(poker.HandStart))
+        self.assertEqual(sum(profiler.unmatched.values()), event_types.count(poker.Unrecognized))
+        self.assertEqual(profiler.unmatched["Your hand is <card>, <card>"], 120)
+        self.assertIn("Uncalled bet of N returned to <player>", profiler.unmatched)
+        self.assertEqual(list(profiler.file_seconds), [csv_file])
+        self.assertIn("parse_events", profiler.phase_seconds)
+        self.assertIn("PLAYER_CALLS_REGEX", report.getvalue())
+
+        # the real patterns are back once the run is over
+        self.assertIsInstance(poker.PLAYER_CALLS_REGEX, re.Pattern)
+        self.assertIsInstance(poker.PLAYER_NAME_REGEX, re.Pattern)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,12 @@
 import json
+import os
+import shutil
+import tempfile
+import threading
 import unittest
 from datetime import date
-from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
 
 import regex_based_graph_night as poker
 
@@ -20,6 +25,220 @@ class FakeResponse:
         return json.dumps(self.payload).encode()
 
 
+# A local stand-in for the Splitwise API that records each request and the client port it came from
+class StubSplitwiseHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.respond()
+
+    def do_POST(self):
+        self.respond(parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode()))
+
+    def respond(self, form=None):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        self.server.requests.append((self.client_address[1], url.path, query, form))
+        if url.path.endswith("/create_expense") and self.server.rate_limited_posts:
+            self.server.rate_limited_posts -= 1
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if url.path.endswith("/create_expense") and self.server.gateway_error_posts:
+            # the expense goes in, but the gateway times out before the response makes it back
+            self.server.gateway_error_posts -= 1
+            self.server.expenses.append({"id": 97, "description": form["description"][0], "date": form["date"][0] + "T00:00:00Z"})
+            self.send_response(502)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if url.path.endswith("/get_groups"):
+            payload = {"groups": [{"id": 42, "name": "Poker Night", "members": self.server.members}]}
+        elif url.path.endswith("/get_expenses"):
+            offset, limit = int(query["offset"][0]), int(query["limit"][0])
+            payload = {"expenses": self.server.expenses[offset:offset + limit]}
+        elif any(member["id"] == int(user_id) for user_id in form.get("users__0__user_id", []) for member in self.server.members):
+            payload = {"expenses": [{"id": 99}]}
+        else:
+            payload = {"errors": {"base": ["users__0__user_id is not in the group"]}}
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.close_connection = self.server.drop_connections # without saying so, like an idle timeout
+
+    def log_message(self, *args):
+        pass
+
+
+class SplitwiseSessionTests(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubSplitwiseHandler)
+        self.server.requests = []
+        self.server.drop_connections = False
+        self.server.rate_limited_posts = 0
+        self.server.gateway_error_posts = 0
+        self.server.members = [
+            {"id": 10, "email": "alex@example.com"},
+            {"id": 11, "email": "sam@example.com"},
+            {"id": 12, "email": "jo@example.com"},
+        ]
+        self.server.expenses = [
+            {"id": n, "description": f"Snacks {n}", "date": "2026-07-22T00:00:00Z"} for n in range(poker.SPLITWISE_EXPENSES_PAGE_SIZE)
+        ]
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/api/v3.0"
+
+    def add_expense(self):
+        selections = iter(["1", "alex@example.com", "sam@example.com"])
+        return poker.add_splitwise_expense(
+            {"Alex": [(150, None)], "Sam": [(-150, None)]},
+            date(2026, 7, 22),
+            "token",
+            input_fn=lambda prompt: next(selections),
+            base_url=self.base_url,
+        )
+
+    def test_one_connection_and_a_paged_date_window(self):
+        self.assertEqual(self.add_expense()["id"], 99)
+
+        ports, paths, queries, forms = zip(*self.server.requests)
+        self.assertEqual(len(set(ports)), 1)
+        self.assertEqual(paths, ("/api/v3.0/get_groups", "/api/v3.0/get_expenses", "/api/v3.0/get_expenses", "/api/v3.0/create_expense"))
+        self.assertEqual([query["offset"] for query in queries[1:3]], [["0"], [str(poker.SPLITWISE_EXPENSES_PAGE_SIZE)]])
+        self.assertEqual((queries[1]["dated_after"], queries[1]["dated_before"]), (["2026-07-21"], ["2026-07-24"]))
+        self.assertEqual(forms[3]["cost"], ["1.50"])
+
+    def test_duplicate_on_a_later_page_skips_creation(self):
+        self.server.expenses.append({"id": 98, "description": "Poker Night 2026-07-22", "date": "2026-07-22T00:00:00Z"})
+        with self.assertWarnsRegex(RuntimeWarning, "already exists"):
+            self.assertIsNone(self.add_expense())
+        self.assertNotIn("/api/v3.0/create_expense", [path for _, path, _, _ in self.server.requests])
+
+    def test_get_reconnects_after_the_server_drops_the_connection(self):
+        self.server.drop_connections = True
+        with poker.SplitwiseSession("token", self.base_url) as session:
+            session.request("GET", "/get_groups")
+            self.assertEqual(session.request("GET", "/get_groups")["groups"][0]["id"], 42)
+        self.assertEqual(len({port for port, _, _, _ in self.server.requests}), 2)
+
+    def test_post_reconnects_after_sitting_idle(self):
+        now = [0.0]
+        self.server.drop_connections = True
+        with poker.SplitwiseSession("token", self.base_url, clock=lambda: now[0]) as session:
+            session.request("GET", "/get_groups")
+            now[0] += poker.SPLITWISE_IDLE_RECONNECT_SECONDS + 1 # answering the prompts
+            response = session.request("POST", "/create_expense", data={"users__0__user_id": "10"})
+        self.assertEqual(response["expenses"][0]["id"], 99)
+        self.assertEqual(len({port for port, _, _, _ in self.server.requests}), 2)
+
+    def test_backfill_looks_up_once_and_posts_the_missing_nights(self):
+        self.server.expenses.append({"id": 98, "description": "Poker Night 2026-07-08", "date": "2026-07-08T00:00:00Z"})
+        self.server.rate_limited_posts = 1
+        selections = iter(["1", "alex@example.com", "sam@example.com"])
+        nights = [
+            (date(2026, 7, 1), {"Alex": [(150, None)], "Sam": [(-150, None)]}),
+            (date(2026, 7, 8), {"Alex": [(-50, None)], "Sam": [(50, None)]}),
+            (date(2026, 7, 15), {"Sam": [(200, None)], "Alex": [(-200, None)]}),
+            (date(2026, 7, 22), {"Alex": [(100, None)], "Sam": [(-50, None)]}),
+        ]
+        sleeps = []
+        results = poker.backfill_splitwise_expenses(
+            nights,
+            "token",
+            input_fn=lambda prompt: next(selections),
+            base_url=self.base_url,
+            requests_per_second=1000,
+            sleep=sleeps.append,
+        )
+
+        self.assertEqual(
+            [(event_date.isoformat(), outcome) for event_date, outcome, _ in results],
+            [("2026-07-01", "posted"), ("2026-07-08", "exists"), ("2026-07-15", "posted"), ("2026-07-22", "skipped")],
+        )
+        paths = [path for _, path, _, _ in self.server.requests]
+        self.assertEqual(paths.count("/api/v3.0/get_groups"), 1)
+        self.assertEqual(paths.count("/api/v3.0/get_expenses"), 2) # one window for the whole range, two pages of it
+        self.assertEqual(paths.count("/api/v3.0/create_expense"), 3) # two nights plus the one that got a 429
+        self.assertIn(0.0, sleeps) # the Retry-After
+        queries = [query for _, path, query, _ in self.server.requests if path.endswith("/get_expenses")]
+        self.assertEqual((queries[0]["dated_after"], queries[0]["dated_before"]), (["2026-06-30"], ["2026-07-17"]))
+        posted = {form["date"][0]: form for _, path, _, form in self.server.requests if form and path.endswith("/create_expense")}
+        self.assertEqual(posted["2026-07-15"]["users__0__paid_share"], ["2.00"])
+
+    def test_backfill_looks_for_the_expense_before_posting_again_after_a_gateway_error(self):
+        self.server.expenses = []
+        self.server.gateway_error_posts = 1
+        selections = iter(["1", "alex@example.com", "sam@example.com"])
+        results = poker.backfill_splitwise_expenses(
+            [(date(2026, 7, 1), {"Alex": [(150, None)], "Sam": [(-150, None)]})],
+            "token",
+            input_fn=lambda prompt: next(selections),
+            base_url=self.base_url,
+            requests_per_second=1000,
+            sleep=lambda seconds: None,
+        )
+
+        self.assertEqual(results, [(date(2026, 7, 1), "posted", "expense 97")])
+        paths = [path.rsplit("/", 1)[1] for _, path, _, _ in self.server.requests]
+        self.assertEqual(paths, ["get_groups", "get_expenses", "create_expense", "get_expenses"])
+
+    def test_metadata_cache_leaves_only_the_create_call(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        metadata_path = os.path.join(tmp, "splitwise_metadata.json")
+        self.server.expenses = []
+        prompts = []
+
+        def post(event_date, history, answers):
+            selections = iter(answers)
+            self.server.requests.clear()
+            prompts.clear()
+            poker.add_splitwise_expense(
+                history,
+                event_date,
+                "token",
+                input_fn=lambda prompt: prompts.append(prompt) or next(selections),
+                base_url=self.base_url,
+                metadata_path=metadata_path,
+            )
+            return [path.rsplit("/", 1)[1] for _, path, _, _ in self.server.requests]
+
+        alex_and_sam = {"Alex": [(150, None)], "Sam": [(-150, None)]}
+        self.assertEqual(
+            post(date(2026, 7, 1), alex_and_sam, ["1", "alex@example.com", "sam@example.com"]),
+            ["get_groups", "get_expenses", "create_expense"],
+        )
+        self.assertEqual(post(date(2026, 7, 8), alex_and_sam, []), ["create_expense"])
+        with self.assertWarnsRegex(RuntimeWarning, "already exists"):
+            self.assertEqual(post(date(2026, 7, 8), alex_and_sam, []), [])
+
+        # a new player refreshes the cache, only they get prompted for
+        with_jo = {"Alex": [(150, None)], "Jo": [(-150, None)]}
+        self.assertEqual(post(date(2026, 7, 15), with_jo, ["jo@example.com"]), ["get_groups", "get_expenses", "create_expense"])
+        self.assertEqual(prompts, ["Splitwise email for Jo: "])
+        self.assertEqual(post(date(2026, 7, 22), {"Sam": [(50, None)], "Jo": [(-50, None)]}, []), ["create_expense"])
+
+        # a cached member that left the group gets the expense turned down, then the group is looked up again
+        self.server.members = [member for member in self.server.members if member["email"] != "alex@example.com"]
+        self.server.members.append({"id": 13, "email": "alex@example.org"})
+        self.assertEqual(
+            post(date(2026, 7, 29), alex_and_sam, ["alex@example.org"]),
+            ["create_expense", "get_groups", "get_expenses", "create_expense"],
+        )
+
+        metadata = poker.SplitwiseMetadata(metadata_path)
+        self.assertEqual(metadata.group["id"], 42)
+        self.assertEqual({player: member["id"] for player, member in metadata.player_members.items()}, {"Alex": 13, "Sam": 11, "Jo": 12})
+        self.assertEqual(len(metadata.posted_dates), 5)
+        self.assertNotIn("token", metadata.data["token"]) # only a hash of the API token is kept
+
 class SplitwiseTests(unittest.TestCase):
     def test_choose_poker_night_group(self):
         group = poker._choose_poker_night_group(
@@ -62,7 +281,7 @@ class SplitwiseTests(unittest.TestCase):
         logs.pop(0)
         logs.reverse()
         event = poker.PokerNightEvent(poker.date_of_csv(path), logs)
-        history = event.player_stack_history()
+        history = event.player_stack_history().player_history()
 
         self.assertEqual(history["Prilik"][-1][0], -1600)
         self.assertEqual(sum(entries[-1][0] for entries in history.values()), 0)
@@ -173,6 +392,41 @@ class SplitwiseTests(unittest.TestCase):
         self.assertIsNone(result)
         self.assertEqual(len(requests), 2)
 
+    def test_metadata_expires_after_the_ttl(self):
+        now = [1000.0]
+        metadata = poker.SplitwiseMetadata(os.path.join(tempfile.gettempdir(), "missing", "metadata.json"), ttl_seconds=60, clock=lambda: now[0])
+        metadata.update("token", {"id": 42, "members": []}, {"Alex": {"id": 10, "email": "alex@example.com"}})
+        self.assertTrue(metadata.covers("token", ["Alex"]))
+        self.assertFalse(metadata.covers("token", ["Alex", "Sam"]))
+        self.assertFalse(metadata.covers("another token", ["Alex"]))
+        now[0] += 61
+        self.assertFalse(metadata.covers("token", ["Alex"]))
+
+    def test_rate_limiter_spaces_out_calls(self):
+        now = [10.0]
+        sleeps = []
+        limiter = poker.RateLimiter(4, clock=lambda: now[0], sleep=sleeps.append)
+        for _ in range(3):
+            limiter.wait()
+        self.assertEqual(sleeps, [0.25, 0.5])
+
+    def test_failed_post_is_retried_with_backoff_then_reported(self):
+        sleeps = []
+
+        def send():
+            raise poker.SplitwiseHTTPError("unavailable", 503)
+
+        with self.assertRaises(poker.SplitwiseHTTPError):
+            poker._with_retries(send, sleep=sleeps.append)
+        self.assertEqual(sleeps, [1.0, 2.0, 4.0])
+
+        def send_through_a_gateway():
+            raise poker.SplitwiseHTTPError("bad gateway", 502)
+
+        with self.assertRaises(poker.SplitwiseHTTPError):
+            poker._with_retries(send_through_a_gateway, sleep=sleeps.append) # it may have been created, so not sent again
+        self.assertEqual(sleeps, [1.0, 2.0, 4.0])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,69 @@
+import os
+import time
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+import regex_based_graph_night as poker
+
+
+class StackMatrixTests(unittest.TestCase):
+    def test_a_row_per_round_and_a_column_per_player(self):
+        night = poker.load_night("logs/poker_night_20260715.csv", use_cache=False)
+        matrix = night.stack_matrix
+        self.assertEqual(matrix.profits.shape, (len(matrix.times), len(matrix.players)))
+        self.assertEqual(matrix.profits.dtype, np.int32)
+        self.assertEqual(len(matrix.times), len({round.start_order for round in night.rounds}))
+        self.assertTrue((matrix.profits[~matrix.present] == 0).all())
+        self.assertEqual(matrix.times.tolist(), sorted(round.start_time for round in night.rounds))
+
+        history = matrix.player_history()
+        self.assertEqual(list(history), matrix.players)
+        self.assertEqual(matrix.final_profits(), {player: entries[-1] for player, entries in history.items()})
+        self.assertEqual(sum(profit for profit, _ in matrix.final_profits().values()), 0)
+
+    def test_a_stale_exit_does_not_add_a_second_entry_to_a_round(self):
+        # George quit and came back without a join being logged, so his old exit kept getting recorded every round
+        history = poker.load_night("logs/poker_night_20240703.csv", use_cache=False).player_history
+        times = [time for _, time in history["George"]]
+        self.assertEqual(len(times), len(set(times)))
+
+    def test_all_time_history_is_a_running_sum_over_nights(self):
+        nights = [
+            {"Alex": (100, poker.time_of_order(100000)), "Sam": (-100, poker.time_of_order(100100))},
+            {"Sam": (50, poker.time_of_order(200000)), "Jo": (-50, poker.time_of_order(200000))},
+            {"Alex": (-30, poker.time_of_order(300000)), "Jo": (30, poker.time_of_order(300200))},
+        ]
+        all_time = poker.merge_all_time_history(nights)
+        self.assertEqual(all_time.players, ["Alex", "Sam", "Jo"])
+        self.assertEqual(all_time.profits.tolist(), [[100, -100, 0], [100, -50, -50], [70, -50, -20]])
+        self.assertEqual(all_time.present.tolist(), [[True, True, False], [False, True, True], [True, False, True]])
+        self.assertEqual(all_time.player_history()["Alex"], [(100, poker.time_of_order(100100)), (70, poker.time_of_order(300200))])
+
+    def test_times_of_orders(self):
+        orders = [178416901505901, 178416904749801, 178416905450103]
+        self.assertEqual(poker.times_of_orders(orders).tolist(), [poker.time_of_order(order) for order in orders])
+
+    def test_times_of_orders_across_daylight_saving_changes(self):
+        old_tz = os.environ.get("TZ")
+
+        def restore_tz():
+            if old_tz is None:
+                os.environ.pop("TZ", None)
+            else:
+                os.environ["TZ"] = old_tz
+            time.tzset()
+
+        self.addCleanup(restore_tz)
+        os.environ["TZ"] = "America/Toronto"
+        time.tzset()
+        across_a_change = [datetime(2026, 10, 31, 23), datetime(2026, 11, 1, 1, 30), datetime(2026, 11, 1, 3)] # clocks go back at 2
+        spring_and_fall = [datetime(2026, 1, 15), datetime(2026, 7, 15), datetime(2026, 12, 15)] # same offset at both ends
+        for times in [across_a_change, spring_and_fall]:
+            orders = [int(moment.timestamp() * 100000) for moment in times]
+            self.assertEqual(poker.times_of_orders(orders).tolist(), [poker.time_of_order(order) for order in orders])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import subprocess
+import sys
+import unittest
+
+# Heavy libraries only the graphs need, they must not load just from importing the script
+GRAPH_ONLY_MODULES = ["matplotlib", "pandas"]
+
+
+class StartupTests(unittest.TestCase):
+    def test_import_does_not_load_graph_libraries(self):
+        code = (
+            "import sys, regex_based_graph_night; "
+            f"print(','.join(m for m in {GRAPH_ONLY_MODULES!r} if m in sys.modules))"
+        )
+        loaded = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.strip()
+        self.assertEqual(loaded, "")
+
+    def test_graphing_loads_them_with_the_agg_backend(self):
+        code = (
+            "import tempfile, os, regex_based_graph_night as poker, matplotlib; "
+            "from datetime import datetime; "
+            "tmp = tempfile.mkdtemp(); "
+            "history = poker.stack_matrix(['Arash'], [datetime(2026, 7, 15), datetime(2026, 7, 15, 1)], [0, 1], [0, 0], [0, 10]); "
+            "poker.graph_stack_history(history, 'Profit', os.path.join(tmp, 'night.csv')); "
+            "print(matplotlib.get_backend().lower(), os.listdir(tmp))"
+        )
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.strip()
+        self.assertEqual(output, "agg ['night_profit_graph.png']")
+
+
+if __name__ == "__main__":
+    unittest.main()